@@ -1,37 +1,77 @@
+import os
+import time
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
-import pyrebase
-import requests
+from firebase_admin import firestore
 from datetime import datetime
 
-# Firebase Admin SDK Initialization
-if not firebase_admin._apps:
-    cred = credentials.Certificate('chatbot-.json')
-    firebase_admin.initialize_app(cred)
-    db_admin = firestore.client()
-
-# Firebase Client SDK Configuration
-config = {
-    "apiKey": "Apikey",
-    "authDomain": "firebaseapp.com",
-    "projectId": "chatbot",
-    "storageBucket": "chatbot",
-    "databaseURL": "https://chatbot.com",
-    "messagingSenderId": "31",
-    "appId": "1:33261:web:d49bc",
-    "measurementId": "G-WC"
-}
-firebase = pyrebase.initialize_app(config)
-firebase_auth = firebase.auth()
-
-FASTAPI_URL = "https://ahad-backend.onrender.com"  # Base FastAPI URL
+from app_pages.resources import get_admin_db, get_auth_client, get_backend_client, warm_up_backend
+
+# /chatbot/ can take several model attempts, so it gets a longer read timeout than other calls
+CHATBOT_READ_TIMEOUT = 90
+# Jobs live in the memory of the backend worker that accepted them, so polling only works
+# against a single uvicorn worker (or sticky routing); opt in with CHAT_JOB_MODE=1
+CHAT_JOB_MODE = os.getenv("CHAT_JOB_MODE", "0") == "1"
+JOB_POLL_INTERVAL = 1.0
+JOB_WAIT_TIMEOUT = 120
+SESSIONS_PAGE_SIZE = 15
+MESSAGES_PAGE_SIZE = 20
+
+def run_chat_job(payload):
+    """Submits a chatbot job and polls until it finishes; returns the chatbot response dict."""
+    client = get_backend_client()
+    response = client.post("/jobs/", json=dict(payload, lane="interactive"))
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    deadline = time.monotonic() + JOB_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        response = client.get(f"/jobs/{job_id}/result")
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code != 202:
+            response.raise_for_status()
+        time.sleep(JOB_POLL_INTERVAL)
+    client.delete(f"/jobs/{job_id}")
+    raise TimeoutError("The response took too long, please try again.")
+
+def request_chat(payload):
+    """The chatbot response dict, from a polled job in job mode or one /chatbot/ request otherwise."""
+    if CHAT_JOB_MODE:
+        return run_chat_job(payload)
+    client = get_backend_client()
+    response = client.post("/chatbot/", json=payload, timeout=(client.timeout[0], CHATBOT_READ_TIMEOUT))
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=120, show_spinner=False)
+def fetch_sessions_page(user_id, cursor=None, limit=SESSIONS_PAGE_SIZE):
+    """One page of session summaries (newest first), cached per user and cursor."""
+    params = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    return get_backend_client().get_json(f"/sessions/{user_id}", params=params)
+
+@st.cache_data(ttl=120, show_spinner=False)
+def fetch_messages_page(user_id, session_id, page, page_size=MESSAGES_PAGE_SIZE):
+    """One page of a session's messages (page 0 = newest), cached per session and page."""
+    return get_backend_client().get_json(
+        f"/sessions/{user_id}/{session_id}/messages",
+        params={"page": page, "page_size": page_size}
+    )
+
+def reset_chat_state():
+    """Clears per-user chat view state (used on login and logout)."""
+    st.session_state.active_session_id = None
+    st.session_state.session_cursors = [None]  # Cursor for each visited page of the session list
+    st.session_state.message_pages = 1  # How many message pages of the active session are shown
+    st.session_state.new_sessions = []  # Sessions started in this browser session, newest first
+    st.session_state.local_turns = {}  # session_id -> turns sent in this browser session
+    st.session_state.warmed_pages = set()  # Pages that already asked the backend to warm its caches
 
 def signup(email, password, username):
     try:
-        user = firebase_auth.create_user_with_email_and_password(email, password)
+        user = get_auth_client().create_user_with_email_and_password(email, password)
         user_id = user['localId']
-        firebase_auth.update_profile(user['idToken'], display_name=username)
+        get_auth_client().update_profile(user['idToken'], display_name=username)
         user_data = {
             "email": email,
             "username": username,
@@ -40,7 +80,7 @@ def signup(email, password, username):
             "comments": [],
             "chat_sessions": []  # Initialize with chat_sessions instead of chat_interactions
         }
-        db_admin.collection("users").document(user_id).set(user_data)
+        get_admin_db().collection("users").document(user_id).set(user_data)
         st.success('🎉 Account Created Successfully!')
         st.markdown('Please login using your email and password')
         st.balloons()
@@ -49,22 +89,15 @@ def signup(email, password, username):
 
 def login(email, password):
     try:
-        user = firebase_auth.sign_in_with_email_and_password(email, password)
+        user = get_auth_client().sign_in_with_email_and_password(email, password)
         user_id = user['localId']
-        db_admin.collection("users").document(user_id).update({"last_login": firestore.SERVER_TIMESTAMP})
-        
-        # Fetch chat sessions from Firestore
-        user_data = db_admin.collection("users").document(user_id).get()
-        if user_data.exists:
-            chat_sessions = user_data.to_dict().get("chat_sessions", [])
-            st.session_state.chat_sessions = chat_sessions  # Load chat sessions into session state
-            # Do not set an active session ID here to force a new session
-        else:
-            st.session_state.chat_sessions = []
+        get_admin_db().collection("users").document(user_id).update({"last_login": firestore.SERVER_TIMESTAMP})
 
+        # Chat sessions are fetched page by page from the backend when the chat view renders
         st.session_state["user_id"] = user_id
         st.session_state.signedout = False
-        st.session_state.active_session_id = None  # Reset to ensure a new session on first query
+        reset_chat_state()  # No active session ID, so the first query starts a new session
+        warm_up_backend(user_id, "login")
         st.session_state.page = "chatbot"  # Set page to chatbot after login
         st.success('✅ Login Successful!')
         st.rerun()
@@ -74,51 +107,96 @@ def login(email, password):
 def logout():
     st.session_state.signedout = True
     st.session_state.username = ''
-    st.session_state.active_session_id = None
-    st.session_state.chat_sessions = []
+    reset_chat_state()
     st.success("👋 Logged out successfully!")
     st.rerun()
 
+def render_session_list(user_id):
+    """Sidebar list of chat sessions, one page at a time."""
+    st.header("Chat Sessions")
+    page = len(st.session_state.session_cursors) - 1
+    try:
+        data = fetch_sessions_page(user_id, st.session_state.session_cursors[-1])
+    except Exception as e:
+        st.write(f"⚠️ Could not load sessions: {e}")
+        data = {"sessions": [], "next_cursor": None, "total": 0}
+
+    # Sessions started in this browser session may not be persisted yet
+    known_ids = {s["session_id"] for s in data["sessions"]}
+    sessions = [s for s in st.session_state.new_sessions if s["session_id"] not in known_ids] if page == 0 else []
+    sessions += data["sessions"]
+
+    if sessions:
+        total = data["total"] + len(sessions) - len(data["sessions"])
+        offset = page * SESSIONS_PAGE_SIZE
+        for i, session in enumerate(sessions):
+            if st.button(f"Session {total - offset - i}: {session['title'][:30]}...", key=f"session_{session['session_id']}"):
+                st.session_state.active_session_id = session["session_id"]
+                st.session_state.message_pages = 1
+    else:
+        st.write("No chat sessions available.")
+
+    col_newer, col_older = st.columns(2)
+    with col_newer:
+        if page > 0 and st.button("◀ Newer"):
+            st.session_state.session_cursors.pop()
+            st.rerun()
+    with col_older:
+        if data["next_cursor"] and st.button("Older ▶"):
+            st.session_state.session_cursors.append(data["next_cursor"])
+            st.rerun()
+
+    # Button to start a new session
+    if st.button("➕ New Chat Session"):
+        st.session_state.active_session_id = None  # Reset to create a new session
+        st.rerun()
+
+def render_active_session(user_id, session_id):
+    """Shows the loaded message pages of the active session plus turns sent from this browser."""
+    pages = []
+    has_more = False
+    for page in range(st.session_state.message_pages):
+        try:
+            data = fetch_messages_page(user_id, session_id, page)
+        except Exception as e:
+            st.write(f"⚠️ Could not load messages: {e}")
+            break
+        pages.append(data["messages"])
+        has_more = data["has_more"]
+        if not has_more:
+            break
+
+    if has_more and st.button("⬆️ Load earlier messages"):
+        st.session_state.message_pages += 1
+        st.rerun()
+
+    history = [chat for page_messages in reversed(pages) for chat in page_messages]
+    # Skip local turns the backend has already persisted
+    persisted = {(chat["user_query"], chat["bot_response"]) for chat in pages[0]} if pages else set()
+    history += [
+        chat for chat in st.session_state.local_turns.get(session_id, [])
+        if (chat["user_query"], chat["bot_response"]) not in persisted
+    ]
+    for chat in history:
+        st.write(f"**You:** {chat['user_query']}")
+        st.write(f"**Bot:** {chat['bot_response']}")
+        st.write("---")
+
 def chatbot_interface():
     st.title("What can I help with?")
 
-    
-
-    # Initialize chat sessions and active session in session state if not present
-    if "chat_sessions" not in st.session_state:
-        st.session_state.chat_sessions = []
-    if "active_session_id" not in st.session_state:
-        st.session_state.active_session_id = None
+    if "local_turns" not in st.session_state:
+        reset_chat_state()
+    user_id = st.session_state["user_id"]
+    warm_up_backend(user_id, "chat")
 
     # Sidebar for chat sessions
     with st.sidebar:
-        st.header("Chat Sessions")
-        if st.session_state.chat_sessions:
-            for i, session in enumerate(st.session_state.chat_sessions):
-                first_query = session["queries"][0]["user_query"] if session["queries"] else "Empty Session"
-                if st.button(f"Session {i + 1}: {first_query[:30]}..."):
-                    st.session_state.active_session_id = session["session_id"]
-        else:
-            st.write("No chat sessions available.")
-        
-        # Button to start a new session
-        if st.button("➕ New Chat Session"):
-            st.session_state.active_session_id = None  # Reset to create a new session
-            st.rerun()
-
-           
+        render_session_list(user_id)
 
     # Display the active session's chat history
     if st.session_state.active_session_id:
-        for session in st.session_state.chat_sessions:
-            if session["session_id"] == st.session_state.active_session_id:
-                
-                for chat in session["queries"]:
-                    st.write(f"**You:** {chat['user_query']}")
-                    st.write(f"**Bot:** {chat['bot_response']}")
-                    st.write("---")
-                break
-    
+        render_active_session(user_id, st.session_state.active_session_id)
 
     # User input for new chat
     user_query = st.chat_input("Type your message...")
@@ -129,46 +207,37 @@ def chatbot_interface():
             # Send query to FastAPI with user_id and session_id (if exists)
             payload = {
                 "query": user_query,
-                "user_id": st.session_state["user_id"],
+                "user_id": user_id,
             }
             if st.session_state.active_session_id:
                 payload["session_id"] = st.session_state.active_session_id
 
-            response = requests.post(f"{FASTAPI_URL}/chatbot/", json=payload)
-            
-            if response.status_code == 200:
-                result = response.json()
+            with st.spinner("Generating..."):
+                result = request_chat(payload)
+
+            if result:
                 bot_response = result.get("response", "⚠️ No response received.")
                 returned_session_id = result.get("session_id")
                 
                 # Update active session ID if a new one is returned
-                if not st.session_state.active_session_id:
+                if not st.session_state.active_session_id and returned_session_id:
                     st.session_state.active_session_id = returned_session_id
-
-                # Update local chat sessions
-                session_found = False
-                for session in st.session_state.chat_sessions:
-                    if session["session_id"] == returned_session_id:
-                        session["queries"].append({
-                            "user_query": user_query,
-                            "bot_response": bot_response,
-                            "timestamp": datetime.now()
-                        })
-                        session_found = True
-                        break
-                if not session_found:
-                    st.session_state.chat_sessions.append({
+                    st.session_state.new_sessions.insert(0, {
                         "session_id": returned_session_id,
-                        "queries": [{
-                            "user_query": user_query,
-                            "bot_response": bot_response,
-                            "timestamp": datetime.now()
-                        }],
-                        "created_at": datetime.now()
+                        "title": user_query[:60],
+                        "message_count": 1
+                    })
+
+                # Remember the turn locally instead of refetching the session
+                if returned_session_id:
+                    st.session_state.local_turns.setdefault(returned_session_id, []).append({
+                        "user_query": user_query,
+                        "bot_response": bot_response,
+                        "timestamp": datetime.now()
                     })
 
             else:
-                bot_response = f"⚠️ API Error! Status Code: {response.status_code}"
+                bot_response = "⚠️ No response received."
         except Exception as e:
             bot_response = f"⚠️ Error: {str(e)}"
 
@@ -0,0 +1,99 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+DEFAULT_FASTAPI_URL = "https://ahad-backend.onrender.com"
+
+# Methods that are safe to send again after a network error or a retryable status
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class BackendClient:
+    """Keep-alive HTTP client for the FastAPI backend with timeouts and jittered retries."""
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=30.0, max_retries=3,
+                 backoff=0.3, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        # Retries are handled in request() so only idempotent calls are repeated
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # (path, params) -> (etag, parsed body) for conditional GETs
+        self._etag_cache = OrderedDict()
+        self._etag_cache_size = 256
+        self._etag_lock = threading.Lock()
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter: spread retries from many reruns instead of hitting the backend in lockstep
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def request(self, method, path, timeout=None, retry=None, **kwargs):
+        method = method.upper()
+        retry = method in IDEMPOTENT_METHODS if retry is None else retry
+        attempts = self.max_retries + 1 if retry else 1
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(attempts):
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == attempts - 1:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+            if response.status_code in RETRYABLE_STATUS and attempt < attempts - 1:
+                self._sleep_before_retry(attempt)
+                continue
+            return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def get_json(self, path, params=None, **kwargs):
+        """GET returning parsed JSON; revalidates with If-None-Match so unchanged data is not resent."""
+        cache_key = (path, tuple(sorted((params or {}).items())))
+        with self._etag_lock:
+            cached = self._etag_cache.get(cache_key)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached:
+            headers["If-None-Match"] = cached[0]
+        response = self.get(path, params=params, headers=headers, **kwargs)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        data = response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            with self._etag_lock:
+                self._etag_cache[cache_key] = (etag, data)
+                self._etag_cache.move_to_end(cache_key)
+                while len(self._etag_cache) > self._etag_cache_size:
+                    self._etag_cache.popitem(last=False)
+        return data
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+
+@st.cache_resource
+def get_backend_client():
+    """One pooled client per Streamlit server process, shared by every page and session."""
+    return BackendClient(
+        os.getenv("FASTAPI_URL", DEFAULT_FASTAPI_URL),
+        connect_timeout=float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3.05")),
+        read_timeout=float(os.getenv("BACKEND_READ_TIMEOUT", "30")),
+        max_retries=int(os.getenv("BACKEND_MAX_RETRIES", "3"))
+    )
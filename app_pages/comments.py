@@ -1,36 +1,43 @@
 import streamlit as st
-import requests
+
+from app_pages.resources import get_backend_client, invalidate_user_comments, load_user_comments, warm_up_backend
 
 
 def fetch_comments(user_id):
     try:
-        api_url = f"http://127.0.0.1:8000/get_comments/{user_id}"
-        response = requests.get(api_url)
-        if response.status_code == 200:
-            data = response.json()
-            # Each comment is a dict with 'comment' and 'timestamp'
-            return [c['comment'] for c in data.get('comments', [])]
+        return load_user_comments(user_id)
     except Exception:
-        pass
-    return []
+        return []
 
-def save_comment(user_id, comment):
-    api_url = "http://127.0.0.1:8000/save_comment/"
-    payload = {"comment": comment, "user_id": user_id}
+def bulk_update_comments(user_id, added=None, edited=None, removed=None):
+    """Sends only the changed comments to the backend in a single request."""
+    payload = {
+        "user_id": user_id,
+        "added": added or [],
+        "edited": edited or [],
+        "removed": removed or []
+    }
     try:
-        response = requests.post(api_url, json=payload)
-        return response.status_code == 200
-    except Exception:
+        response = get_backend_client().post("/comments/bulk/", json=payload)
+        if response.status_code == 200:
+            invalidate_user_comments(user_id)
+            return True
         return False
-
-def delete_comment(user_id, idx):
-    api_url = f"http://127.0.0.1:8000/delete_comment/{user_id}/{idx}"
-    try:
-        response = requests.delete(api_url)
-        return response.status_code == 200
     except Exception:
         return False
 
+def diff_comments(original, current):
+    """Compares the loaded comments ({id: text}) with the edited list and returns the changes."""
+    added = [c["comment"] for c in current if not c["id"] and c["comment"].strip()]
+    edited = [
+        {"id": c["id"], "comment": c["comment"]}
+        for c in current
+        if c["id"] and c["comment"].strip() and c["comment"] != original.get(c["id"])
+    ]
+    # Clearing a saved comment's text removes it
+    removed = [c["id"] for c in current if c["id"] and not c["comment"].strip()]
+    return added, edited, removed
+
 def app():
     st.markdown("""
         <style>
@@ -113,10 +120,12 @@ def app():
     if not user_id:
         st.warning("Please login to manage your comments.")
         return
+    warm_up_backend(user_id, "comments")
 
     # Load comments from backend only once per session or after save/delete
     if "comments" not in st.session_state or st.session_state.get("reload_comments"):
         st.session_state.comments = fetch_comments(user_id)
+        st.session_state.original_comments = {c["id"]: c["comment"] for c in st.session_state.comments}
         st.session_state.reload_comments = False
 
     comments = st.session_state.comments
@@ -126,19 +135,23 @@ def app():
     for i, comment in enumerate(comments):
         st.markdown(f"<div class='comment-card'>", unsafe_allow_html=True)
         col1, col2 = st.columns([0.9, 0.1])
+        widget_key = comment["id"] or f"new_{i}"
         with col1:
-            new_val = st.text_area(f"Comment {i+1}", value=comment, key=f"comment_{i+1}", height=80, label_visibility="collapsed")
-            updated_comments.append(new_val)
+            new_val = st.text_area(f"Comment {i+1}", value=comment["comment"], key=f"comment_{widget_key}", height=80, label_visibility="collapsed")
+            updated_comments.append({"id": comment["id"], "comment": new_val})
         with col2:
-            if st.button("🗑️", key=f"delete_{i}", help="Delete this comment"):
+            if st.button("🗑️", key=f"delete_{widget_key}", help="Delete this comment"):
                 delete_indices.append(i)
         st.markdown("</div>", unsafe_allow_html=True)
 
-    # Delete comments if any
+    # Delete comments if any (unsaved ones only exist locally)
     if delete_indices:
-        for idx in sorted(delete_indices, reverse=True):
-            if delete_comment(user_id, idx):
+        removed_ids = [comments[idx]["id"] for idx in delete_indices if comments[idx]["id"]]
+        if removed_ids:
+            if bulk_update_comments(user_id, removed=removed_ids):
                 st.session_state.reload_comments = True
+        else:
+            st.session_state.comments = [c for idx, c in enumerate(updated_comments) if idx not in delete_indices]
         st.rerun()
 
     # Add new comment button (replaces the + button)
@@ -165,23 +178,21 @@ def app():
     """
     st.markdown(add_btn_style, unsafe_allow_html=True)
     if st.button("Add New Comment", key="add_comment", help="Add new comment"):
-        updated_comments.append("")
+        updated_comments.append({"id": None, "comment": ""})
         st.session_state.comments = updated_comments
         st.rerun()
 
-    # Save all comments
+    # Save all comments (only what changed since the last load is sent)
     if st.button("💾 Save All", key="save_all", help="Save all comments"):
-        all_success = True
-        for comment in updated_comments:
-            if comment.strip():
-                if not save_comment(user_id, comment):
-                    all_success = False
-        st.session_state.reload_comments = True
-        if all_success:
+        added, edited, removed = diff_comments(st.session_state.original_comments, updated_comments)
+        if not (added or edited or removed):
+            st.info("No changes to save.")
+        elif bulk_update_comments(user_id, added, edited, removed):
+            st.session_state.reload_comments = True
             st.success("All comments saved successfully!")
+            st.rerun()
         else:
             st.error("Some comments could not be saved. Please try again.")
-        st.rerun()
 
 if __name__ == "__main__":
     app()
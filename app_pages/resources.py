@@ -0,0 +1,86 @@
+import threading
+
+import streamlit as st
+import firebase_admin
+from firebase_admin import credentials, firestore
+import pyrebase
+
+from app_pages.api_client import get_backend_client
+
+FIREBASE_ADMIN_CREDENTIALS = 'chatbot-.json'
+
+# Firebase Client SDK Configuration
+FIREBASE_CONFIG = {
+    "apiKey": "Apikey",
+    "authDomain": "firebaseapp.com",
+    "projectId": "chatbot",
+    "storageBucket": "chatbot",
+    "databaseURL": "https://chatbot.com",
+    "messagingSenderId": "31",
+    "appId": "1:33261:web:d49bc",
+    "measurementId": "G-WC"
+}
+
+
+@st.cache_resource
+def get_admin_db():
+    """Firestore client from the Firebase Admin SDK, initialized once per server process."""
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(FIREBASE_ADMIN_CREDENTIALS))
+    return firestore.client()
+
+
+@st.cache_resource
+def get_auth_client():
+    """pyrebase auth client, initialized once per server process."""
+    return pyrebase.initialize_app(FIREBASE_CONFIG).auth()
+
+
+@st.cache_resource
+def _comment_versions():
+    # user_id -> version; bumping a user's version makes their cached comments stale
+    return {}
+
+
+@st.cache_data(ttl=300, max_entries=1000, show_spinner=False)
+def _load_user_comments(user_id, version):
+    # Only ids and texts are needed here; page through with conditional GETs
+    comments = []
+    cursor = None
+    while True:
+        params = {"fields": "id,comment", "limit": 200}
+        if cursor:
+            params["cursor"] = cursor
+        data = get_backend_client().get_json(f"/get_comments/{user_id}", params=params)
+        comments.extend({"id": c.get("id"), "comment": c["comment"]} for c in data.get("comments", []))
+        cursor = data.get("next_cursor")
+        if not cursor:
+            return comments
+
+
+def load_user_comments(user_id):
+    """The user's saved comments as [{"id", "comment"}], cached until invalidated (or 5 minutes)."""
+    return _load_user_comments(user_id, _comment_versions().get(user_id, 0))
+
+
+def invalidate_user_comments(user_id):
+    """Drops the cached comments of one user, e.g. after saving or deleting."""
+    versions = _comment_versions()
+    versions[user_id] = versions.get(user_id, 0) + 1
+
+
+def warm_up_backend(user_id, page):
+    """Asks the backend to load the user's caches ahead of the first generation, without waiting for it."""
+    warmed = st.session_state.setdefault("warmed_pages", set())
+    if page in warmed:
+        return
+    warmed.add(page)
+    client = get_backend_client()
+
+    def _warm():
+        try:
+            client.post(f"/warmup/{user_id}", retry=False)
+        except Exception as e:
+            print(f"Error warming backend caches: {e}")
+
+    threading.Thread(target=_warm, daemon=True).start()
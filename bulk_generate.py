@@ -0,0 +1,188 @@
+"""
+Offline bulk comment generation for content calendars.
+
+Streams posts from a CSV or JSONL file through HumanStyleGenerator (optionally
+seeded with style samples retrieved from the Chroma store) on a process pool,
+one generator per worker, and appends results to a JSONL file in input order.
+Each output line carries the input offset, so an interrupted run can be
+continued with --resume.
+
+Examples:
+    python bulk_generate.py posts.csv --output comments.jsonl --workers 4
+    python bulk_generate.py posts.jsonl --column text --output comments.jsonl --resume
+    python bulk_generate.py posts.csv --output comments.jsonl --retrieval --start-offset 500
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+_generator = None
+_vectordb = None
+
+
+def read_posts(path: str, column: str, id_column: str = None):
+    """Yields (offset, record_id, post) from a CSV or JSONL file without loading it into memory."""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = (json.loads(line) for line in f if line.strip())
+            yield from _posts_from_rows(rows, column, id_column)
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            yield from _posts_from_rows(csv.DictReader(f), column, id_column)
+
+
+def _posts_from_rows(rows, column: str, id_column: str):
+    for offset, row in enumerate(rows):
+        post = (row.get(column) or "").strip()
+        record_id = row.get(id_column) if id_column else None
+        yield offset, record_id, post
+
+
+def resume_offset(output_path: str) -> int:
+    """Offset after the last complete output line; drops a partially written trailing line."""
+    if not os.path.exists(output_path):
+        return 0
+    next_offset = 0
+    valid_bytes = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                next_offset = json.loads(line)["offset"] + 1
+            except (ValueError, KeyError):
+                break
+            valid_bytes += len(line)
+    if valid_bytes < os.path.getsize(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return next_offset
+
+
+def _init_worker(retrieval: bool, chroma_dir: str):
+    """Builds this worker's generator (and vector store when retrieval is on) once."""
+    global _generator, _vectordb
+    from human_style_generator import HumanStyleGenerator
+    if retrieval:
+        from langchain.vectorstores import Chroma
+        from langchain.embeddings import OpenAIEmbeddings
+        _vectordb = Chroma(persist_directory=chroma_dir, embedding_function=OpenAIEmbeddings())
+    _generator = HumanStyleGenerator(_vectordb)
+
+
+def _generate_chunk(chunk: list, seed) -> list:
+    results = []
+    for offset, record_id, post in chunk:
+        result = {"offset": offset, "id": record_id, "post": post}
+        if not post:
+            result.update(success=False, error="Empty post")
+            results.append(result)
+            continue
+        if seed is not None:
+            # Seed per post so output does not depend on which worker ran it
+            random.seed(f"{seed}:{offset}")
+        props = None
+        if _vectordb is not None:
+            try:
+                samples = [r.page_content for r in _vectordb.similarity_search(post, k=3)]
+                props = _generator.extract_properties_from_comments(samples) or None
+                result["samples"] = samples
+            except Exception as e:
+                print(f"Error retrieving samples for offset {offset}: {e}")
+        generated = _generator.generate_comment(post, str(offset), saved_comment_props=props)
+        for key in ("success", "comment", "pattern_type", "theme", "sentiment", "quality_score", "error"):
+            if key in generated:
+                result[key] = generated[key]
+        results.append(result)
+    return results
+
+
+def _chunks(posts, size: int):
+    chunk = []
+    for item in posts:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(args) -> dict:
+    start_offset = args.start_offset
+    mode = "w"
+    if args.resume:
+        start_offset = max(start_offset, resume_offset(args.output))
+        mode = "a"
+        print(f"Resuming from offset {start_offset}")
+
+    posts = (p for p in read_posts(args.input, args.column, args.id_column) if p[0] >= start_offset)
+    if args.limit:
+        # Offsets only grow, so stop reading the file at the first post past the limit
+        posts = itertools.takewhile(lambda p: p[0] < start_offset + args.limit, posts)
+
+    done = failed = 0
+    started = last_report = time.monotonic()
+    window = deque()  # In-flight futures in submission order, so results are written in input order
+    max_in_flight = args.workers * 4
+
+    with open(args.output, mode, encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(args.retrieval, args.chroma_dir)
+    ) as pool:
+        def drain(until: int):
+            nonlocal done, failed, last_report
+            while len(window) > until:
+                for result in window.popleft().result():
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    done += 1
+                    failed += 0 if result.get("success") else 1
+                out.flush()
+                now = time.monotonic()
+                if now - last_report >= args.report_every:
+                    last_report = now
+                    print(f"{done} posts, {done / (now - started):.1f} posts/s, {failed} failed")
+
+        for chunk in _chunks(posts, args.chunk_size):
+            window.append(pool.submit(_generate_chunk, chunk, args.seed))
+            drain(max_in_flight)
+        drain(0)
+
+    elapsed = time.monotonic() - started
+    return {
+        "start_offset": start_offset,
+        "generated": done,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 2),
+        "posts_per_second": round(done / elapsed, 2) if elapsed else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate comments for a file of posts")
+    parser.add_argument("input", help="CSV or JSONL file of posts")
+    parser.add_argument("--output", required=True, help="JSONL file to write results to")
+    parser.add_argument("--column", default="post", help="CSV column / JSON key holding the post text")
+    parser.add_argument("--id-column", default=None, help="Optional CSV column / JSON key copied to the output as id")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=16, help="Posts sent to a worker per task")
+    parser.add_argument("--start-offset", type=int, default=0, help="Skip input rows before this offset")
+    parser.add_argument("--limit", type=int, default=None, help="Process at most this many posts")
+    parser.add_argument("--resume", action="store_true", help="Append to --output after its last complete line")
+    parser.add_argument("--retrieval", action="store_true", help="Use Chroma style samples as generation hints")
+    parser.add_argument("--chroma-dir", default="./chroma_style_db")
+    parser.add_argument("--seed", default=None, help="Make output reproducible regardless of worker count")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(f"✅ Bulk generation finished: {report}")
+
+
+if __name__ == "__main__":
+    main()
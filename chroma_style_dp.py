@@ -0,0 +1,135 @@
+"""
+ChromaDB style database operations for users' saved comments.
+
+Every saved comment is stored in the vector store under its stable comment ID
+with {"user_id", "comment_id"} metadata, so it can be updated or removed when
+the comment is edited or deleted. Corpus entries loaded from the CSV carry no
+such metadata.
+
+Run `python chroma_style_dp.py compact [--dry-run]` to purge orphaned and
+stale entries from an existing database and re-index saved comments by ID.
+"""
+import argparse
+
+CORPUS_CSV = "Data  - Transformed Data.csv"
+
+
+def comment_metadata(user_id: str, comment_id: str) -> dict:
+    return {"user_id": user_id, "comment_id": comment_id}
+
+
+def add_comment_vectors(vectordb, user_id: str, comments: list, persist: bool = True):
+    """Adds saved comments ({"id", "comment"} dicts) to the vector store in one batch."""
+    comments = [c for c in comments if c.get("comment", "").strip()]
+    if not comments:
+        return
+    vectordb.add_texts(
+        [c["comment"] for c in comments],
+        metadatas=[comment_metadata(user_id, c["id"]) for c in comments],
+        ids=[c["id"] for c in comments]
+    )
+    if persist:
+        vectordb.persist()
+
+
+def delete_comment_vectors(vectordb, comment_ids: list, persist: bool = True):
+    """Removes vector entries by comment ID (unknown IDs are ignored)."""
+    if not comment_ids:
+        return
+    if hasattr(vectordb, "delete"):
+        vectordb.delete(ids=list(comment_ids))
+    else:
+        # Older langchain releases only expose deletes on the underlying collection
+        vectordb._collection.delete(ids=list(comment_ids))
+    if persist:
+        vectordb.persist()
+
+
+def apply_comment_changes(vectordb, user_id: str, upserted: list = None, removed_ids: list = None):
+    """Upserts edited/new comments and removes deleted ones, keyed by comment ID."""
+    upserted = upserted or []
+    stale_ids = list(removed_ids or []) + [c["id"] for c in upserted]
+    delete_comment_vectors(vectordb, stale_ids, persist=False)
+    add_comment_vectors(vectordb, user_id, upserted, persist=False)
+    if stale_ids:
+        vectordb.persist()
+
+
+def load_corpus_texts(path: str = CORPUS_CSV) -> set:
+    import pandas as pd
+    df = pd.read_csv(path)
+    return set(df["Comment"].dropna().tolist())
+
+
+def compact_style_db(vectordb, saved_comments_by_user: dict, corpus_texts: set, dry_run: bool = False) -> dict:
+    """
+    Purges vector entries that no longer match a saved comment and re-indexes saved comments by ID.
+
+    saved_comments_by_user maps user_id -> list of {"id", "comment"} dicts (the Firestore truth).
+    Entries without comment metadata are kept only if their text is in the CSV corpus
+    (one copy per text); anything else is a legacy or stale saved-comment copy.
+    """
+    live = {}
+    for user_id, comments in saved_comments_by_user.items():
+        for c in comments:
+            if c.get("id") and c.get("comment", "").strip():
+                live[c["id"]] = (user_id, c["comment"])
+
+    entries = vectordb.get(include=["documents", "metadatas"])
+    to_delete = []
+    indexed = set()
+    corpus_seen = set()
+    for entry_id, text, metadata in zip(entries["ids"], entries["documents"], entries["metadatas"]):
+        metadata = metadata or {}
+        comment_id = metadata.get("comment_id")
+        if comment_id:
+            owner = live.get(comment_id)
+            if owner and owner == (metadata.get("user_id"), text) and entry_id == comment_id:
+                indexed.add(comment_id)
+            else:
+                to_delete.append(entry_id)
+        elif text in corpus_texts and text not in corpus_seen:
+            corpus_seen.add(text)
+        else:
+            to_delete.append(entry_id)
+
+    missing = {}
+    for comment_id, (user_id, text) in live.items():
+        if comment_id not in indexed:
+            missing.setdefault(user_id, []).append({"id": comment_id, "comment": text})
+
+    if not dry_run:
+        delete_comment_vectors(vectordb, to_delete, persist=False)
+        for user_id, comments in missing.items():
+            add_comment_vectors(vectordb, user_id, comments, persist=False)
+        vectordb.persist()
+
+    return {
+        "entries_before": len(entries["ids"]),
+        "deleted": len(to_delete),
+        "reindexed": sum(len(c) for c in missing.values()),
+        "entries_after": len(entries["ids"]) - len(to_delete) + sum(len(c) for c in missing.values()),
+        "dry_run": dry_run
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Style vector store maintenance")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--corpus", default=CORPUS_CSV, help="CSV the base style corpus was built from")
+    args = parser.parse_args()
+
+    # Reuse the API's configured Firestore client and vector store
+    from app import db, vectordb, ensure_comment_ids
+
+    saved_comments_by_user = {}
+    for doc in db.collection("users").stream():
+        saved_comments_by_user[doc.id] = ensure_comment_ids((doc.to_dict() or {}).get("comments", []))
+
+    report = compact_style_db(vectordb, saved_comments_by_user, load_corpus_texts(args.corpus), args.dry_run)
+    print(f"✅ Compaction {'(dry run) ' if args.dry_run else ''}finished: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Deterministic local repair of near-miss model candidates.
+
+A candidate that fails exactly one rubric check (a banned phrase, a length
+that is only a few words outside the tolerance, or a missing style marker) is
+fixed here instead of paying for another model call.
+"""
+import re
+
+from comment_rubric import (
+    LENGTH_TOLERANCE,
+    check_response,
+    find_banned_words,
+    style_mismatches,
+)
+
+# Largest distance from the target length we still try to repair (the rubric allows LENGTH_TOLERANCE)
+MAX_LENGTH_REPAIR = 8
+
+# Plain replacements for banned words; anything not listed here is removed instead
+BANNED_SUBSTITUTIONS = {
+    'truly': '',
+    'amazing': 'great',
+    'incredible': 'great',
+    'fantastic': 'great',
+    'outstanding': 'great',
+    'remarkable': 'notable',
+    'exceptional': 'rare',
+    'phenomenal': 'great',
+    'game-changer': 'big shift',
+    'game changer': 'big shift',
+    'gamechanger': 'big shift',
+    'disruptive': 'bold',
+    'innovative': 'fresh',
+    'revolutionary': 'bold',
+    'cutting-edge': 'new',
+    'leverage': 'use',
+    'utilize': 'use',
+    'optimize': 'improve',
+    'maximize': 'make the most of',
+    'synergy': 'teamwork',
+    'paradigm': 'model',
+    'holistic': 'well-rounded',
+    'strategic': 'smart',
+    'dynamic': 'lively',
+    'robust': 'solid',
+    'often': 'usually',
+    'approach': 'method',
+    'unlock': 'open up',
+    'captured': 'put',
+    'spot on': 'so right',
+    'hits hard': 'hits home',
+    'powerful message': 'good message',
+    'foster': 'build',
+    'real driver': 'main reason',
+}
+
+# Banned words that are also verbs, with the verb to use when one is followed by its object
+# ('approach the problem' -> 'tackle the problem', while 'this approach' -> 'this method')
+VERB_SUBSTITUTIONS = {
+    'approach': 'tackle',
+}
+# Words that can follow a verb as its object, and words that mark the banned word as a noun
+_OBJECT_WORDS = r'(?:it|them|this|that|these|those|the|a|an|our|your|their|my|his|her|every|each)'
+_NOUN_MARKERS = {'the', 'this', 'that', 'these', 'those', 'our', 'your', 'their', 'my', 'his', 'her', 'its',
+                 'new', 'same', 'different', 'whole', 'an', 'a'}
+_OBJECT_PRONOUNS = {'it', 'them', 'this', 'that', 'these', 'those'}
+# A phrasal verb's particle goes after a pronoun object: 'open up growth', but 'open it up'
+_PARTICLES = {'up', 'out', 'down', 'off'}
+
+# Short closers used to bring a too-short comment up to length
+LENGTH_CLOSERS = [
+    "Thanks for sharing.",
+    "Needed this today.",
+    "Going to keep this in mind.",
+    "Thanks for putting this into words.",
+    "This is something I needed to hear today.",
+    "Going to share this with my team this week.",
+    "Thanks for being so open about the process here.",
+]
+
+QUESTION_TAG = "What do you think?"
+EMOJI_TAG = "🙂"
+
+_TRAILING_FILLER = {'and', 'but', 'or', 'so', 'because', 'with', 'to', 'the', 'a', 'an', 'of', 'for', 'that'}
+
+
+def _match_case(replacement: str, original: str) -> str:
+    if replacement and original[:1].isupper():
+        return replacement[0].upper() + replacement[1:]
+    return replacement
+
+
+def _substitute(match, substitute: str) -> str:
+    article, phrase, obj = match.group(1), match.group(2), match.group(3)
+    if obj:
+        preceding = match.string[:match.start()].split()
+        is_noun = article or (preceding and preceding[-1].lower() in _NOUN_MARKERS)
+        substitute = substitute if is_noun else VERB_SUBSTITUTIONS.get(phrase.lower(), substitute)
+        words = substitute.split()
+        if len(words) == 2 and words[1] in _PARTICLES and obj.lower() in _OBJECT_PRONOUNS:
+            substitute = f"{words[0]} {obj} {words[1]}"
+        else:
+            substitute = f"{substitute} {obj}"
+    replacement = _match_case(substitute, phrase)
+    if not article:
+        return replacement
+    if not replacement:
+        return article
+    # 'an amazing' -> 'a great'
+    new_article = 'an' if replacement[0].lower() in 'aeiou' else 'a'
+    return f"{_match_case(new_article, article)} {replacement}"
+
+
+def _tidy(text: str) -> str:
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'\s+([,.!?;:])', r'\1', text)
+    # Separators left on both sides of a removed word: 'great, truly, post' -> 'great, post'
+    text = re.sub(r'([,;:])(?:\s*[,;:])+', r'\1', text)
+    text = re.sub(r'([,;:])\s*([.!?])', r'\2', text)
+    text = re.sub(r'^[,.;:\s]+', '', text)
+    text = re.sub(r'([.!?])\s*[,;:]+', r'\1', text)
+    # Re-capitalize sentence starts that lost their first word
+    text = re.sub(r'(^|[.!?]\s+)([a-z])', lambda m: m.group(1) + m.group(2).upper(), text)
+    return text
+
+
+def _split_sentences(text: str) -> list:
+    return [s for s in re.split(r'(?<=[.!?])\s+', text.strip()) if s]
+
+
+def remove_banned_phrases(text: str, banned_words) -> str:
+    """
+    Substitutes or removes every banned phrase in text. Only whole words match,
+    so 'approachable' or 'Unlocking' are left alone rather than corrupted.
+    """
+    # Longest phrases first so 'game changer' wins over any shorter overlap
+    for banned in sorted(find_banned_words(text, banned_words), key=len, reverse=True):
+        pattern = re.compile(
+            r'(?<!\w)(?:(an?)\s+)?(' + re.escape(banned) + r')(?!\w)(?:\s+(' + _OBJECT_WORDS + r')(?!\w))?',
+            re.IGNORECASE
+        )
+        substitute = BANNED_SUBSTITUTIONS.get(banned.lower())
+        if substitute is not None:
+            text = pattern.sub(lambda m: _substitute(m, substitute), text)
+            continue
+        # Unmapped phrases are usually stock sentences: drop the sentence if others remain
+        sentences = _split_sentences(text)
+        kept = [s for s in sentences if not pattern.search(s)]
+        text = ' '.join(kept) if kept and len(kept) < len(sentences) else pattern.sub('', text)
+    return _tidy(text)
+
+
+def fit_length(text: str, avg_length: int, banned_words=()) -> str:
+    """Trims or extends text so its word count is within LENGTH_TOLERANCE of avg_length."""
+    words = text.split()
+    if len(words) > avg_length + LENGTH_TOLERANCE:
+        # Prefer dropping whole trailing sentences
+        sentences = _split_sentences(text)
+        while len(sentences) > 1 and len(' '.join(sentences).split()) > avg_length + LENGTH_TOLERANCE:
+            candidate = sentences[:-1]
+            if len(' '.join(candidate).split()) < avg_length - LENGTH_TOLERANCE:
+                break
+            sentences = candidate
+        text = ' '.join(sentences)
+        words = text.split()
+        if len(words) > avg_length + LENGTH_TOLERANCE:
+            words = words[:avg_length]
+            while len(words) > 1 and words[-1].lower().strip(',;:') in _TRAILING_FILLER:
+                words.pop()
+            text = ' '.join(words).rstrip(',;:-—')
+            if text and text[-1] not in '.!?':
+                text += '.'
+    elif len(words) < avg_length - LENGTH_TOLERANCE:
+        missing = avg_length - len(words)
+        closers = [c for c in LENGTH_CLOSERS if not find_banned_words(c, banned_words)]
+        if closers:
+            closer = min(closers, key=lambda c: abs(len(c.split()) - missing))
+            if text and text[-1] not in '.!?':
+                text += '.'
+            text = f"{text} {closer}"
+    return _tidy(text)
+
+
+def fit_style(text: str, style: dict) -> str:
+    """Adds the punctuation/emoji markers the style profile expects."""
+    missing = style_mismatches(text, style)
+    if 'exclamation' in missing:
+        sentences = _split_sentences(text)
+        # Turn the first plain statement into an exclamation
+        for i, sentence in enumerate(sentences):
+            if sentence.endswith('.'):
+                sentences[i] = sentence[:-1] + '!'
+                break
+        else:
+            if sentences:
+                sentences[-1] = sentences[-1].rstrip('.?') + '!'
+        text = ' '.join(sentences)
+    if 'question' in missing:
+        text = f"{text} {QUESTION_TAG}"
+    if 'emoji' in missing:
+        text = f"{text} {EMOJI_TAG}"
+    return text.strip()
+
+
+def repair_response(text: str, banned_words, avg_length: int = None, style: dict = None):
+    """
+    Repairs a candidate that fails exactly one rubric check.
+    Returns the repaired text when it passes every check, otherwise None.
+    """
+    checks = check_response(text, banned_words, avg_length, style)
+    failed = [name for name, passed in checks.items() if not passed]
+    if len(failed) != 1:
+        return None
+
+    failed_check = failed[0]
+    if failed_check == 'banned_words':
+        repaired = remove_banned_phrases(text, banned_words)
+        if avg_length:
+            repaired = fit_length(repaired, avg_length, banned_words)
+    elif failed_check == 'length':
+        if abs(len(text.split()) - avg_length) > MAX_LENGTH_REPAIR:
+            return None
+        repaired = fit_length(text, avg_length, banned_words)
+    else:
+        repaired = fit_style(text, style)
+        if avg_length:
+            repaired = fit_length(repaired, avg_length, banned_words)
+
+    if repaired and all(check_response(repaired, banned_words, avg_length, style).values()):
+        return repaired
+    return None
@@ -0,0 +1,43 @@
+"""
+Validation rubric for generated comments: banned words, target length and
+style markers (emoji, exclamation, question) taken from the user's comments.
+"""
+
+EMOJI_CHARS = '😀😁😂🤣😃😄😅😆😉😊😋😎😍😘🥰😗😙😚🙂🤗🤩🤔🤨😐😑😶🙄😏😣😥😮🤐😯😪😫😴😌😛😜😝🤤😒😓😔😕🙃🤑😲☹️🙁😖😞😟😤😢😭😦😧😨😩🤯😬😰😱🥵🥶😳🤪😵😡😠🤬😷🤒🤕🤢🤮🤧😇🥳🥺🤠🤡🤥🤫🤭🧐🤓😈👿👹👺💀👻👽👾🤖😺😸😹😻😼😽🙀😿😾'
+
+# Allowed distance (in words) from the target length
+LENGTH_TOLERANCE = 5
+
+
+def find_banned_words(text: str, banned_words) -> list:
+    """Returns the banned words/phrases that occur in text (case-insensitive substring match)."""
+    text_lower = text.lower()
+    return [bw for bw in banned_words if bw.lower() in text_lower]
+
+
+def style_mismatches(text: str, style: dict) -> list:
+    """Lists the style markers required by style that text is missing."""
+    if not style:
+        return []
+    missing = []
+    if style.get('has_emoji') and not any(char in text for char in EMOJI_CHARS):
+        missing.append('emoji')
+    if style.get('has_exclamation') and '!' not in text:
+        missing.append('exclamation')
+    if style.get('has_question') and '?' not in text:
+        missing.append('question')
+    return missing
+
+
+def check_response(text: str, banned_words, avg_length: int = None, style: dict = None) -> dict:
+    """Runs every rubric check and returns {check_name: passed}."""
+    return {
+        'banned_words': not find_banned_words(text, banned_words),
+        'length': not avg_length or abs(len(text.split()) - avg_length) <= LENGTH_TOLERANCE,
+        'style': not style_mismatches(text, style),
+    }
+
+
+def score_response(text: str, banned_words, avg_length: int = None, style: dict = None) -> int:
+    """Number of rubric checks passed (0-3)."""
+    return sum(check_response(text, banned_words, avg_length, style).values())
@@ -0,0 +1,230 @@
+"""
+Background writer for /chatbot history.
+
+Chat turns are appended to a local spool file and queued; a background task
+drains the queue in batches, coalesces the turns per user into a single
+Firestore read/update, and retries with backoff. The queue is bounded, so
+when Firestore falls behind enqueue() waits (backpressure) instead of growing
+memory without limit. stop() flushes the queue on shutdown.
+
+Each process spools to its own file, history_spool.<pid>.jsonl, and holds a
+lock on it while running. At startup a worker takes over the spool files of
+processes that are gone (their lock is free) and replays them. Where file
+locks are unavailable (Windows), only this process's own spool is replayed.
+"""
+import asyncio
+import glob
+import json
+import os
+import random
+from collections import defaultdict
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from user_doc_cache import update_array_field
+
+
+def _encode_entry(user_id: str, session_id: str, chat_data: dict) -> str:
+    data = dict(chat_data)
+    if isinstance(data.get("timestamp"), datetime):
+        data["timestamp"] = data["timestamp"].isoformat()
+    return json.dumps({"user_id": user_id, "session_id": session_id, "chat_data": data})
+
+
+def _decode_entry(line: str):
+    entry = json.loads(line)
+    timestamp = entry["chat_data"].get("timestamp")
+    if isinstance(timestamp, str):
+        entry["chat_data"]["timestamp"] = datetime.fromisoformat(timestamp)
+    return entry["user_id"], entry["session_id"], entry["chat_data"]
+
+
+class HistoryWriter:
+    def __init__(self, db, max_queue: int = 1000, batch_size: int = 50, flush_interval: float = 0.25,
+                 max_retries: int = 5, spool_path: str = "history_spool.jsonl", user_docs=None):
+        self.db = db
+        # Optional UserDocCache kept in sync with what is written
+        self.user_docs = user_docs
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.spool_base = spool_path
+        self.spool_path = None  # Set per process by start()
+        self.dead_letter_path = spool_path.replace(".jsonl", ".failed.jsonl")
+        self._spool_lock = None
+        self._queue = None
+        self._task = None
+        self._in_flight = 0
+
+    @property
+    def pending(self) -> int:
+        return (self._queue.qsize() if self._queue else 0) + self._in_flight
+
+    def _lock_spool(self, path: str):
+        """An open handle holding an exclusive lock on path, or None if another live process holds it."""
+        handle = open(path, "a", encoding="utf-8")
+        if fcntl is None:
+            return handle
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    def _claim_orphaned_spools(self) -> list:
+        """Moves the entries of spool files left by exited processes into this process's spool."""
+        root, ext = os.path.splitext(self.spool_base)
+        candidates = [self.spool_base] if fcntl is None else glob.glob(f"{root}*{ext}")
+        lines = []
+        for path in candidates:
+            if path == self.spool_path or path == self.dead_letter_path or not os.path.exists(path):
+                continue
+            handle = self._lock_spool(path)
+            if handle is None:
+                continue  # Still owned by a running worker
+            try:
+                with open(path, encoding="utf-8") as f:
+                    orphaned = [line for line in f if line.strip()]
+                with open(self.spool_path, "a", encoding="utf-8") as f:
+                    f.writelines(orphaned)
+                os.remove(path)
+                lines.extend(orphaned)
+            except OSError as e:
+                print(f"Error taking over spooled history from {path}: {e}")
+            finally:
+                handle.close()
+        return lines
+
+    async def start(self):
+        """Replays anything left in this or exited workers' spools and starts the background task."""
+        root, ext = os.path.splitext(self.spool_base)
+        self.spool_path = f"{root}.{os.getpid()}{ext}"
+        while True:
+            self._spool_lock = self._lock_spool(self.spool_path)
+            # Another worker may have taken the file over between open and lock; lock a fresh one then
+            if self._spool_lock is None or os.path.exists(self.spool_path) and os.path.samestat(
+                    os.fstat(self._spool_lock.fileno()), os.stat(self.spool_path)):
+                break
+            self._spool_lock.close()
+        with open(self.spool_path, encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+        lines.extend(self._claim_orphaned_spools())
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        if lines:
+            print(f"Replaying {len(lines)} spooled history entries")
+        for line in lines:
+            try:
+                await self._queue.put(_decode_entry(line))
+            except (ValueError, KeyError) as e:
+                print(f"Skipping corrupt spooled history entry: {e}")
+
+    async def enqueue(self, user_id: str, session_id: str, chat_data: dict):
+        """Spools and queues one chat turn; waits while the queue is full."""
+        if self._queue is None:
+            raise RuntimeError("HistoryWriter.start() must be awaited before enqueue()")
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            f.write(_encode_entry(user_id, session_id, chat_data) + "\n")
+        await self._queue.put((user_id, session_id, chat_data))
+
+    async def stop(self, timeout: float = 10.0):
+        """Flushes queued entries (up to timeout seconds) and stops the background task."""
+        if not self._task:
+            return
+        flushed = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            flushed = False
+            print(f"History writer stopped with {self.pending} entries still spooled")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if flushed:
+            try:
+                os.remove(self.spool_path)  # Everything was written or dead-lettered
+            except OSError as e:
+                print(f"Error removing history spool: {e}")
+        if self._spool_lock is not None:
+            self._spool_lock.close()
+            self._spool_lock = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self._in_flight = len(batch)
+            try:
+                await self._write_batch(batch)
+            finally:
+                self._in_flight = 0
+                for _ in batch:
+                    self._queue.task_done()
+            if self._queue.empty():
+                # Everything spooled so far is either written or dead-lettered
+                open(self.spool_path, "w").close()
+
+    async def _write_batch(self, batch: list):
+        by_user = defaultdict(list)
+        for user_id, session_id, chat_data in batch:
+            by_user[user_id].append((session_id, chat_data))
+
+        for user_id, entries in by_user.items():
+            for attempt in range(self.max_retries):
+                try:
+                    await asyncio.to_thread(self._apply_user_entries, user_id, entries)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries - 1:
+                        print(f"Giving up on history write for user {user_id}: {e}")
+                        self._dead_letter(user_id, entries)
+                        break
+                    # Exponential backoff with jitter
+                    await asyncio.sleep(min(5.0, 0.2 * 2 ** attempt) * (0.5 + random.random()))
+
+    def _apply_user_entries(self, user_id: str, entries: list):
+        """One conditional update for all of a user's pending turns."""
+        # Read Firestore itself (not the cache), and redo the merge if a worker changed the sessions meanwhile
+        def append_turns(sessions):
+            by_session = {session["session_id"]: session for session in sessions}
+            for session_id, chat_data in entries:
+                session = by_session.get(session_id)
+                if session is None:
+                    session = {"session_id": session_id, "queries": [], "created_at": chat_data["timestamp"]}
+                    sessions.append(session)
+                    by_session[session_id] = session
+                session.setdefault("queries", []).append(chat_data)
+            return sessions
+
+        user_ref = self.db.collection("users").document(user_id)
+        sessions = update_array_field(self.db, user_ref, "chat_sessions", append_turns)
+        if sessions is None:
+            print(f"Dropping history for missing user {user_id}")
+            return
+        if self.user_docs is not None:
+            self.user_docs.update_fields(user_id, {"chat_sessions": sessions})
+
+    def _dead_letter(self, user_id: str, entries: list):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for session_id, chat_data in entries:
+                f.write(_encode_entry(user_id, session_id, chat_data) + "\n")
@@ -0,0 +1,86 @@
+"""
+Helpers for list endpoints: opaque cursors, field projection and compact JSON
+responses with ETag / If-None-Match support.
+"""
+import base64
+import hashlib
+import json
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional; the stdlib encoder is used without it
+    orjson = None
+
+
+def encode_cursor(key: str, index: int) -> str:
+    raw = json.dumps({"k": key, "i": index}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return {"k": str(data["k"]), "i": int(data["i"])}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(items: list, cursor: str, limit: int, key) -> tuple:
+    """
+    Returns (page, next_cursor). The cursor names the last item of the previous page,
+    so the next page still starts in the right place if earlier items were deleted.
+    """
+    start = 0
+    if cursor:
+        position = decode_cursor(cursor)
+        index = position["i"]
+        if 0 <= index < len(items) and key(items[index]) == position["k"]:
+            start = index + 1
+        else:
+            # The list shifted since the cursor was issued: look the item up by key
+            keys = [key(item) for item in items]
+            start = keys.index(position["k"]) + 1 if position["k"] in keys else min(index, len(items))
+    page = items[start:start + limit]
+    next_cursor = None
+    if page and start + len(page) < len(items):
+        next_cursor = encode_cursor(key(page[-1]), start + len(page) - 1)
+    return page, next_cursor
+
+
+def parse_fields(fields: str, allowed: set):
+    """Validates a comma-separated projection; None means all fields."""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    return requested
+
+
+def project(items: list, fields) -> list:
+    if fields is None:
+        return items
+    return [{k: v for k, v in item.items() if k in fields} for item in items]
+
+
+def render_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str)
+    return json.dumps(jsonable_encoder(payload), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def etag_json_response(request: Request, payload) -> Response:
+    """JSON response with a content ETag; answers 304 when the client already has this version."""
+    body = render_json(payload)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -3,15 +3,18 @@ import re
 from typing import Dict, List, Tuple
 from collections import defaultdict
 import json
-from load_and_embed import vectordb
 import os
 from langchain.vectorstores import Chroma
 from langchain.embeddings import OpenAIEmbeddings
 import pandas as pd
+from comment_rubric import EMOJI_CHARS
+from template_embeddings import TemplateIndex
 
 
 class HumanStyleGenerator:
-    def __init__(self):
+    def __init__(self, vectordb=None):
+        # Style store used as a last-resort source of sample comments
+        self.vectordb = vectordb
         # Real human patterns from saywhat.ai data
         self.human_patterns = {
             "agreement_short": [
@@ -94,6 +97,10 @@ class HumanStyleGenerator:
         
         # Memory for avoiding repetition
         self.used_patterns = defaultdict(set)
+
+        # Precomputed theme/template embeddings; templates are ranked against the post
+        self.template_index = TemplateIndex(self.human_patterns)
+        self.template_top_k = 3
         
     def extract_specific_points(self, post_content: str) -> List[str]:
         """Extract numbered or bulleted points from post content"""
@@ -110,26 +117,11 @@ class HumanStyleGenerator:
         }
         return meaningful_words
     
-    def analyze_post_theme(self, post_content: str) -> str:
-        """Analyze post to determine theme"""
-        content_lower = post_content.lower()
-        
-        themes = {
-            'career_growth': ['career', 'growth', 'promotion', 'success', 'achievement'],
-            'leadership': ['leadership', 'team', 'management', 'culture', 'people'],
-            'business_strategy': ['business', 'strategy', 'roi', 'revenue', 'growth'],
-            'personal_story': ['journey', 'experience', 'learned', 'challenge', 'overcome'],
-            'advice_sharing': ['advice', 'tip', 'lesson', 'learned', 'mistake'],
-            'networking': ['connection', 'relationship', 'network', 'community'],
-            'motivation': ['motivation', 'inspiration', 'mindset', 'attitude'],
-            'well_being': ['mental health', 'burnout', 'well-being', 'health', 'rest']
-        }
-        
-        for theme, keywords in themes.items():
-            if any(keyword in content_lower for keyword in keywords):
-                return theme
-                
-        return 'general_business'
+    def analyze_post_theme(self, post_content: str, scores: dict = None) -> str:
+        """Analyze post to determine theme (closest theme prototype by embedding similarity)"""
+        if scores is None:
+            scores = self.template_index.score(post_content)
+        return self.template_index.best_theme(scores)
     
     def get_post_sentiment(self, post_content: str) -> str:
         """Determine post sentiment"""
@@ -147,7 +139,8 @@ class HumanStyleGenerator:
         else:
             return 'neutral'
     
-    def select_human_pattern(self, theme: str, sentiment: str, post_id: str, has_specific_point: bool) -> Tuple[str, str]:
+    def select_human_pattern(self, theme: str, sentiment: str, post_id: str, has_specific_point: bool,
+                             template_scores: dict = None) -> Tuple[str, str]:
         """Select appropriate human pattern based on context and available content"""
         used_for_post = self.used_patterns.get(post_id, set())
         
@@ -169,7 +162,7 @@ class HumanStyleGenerator:
         
         available_patterns = []
         for pattern_type in pattern_options:
-            for pattern in self.human_patterns[pattern_type]:
+            for pattern in self.human_patterns.get(pattern_type, []):
                 if '{specific_point}' in pattern and not has_specific_point:
                     continue
                 if pattern not in used_for_post:
@@ -178,11 +171,15 @@ class HumanStyleGenerator:
         if not available_patterns:
             self.used_patterns[post_id] = set()
             for pattern_type in pattern_options:
-                for pattern in self.human_patterns[pattern_type]:
+                for pattern in self.human_patterns.get(pattern_type, []):
                     if '{specific_point}' in pattern and not has_specific_point:
                         continue
                     available_patterns.append((pattern_type, pattern))
         
+        if template_scores:
+            # Pick among the templates closest to the post
+            available_patterns.sort(key=lambda option: template_scores.get(option, 0.0), reverse=True)
+            available_patterns = available_patterns[:self.template_top_k]
         selected_pattern = random.choice(available_patterns)
         self.used_patterns[post_id].add(selected_pattern[1])
         
@@ -196,18 +193,18 @@ class HumanStyleGenerator:
             fill_content['specific_point'] = sentences[0]
         
         if '{insight}' in post_content or theme == 'advice_sharing':
-            fill_content['insight'] = random.choice(['this approach', 'this mindset', 'this perspective'])
+            fill_content['insight'] = random.choice(['this way of thinking', 'this mindset', 'this perspective'])
         
         if '{topic}' in post_content or theme in ['business_strategy', 'leadership', 'well_being']:
-            fill_content['topic'] = random.choice(['this strategy', 'this approach', 'building trust', 'mental health'])
+            fill_content['topic'] = random.choice(['this strategy', 'this method', 'building trust', 'mental health'])
         
         if '{lesson}' in post_content or theme == 'personal_story':
             fill_content['lesson'] = random.choice(['persistence', 'patience', 'consistency'])
         
         fill_content.update({
             'point': random.choice(['building relationships', 'taking action', 'consistency']),
-            'observation': random.choice(['timing', 'approach', 'mindset']),
-            'reason': random.choice(['experience', 'timing', 'approach']),
+            'observation': random.choice(['timing', 'framing', 'mindset']),
+            'reason': random.choice(['experience', 'timing', 'method']),
             'outcome': random.choice(['the learning', 'the growth', 'the experience']),
             'action': random.choice(['implement this', 'make the change', 'take action']),
             'subject': random.choice(['leadership', 'growth', 'culture', 'well-being']),
@@ -218,6 +215,10 @@ class HumanStyleGenerator:
             'challenge': random.choice(['resistance', 'setbacks', 'time management']),
             'personal_experience': random.choice(['my own journey', 'a similar situation', 'past challenges'])
         })
+        # Placeholders that are only filled for some themes still need a value
+        fill_content.setdefault('topic', random.choice(['this method', 'building trust', 'this idea']))
+        fill_content.setdefault('insight', random.choice(['this way of thinking', 'this mindset', 'this perspective']))
+        fill_content.setdefault('lesson', random.choice(['persistence', 'patience', 'consistency']))
         
         return fill_content
     
@@ -282,7 +283,7 @@ class HumanStyleGenerator:
         sentiment = Counter(sentiments).most_common(1)[0][0] if sentiments else None
         # Style: crude detection (e.g., emoji, exclamation, question, etc.)
         style = {
-            'has_emoji': any(any(char in t for char in '😀😁😂🤣😃😄😅😆😉😊😋😎😍😘🥰😗😙😚🙂🤗🤩🤔🤨😐😑😶🙄😏😣😥😮🤐😯😪😫😴😌😛😜😝🤤😒😓😔😕🙃🤑😲☹️🙁😖😞😟😤😢😭😦😧😨😩🤯😬😰😱🥵🥶😳🤪😵😡😠🤬😷🤒🤕🤢🤮🤧😇🥳🥺🤠🤡🤥🤫🤭🧐🤓😈👿👹👺💀👻👽👾🤖😺😸😹😻😼😽🙀😿😾') for t in texts),
+            'has_emoji': any(any(char in t for char in EMOJI_CHARS) for t in texts),
             'has_exclamation': any('!' in t for t in texts),
             'has_question': any('?' in t for t in texts),
             'avg_length': avg_length
@@ -292,20 +293,24 @@ class HumanStyleGenerator:
     def generate_comment(self, post_content: str, post_id: str, user_id: str = None, saved_comment_props: dict = None) -> Dict:
         """Generate human-style comment, prioritizing saved comment properties if provided."""
         try:
+            # One embedding of the post scores every theme and template
+            scores = self.template_index.score(post_content)
             # Use saved comment properties if available
             if saved_comment_props:
                 theme = saved_comment_props.get('theme')
                 sentiment = saved_comment_props.get('sentiment')
                 avg_length = saved_comment_props.get('avg_length')
             else:
-                theme = self.analyze_post_theme(post_content)
+                theme = self.analyze_post_theme(post_content, scores)
                 sentiment = self.get_post_sentiment(post_content)
                 avg_length = None
             post_keywords = self.extract_post_keywords(post_content)
             specific_points = self.extract_specific_points(post_content)
             # Try to select a human pattern
             try:
-                pattern_type, selected_pattern = self.select_human_pattern(theme, sentiment, post_id, bool(specific_points))
+                pattern_type, selected_pattern = self.select_human_pattern(
+                    theme, sentiment, post_id, bool(specific_points), scores["templates"]
+                )
             except Exception:
                 pattern_type, selected_pattern = None, None
             comment = None
@@ -335,7 +340,7 @@ class HumanStyleGenerator:
             # Fallback: If no pattern or comment, use ChromaDB similarity search
             if not comment or not comment.strip():
                 try:
-                    results = vectordb.similarity_search(post_content, k=5)
+                    results = self.vectordb.similarity_search(post_content, k=5) if self.vectordb else []
                     clean_comment = None
                     for r in results:
                         c = r.page_content
@@ -0,0 +1,199 @@
+"""
+In-process job queue for long-running generation requests.
+
+Clients submit a job and poll for its result instead of holding a connection
+open while the model is retried. Each lane (e.g. interactive and bulk) has its
+own priority queue and worker pool, so bulk submissions cannot starve
+interactive users. Queued jobs can be cancelled; finished results are kept for
+result_ttl seconds. An optional callback URL on the local machine is POSTed
+the finished job.
+
+Jobs are kept in this process only: run job mode with a single API worker
+(or route a client's polls to the worker that accepted the job).
+"""
+import asyncio
+import itertools
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import urlparse
+
+import httpx
+
+from metrics import metrics
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+LOCAL_CALLBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def is_local_callback_url(url: str) -> bool:
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and parsed.hostname in LOCAL_CALLBACK_HOSTS
+
+
+class JobQueue:
+    def __init__(self, handler, lanes: dict = None, max_queued: int = 1000,
+                 result_ttl: float = 600.0, callback_timeout: float = 5.0):
+        """
+        handler is an async callable taking the job payload and returning a JSON-serializable result.
+        lanes maps lane name -> number of workers.
+        """
+        self.handler = handler
+        self.lanes = dict(lanes or {"interactive": 4, "bulk": 1})
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.callback_timeout = callback_timeout
+        self._jobs = {}
+        self._running = {}  # job_id -> asyncio.Task of the handler
+        self._queues = {}
+        self._workers = []
+        self._sequence = itertools.count()  # FIFO order among equal priorities
+        self._http = None
+
+    async def start(self):
+        self._http = httpx.AsyncClient(timeout=self.callback_timeout)
+        for lane, worker_count in self.lanes.items():
+            self._queues[lane] = asyncio.PriorityQueue()
+            for _ in range(worker_count):
+                self._workers.append(asyncio.create_task(self._worker(lane)))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._http:
+            await self._http.aclose()
+
+    def queued_count(self, lane: str = None) -> int:
+        queues = [self._queues[lane]] if lane else self._queues.values()
+        return sum(q.qsize() for q in queues)
+
+    def submit(self, payload: dict, lane: str = "interactive", priority: int = 5, callback_url: str = None) -> dict:
+        """Queues a job; higher priority runs first within its lane. Raises QueueFullError when saturated."""
+        if lane not in self._queues:
+            raise ValueError(f"Unknown lane '{lane}', expected one of {sorted(self._queues)}")
+        if callback_url and not is_local_callback_url(callback_url):
+            raise ValueError("callback_url must point to localhost")
+        self._purge_expired()
+        if self.queued_count() >= self.max_queued:
+            metrics.incr("jobs.rejected")
+            raise QueueFullError("Job queue is full, retry later")
+
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "lane": lane,
+            "priority": priority,
+            "payload": payload,
+            "callback_url": callback_url,
+            "result": None,
+            "error": None,
+            "created_at": datetime.now(),
+            "started_at": None,
+            "finished_at": None,
+            "_queued_at": time.monotonic(),
+            "_expires_at": None,
+        }
+        self._queues[lane].put_nowait((-priority, next(self._sequence), job_id))
+        metrics.incr("jobs.submitted")
+        metrics.set_gauge(f"jobs.queued.{lane}", self._queues[lane].qsize())
+        return self.status(job_id)
+
+    def get(self, job_id: str):
+        """The job record, or None if unknown or expired."""
+        self._purge_expired()
+        return self._jobs.get(job_id)
+
+    def status(self, job_id: str):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if not k.startswith("_") and k not in ("payload", "result")}
+
+    def cancel(self, job_id: str):
+        """Cancels a queued or running job; returns its status, or None if unknown."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job["status"] in ("queued", "running"):
+            task = self._running.get(job_id)
+            self._finish(job, "cancelled")
+            if task:
+                task.cancel()
+        return self.status(job_id)
+
+    def _finish(self, job: dict, status: str, result=None, error: str = None):
+        job["status"] = status
+        job["result"] = result
+        job["error"] = error
+        job["finished_at"] = datetime.now()
+        job["_expires_at"] = time.monotonic() + self.result_ttl
+        metrics.incr(f"jobs.{status}")
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["_expires_at"] is not None and job["_expires_at"] <= now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _worker(self, lane: str):
+        queue = self._queues[lane]
+        while True:
+            _, _, job_id = await queue.get()
+            metrics.set_gauge(f"jobs.queued.{lane}", queue.qsize())
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue  # Cancelled (or expired) while waiting
+
+            job["status"] = "running"
+            job["started_at"] = datetime.now()
+            started = time.monotonic()
+            metrics.observe("jobs.wait_seconds", started - job["_queued_at"])
+            task = asyncio.create_task(self.handler(job["payload"]))
+            self._running[job_id] = task
+            try:
+                result = await task
+                self._finish(job, "succeeded", result=result)
+            except asyncio.CancelledError:
+                if job["status"] != "cancelled":
+                    # The worker itself is shutting down
+                    task.cancel()
+                    self._finish(job, "failed", error="Server shutting down")
+                    raise
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+                self._finish(job, "failed", error=str(e))
+            finally:
+                self._running.pop(job_id, None)
+                metrics.observe("jobs.run_seconds", time.monotonic() - started)
+
+            if job["callback_url"]:
+                await self._send_callback(job)
+
+    async def _send_callback(self, job: dict):
+        body = self.status(job["job_id"]) or {}
+        body["result"] = job["result"]
+        try:
+            response = await self._http.post(job["callback_url"], json=_jsonable(body))
+            response.raise_for_status()
+        except Exception as e:
+            metrics.incr("jobs.callback_failed")
+            print(f"Error delivering callback for job {job['job_id']}: {e}")
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
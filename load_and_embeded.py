@@ -12,6 +12,17 @@ import pandas as pd
 df = pd.read_csv("Data  - Transformed Data.csv")
 comments = df["Comment"].dropna().tolist()
 
+# Drop near-identical comments before embedding (NEAR_DUP_ACTION: skip | merge | flag)
+from near_dup import dedupe_texts
+near_dup_action = os.getenv("NEAR_DUP_ACTION", "skip")
+comments, dedupe_report = dedupe_texts(
+    comments,
+    threshold=float(os.getenv("NEAR_DUP_THRESHOLD", "0.85")),
+    action=near_dup_action
+)
+print(f"Near-duplicate check ({near_dup_action}): kept {dedupe_report['kept']} of {dedupe_report['input']} comments, "
+      f"{dedupe_report['near_duplicates']} near-duplicates found")
+
 vectordb = Chroma.from_texts(
     texts=comments,
     embedding=embedding,
@@ -0,0 +1,293 @@
+"""
+Async load generator for the FastAPI service.
+
+Replays a weighted mix of /chatbot/, /save_comment/ and /get_comments/ calls
+built from a JSONL workload file (one {"user_id": ..., "post": ..., "comment": ...}
+object per line) and reports throughput, latency percentiles, error rate and
+event-loop lag.
+
+Examples:
+    # In-process against the ASGI app with local fakes (fully offline)
+    python load_test.py workload.jsonl --target inprocess --concurrency 20 --duration 30
+
+    # Over HTTP against a running uvicorn worker
+    python load_test.py workload.jsonl --target http://127.0.0.1:8000 --mix chatbot=8,get_comments=2
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+DEFAULT_MIX = {"chatbot": 6, "save_comment": 2, "get_comments": 2}
+
+
+def load_workload(path: str) -> list:
+    """Reads workload records from a JSONL file, skipping blank and malformed lines."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed workload line {line_number}")
+                continue
+            if record.get("user_id") and (record.get("post") or record.get("comment")):
+                records.append(record)
+    if not records:
+        raise ValueError(f"No usable records in workload file '{path}'")
+    return records
+
+
+def parse_mix(mix: str) -> dict:
+    """Parses 'chatbot=6,save_comment=2' into endpoint weights."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown endpoint in mix: '{name}'")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from short sleeps."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class LoadRunner:
+    def __init__(self, client: httpx.AsyncClient, records: list, weights: dict, seed: int = None):
+        self.client = client
+        self.records = records
+        self.endpoints = list(weights.keys())
+        self.weights = list(weights.values())
+        self.random = random.Random(seed)
+        self.sessions = {}  # user_id -> session_id returned by /chatbot/
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def _call(self, endpoint: str, record: dict):
+        user_id = record["user_id"]
+        if endpoint == "chatbot":
+            payload = {"query": record.get("post") or record["comment"], "user_id": user_id}
+            if self.sessions.get(user_id):
+                payload["session_id"] = self.sessions[user_id]
+            response = await self.client.post("/chatbot/", json=payload)
+            if response.status_code == 200:
+                session_id = response.json().get("session_id")
+                if session_id:
+                    self.sessions[user_id] = session_id
+                else:
+                    # The endpoint reports internal failures as a fallback body with no session
+                    return False
+            return response.status_code == 200
+        if endpoint == "save_comment":
+            payload = {"comment": record.get("comment") or record["post"], "user_id": user_id}
+            response = await self.client.post("/save_comment/", json=payload)
+            return response.status_code == 200
+        response = await self.client.get(f"/get_comments/{user_id}")
+        return response.status_code == 200
+
+    async def worker(self, start_delay: float, deadline: float, budget: list):
+        await asyncio.sleep(start_delay)
+        while time.perf_counter() < deadline:
+            if budget is not None:
+                if budget[0] <= 0:
+                    return
+                budget[0] -= 1
+            endpoint = self.random.choices(self.endpoints, weights=self.weights)[0]
+            record = self.random.choice(self.records)
+            started = time.perf_counter()
+            try:
+                ok = await self._call(endpoint, record)
+            except Exception as e:
+                print(f"{endpoint} request error: {e}")
+                ok = False
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+def seed_fake_users(app_module, records: list):
+    """Creates a Firestore user document for every workload user in the in-memory fake."""
+    for user_id in {r["user_id"] for r in records}:
+        app_module.db.collection("users").document(user_id).set({
+            "email": f"{user_id}@example.com",
+            "name": user_id,
+            "comments": [],
+            "chat_sessions": []
+        })
+
+
+def app_lifespan(app):
+    """The app's startup/shutdown hooks around an in-process run; ASGITransport does not send lifespan events."""
+    if app is None:
+        return contextlib.nullcontext()
+    return app.router.lifespan_context(app)
+
+
+def build_client(target: str, concurrency: int, timeout: float, use_fakes: bool, records: list):
+    """The HTTP client for the run, and the in-process ASGI app (None when targeting a URL)."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if target != "inprocess":
+        return httpx.AsyncClient(base_url=target, limits=limits, timeout=timeout), None
+
+    if use_fakes:
+        os.environ["USE_LOCAL_FAKES"] = "1"
+    import app as app_module
+    if getattr(app_module, "USE_LOCAL_FAKES", False):
+        seed_fake_users(app_module, records)
+    transport = httpx.ASGITransport(app=app_module.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", limits=limits, timeout=timeout)
+    return client, app_module.app
+
+
+def build_report(runner: LoadRunner, lag_samples: list, elapsed: float) -> dict:
+    report = {"elapsed_s": round(elapsed, 3), "endpoints": {}}
+    all_latencies = []
+    total_errors = 0
+    for endpoint in runner.endpoints:
+        latencies = sorted(runner.latencies.get(endpoint, []))
+        errors = runner.errors.get(endpoint, 0)
+        all_latencies.extend(latencies)
+        total_errors += errors
+        report["endpoints"][endpoint] = summarize(latencies, errors, elapsed)
+    report["overall"] = summarize(sorted(all_latencies), total_errors, elapsed)
+    lag = sorted(lag_samples)
+    report["event_loop_lag_ms"] = {
+        "p50": round(percentile(lag, 50) * 1000, 2),
+        "p99": round(percentile(lag, 99) * 1000, 2),
+        "max": round(lag[-1] * 1000, 2) if lag else 0.0
+    }
+    return report
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            name: round(percentile(latencies, q) * 1000, 2)
+            for name, q in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("max", 100))
+        }
+    }
+
+
+def print_report(report: dict):
+    print(f"\nLoad test finished in {report['elapsed_s']}s")
+    header = f"{'endpoint':<14}{'reqs':>7}{'err%':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        lat = stats["latency_ms"]
+        print(f"{name:<14}{stats['requests']:>7}{stats['error_rate'] * 100:>7.1f}%{stats['throughput_rps']:>9.1f}"
+              f"{lat['p50']:>9.1f}{lat['p95']:>9.1f}{lat['p99']:>9.1f}{lat['max']:>9.1f}")
+    lag = report["event_loop_lag_ms"]
+    print(f"\nEvent-loop lag (ms): p50={lag['p50']} p99={lag['p99']} max={lag['max']}")
+
+
+async def run_load_test(records: list, weights: dict, target: str = "inprocess", concurrency: int = 10,
+                        duration: float = 30.0, total_requests: int = None, ramp_up: float = 0.0,
+                        timeout: float = 60.0, use_fakes: bool = True, seed: int = None) -> dict:
+    """Runs the workload and returns the report dict."""
+    client, app = build_client(target, concurrency, timeout, use_fakes, records)
+    runner = LoadRunner(client, records, weights, seed=seed)
+    monitor = LoopLagMonitor()
+    budget = [total_requests] if total_requests else None
+
+    # Starts the history writer and job queue, as uvicorn would
+    async with app_lifespan(app):
+        monitor.start()
+        started = time.perf_counter()
+        deadline = started + ramp_up + duration
+        try:
+            await asyncio.gather(*[
+                runner.worker(ramp_up * i / concurrency, deadline, budget)
+                for i in range(concurrency)
+            ])
+        finally:
+            elapsed = time.perf_counter() - started
+            await monitor.stop()
+            await client.aclose()
+    return build_report(runner, monitor.samples, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the comment generator API")
+    parser.add_argument("workload", help="JSONL file of {user_id, post, comment} records")
+    parser.add_argument("--target", default="inprocess", help="'inprocess' or a base URL like http://127.0.0.1:8000")
+    parser.add_argument("--mix", default=None, help="Weighted endpoint mix, e.g. chatbot=6,save_comment=2,get_comments=2")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run after ramp-up")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests in total")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which workers are started")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--no-fakes", action="store_true", help="In-process mode: use the real backing services")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", dest="json_out", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    records = load_workload(args.workload)
+    weights = parse_mix(args.mix) if args.mix else dict(DEFAULT_MIX)
+    report = asyncio.run(run_load_test(
+        records, weights,
+        target=args.target,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        total_requests=args.requests,
+        ramp_up=args.ramp_up,
+        timeout=args.timeout,
+        use_fakes=not args.no_fakes,
+        seed=args.seed
+    ))
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Local, offline stand-ins for Firestore, the Chroma style store and the OpenAI
+chat endpoint. They implement only the calls app.py makes, keep everything in
+memory and can simulate service latency so load tests behave like production
+without touching the network.
+
+Enable them for the API with USE_LOCAL_FAKES=1.
+"""
+import copy
+import itertools
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+import numpy as np
+import openai
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition
+
+
+def _simulate_latency(latency_ms: float):
+    if latency_ms and latency_ms > 0:
+        # Blocking on purpose: the real clients block the calling thread too
+        time.sleep(latency_ms / 1000.0)
+
+
+def _resolve_value(current, value):
+    """Apply Firestore sentinels (ArrayUnion, ArrayRemove, SERVER_TIMESTAMP) to a field value."""
+    if value is firestore.SERVER_TIMESTAMP:
+        return datetime.now()
+    if isinstance(value, firestore.ArrayUnion):
+        result = list(current or [])
+        for item in value.values:
+            if item not in result:
+                result.append(copy.deepcopy(item))
+        return result
+    if isinstance(value, firestore.ArrayRemove):
+        return [item for item in (current or []) if item not in value.values]
+    return copy.deepcopy(value)
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data: dict = None, update_time: int = None):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class FakeDocumentRef:
+    def __init__(self, client, collection: str, doc_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def _key(self):
+        return (self._collection, self.id)
+
+    def get(self):
+        _simulate_latency(self._client.latency_ms)
+        with self._client._lock:
+            return FakeSnapshot(self.id, self._client._docs.get(self._key), self._client._versions.get(self._key))
+
+    def set(self, data: dict, merge: bool = False):
+        _simulate_latency(self._client.latency_ms)
+        with self._client._lock:
+            self._client._set(self._key, data, merge)
+
+    def update(self, data: dict, option=None):
+        _simulate_latency(self._client.latency_ms)
+        with self._client._lock:
+            self._client._update(self._key, data, option)
+
+    def delete(self):
+        _simulate_latency(self._client.latency_ms)
+        with self._client._lock:
+            self._client._docs.pop(self._key, None)
+
+
+class FakeCollection:
+    def __init__(self, client, name: str):
+        self._client = client
+        self._name = name
+
+    def document(self, doc_id: str = None):
+        return FakeDocumentRef(self._client, self._name, doc_id or uuid.uuid4().hex)
+
+    def stream(self):
+        with self._client._lock:
+            docs = [(key[1], data) for key, data in self._client._docs.items() if key[0] == self._name]
+        for doc_id, data in docs:
+            yield FakeSnapshot(doc_id, copy.deepcopy(data))
+
+
+class FakeWriteBatch:
+    """Collects writes and applies them atomically on commit, like firestore.WriteBatch."""
+
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(("set", ref._key, data, merge))
+
+    def update(self, ref, data, option=None):
+        self._ops.append(("update", ref._key, data, option))
+
+    def delete(self, ref):
+        self._ops.append(("delete", ref._key, None, None))
+
+    def commit(self):
+        _simulate_latency(self._client.latency_ms)
+        with self._client._lock:
+            # Preconditions are checked before any write, so a failed batch changes nothing
+            for op, key, data, option in self._ops:
+                if op == "update":
+                    self._client._check(key, option)
+            for op, key, data, merge_or_option in self._ops:
+                if op == "set":
+                    self._client._set(key, data, merge_or_option)
+                elif op == "update":
+                    self._client._update(key, data)
+                else:
+                    self._client._docs.pop(key, None)
+        self._ops = []
+
+
+class FakeFirestoreClient:
+    """
+    In-memory Firestore client supporting collection/document get, set, update
+    and batches, and last_update_time preconditions on updates.
+    """
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        self._docs = {}
+        self._versions = {}  # key -> write counter, standing in for update_time
+        self._version = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def collection(self, name: str):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def write_option(self, last_update_time=None):
+        return {"last_update_time": last_update_time}
+
+    def _check(self, key, option):
+        if option and option["last_update_time"] != self._versions.get(key):
+            raise FailedPrecondition(f"Document {key[0]}/{key[1]} changed since it was read")
+
+    def _set(self, key, data, merge):
+        current = self._docs.get(key) if merge else None
+        doc = dict(current or {})
+        for field, value in data.items():
+            doc[field] = _resolve_value(doc.get(field), value)
+        self._docs[key] = doc
+        self._versions[key] = next(self._version)
+
+    def _update(self, key, data, option=None):
+        if key not in self._docs:
+            raise KeyError(f"No document to update: {key[0]}/{key[1]}")
+        self._check(key, option)
+        doc = self._docs[key]
+        for field, value in data.items():
+            doc[field] = _resolve_value(doc.get(field), value)
+        self._versions[key] = next(self._version)
+
+
+class FakeEmbeddings:
+    """Hashed bag-of-words embeddings with the embed_query/embed_documents interface of OpenAIEmbeddings."""
+
+    def __init__(self, dims: int = 256):
+        self.dims = dims
+
+    def embed_query(self, text: str) -> list:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for token in re.findall(r"\b\w+\b", text.lower()):
+            vector[zlib.crc32(token.encode("utf-8")) % self.dims] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeDocument:
+    def __init__(self, page_content: str, metadata: dict = None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+
+class FakeVectorStore:
+    """Keyword-overlap vector store exposing the subset of the langchain Chroma API used by the app."""
+
+    def __init__(self, texts: list = None, latency_ms: float = 0, embeddings: FakeEmbeddings = None):
+        self.latency_ms = latency_ms
+        self.embeddings = embeddings or FakeEmbeddings()
+        self._entries = {}
+        self._vectors = {}
+        self._lock = threading.Lock()
+        if texts:
+            self.add_texts(texts)
+
+    @staticmethod
+    def _tokens(text: str) -> set:
+        return set(re.findall(r"\b\w+\b", text.lower()))
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        with self._lock:
+            for text, metadata, entry_id in zip(texts, metadatas, ids):
+                self._entries[entry_id] = (text, self._tokens(text), dict(metadata or {}))
+                self._vectors[entry_id] = self.embeddings.embed_query(text)
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        with self._lock:
+            for entry_id in ids or []:
+                self._entries.pop(entry_id, None)
+                self._vectors.pop(entry_id, None)
+
+    def get(self, ids=None, include=None, **kwargs):
+        with self._lock:
+            items = [(i, self._entries[i]) for i in (ids or self._entries) if i in self._entries]
+        result = {
+            "ids": [entry_id for entry_id, _ in items],
+            "documents": [text for _, (text, _, _) in items],
+            "metadatas": [dict(metadata) for _, (_, _, metadata) in items],
+        }
+        if include and "embeddings" in include:
+            with self._lock:
+                result["embeddings"] = [list(self._vectors[entry_id]) for entry_id in result["ids"]]
+        return result
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs):
+        _simulate_latency(self.latency_ms)
+        query_tokens = self._tokens(query)
+        with self._lock:
+            entries = list(self._entries.values())
+        scored = []
+        for text, tokens, metadata in entries:
+            union = query_tokens | tokens
+            score = len(query_tokens & tokens) / len(union) if union else 0.0
+            scored.append((score, text, metadata))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [FakeDocument(text, metadata) for _, text, metadata in scored[:k]]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        _simulate_latency(self.latency_ms)
+        with self._lock:
+            ids = list(self._entries)
+            matrix = np.asarray([self._vectors[i] for i in ids], dtype=np.float32)
+            entries = [self._entries[i] for i in ids]
+        if not ids:
+            return []
+        scores = matrix @ np.asarray(embedding, dtype=np.float32)
+        top = np.argsort(-scores)[:k]
+        return [FakeDocument(entries[i][0], entries[i][2]) for i in top]
+
+    def persist(self):
+        pass
+
+
+class _FakeMessage:
+    def __init__(self, content: str):
+        self.role = "assistant"
+        self.content = content
+
+
+class _FakeChoice:
+    def __init__(self, index: int, content: str):
+        self.index = index
+        self.message = _FakeMessage(content)
+        self.finish_reason = "stop"
+
+
+class _FakeCompletion:
+    def __init__(self, model: str, choices: list):
+        self.model = model
+        self.choices = choices
+
+
+class FakeChatCompletion:
+    """Drop-in for openai.ChatCompletion that returns canned human-style comments."""
+
+    replies = [
+        "So true, consistency is what builds trust over time.",
+        "Been there. Small steps every day add up faster than you think.",
+        "Love this perspective on showing up for your team.",
+        "This is a good reminder to slow down and listen more.",
+        "Really appreciate you sharing the honest side of this journey!",
+        "Interesting point. How did your team react at first?",
+    ]
+
+    def __init__(self, latency_ms: float = 0, error_rate: float = 0.0, seed: int = None):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def create(self, model: str = None, messages: list = None, n: int = 1, timeout: float = None, **kwargs):
+        _simulate_latency(self.latency_ms)
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            picks = [self._random.choice(self.replies) for _ in range(max(1, n))]
+        if failed:
+            raise openai.error.APIError("Simulated API error from FakeChatCompletion")
+        return _FakeCompletion(model, [_FakeChoice(i, text) for i, text in enumerate(picks)])
@@ -14,6 +14,38 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Built once per server process; reruns only re-emit them
+HIDE_MENU_TITLE_CSS = """
+    <style>
+    .css-1d391kg {
+        display: none;
+    }
+    </style>
+"""
+
+MENU_STYLES = {
+    "container": {
+        "padding": "5!important",
+        "background-color": "#f0f2f6",  # Light gray background for the sidebar
+        "height": "100vh"
+    },
+    "icon": {"color": "black", "font-size": "18px"},  # Black icons
+    "nav-link": {
+        "color": "black",  # Black text for menu items
+        "font-size": "16px",
+        "text-align": "left",
+        "margin": "5px 0",
+        "padding": "10px",
+        "border-radius": "5px",
+        "--hover-color": "#e0e0e0"  # Light gray hover color
+    },
+    "nav-link-selected": {
+        "background-color": "#4CAF50",  # Green background for selected item
+        "color": "white",  # White text for selected item
+        "font-weight": "bold"
+    },
+}
+
 class MultiApp:
     def __init__(self):
         self.apps = []
@@ -27,8 +59,7 @@ class MultiApp:
     def logout(self):
         st.session_state.signedout = True
         st.session_state.username = ''
-        st.session_state.active_session_id = None
-        st.session_state.chat_sessions = []
+        accounts.reset_chat_state()
         st.session_state.page = "accounts"  # Set page to redirect to accounts.py
         st.success("👋 Logged out successfully!")
         st.rerun()
@@ -36,16 +67,7 @@ class MultiApp:
     def run(self):
         with st.sidebar:
             # Hide "My App" menu title
-            st.markdown(
-                """
-                <style>
-                .css-1d391kg {
-                    display: none;
-                }
-                </style>
-                """,
-                unsafe_allow_html=True
-            )
+            st.markdown(HIDE_MENU_TITLE_CSS, unsafe_allow_html=True)
 
             # Sidebar options (Settings removed)
             app = option_menu(
@@ -54,28 +76,7 @@ class MultiApp:
                 icons=['chat-fill', 'person-fill'],  # Home icon removed
                 menu_icon='chat-text-fill',
                 default_index=1,  # Accounts page will open by default (index 1 now)
-                styles={
-                    "container": {
-                        "padding": "5!important",
-                        "background-color": "#f0f2f6",  # Light gray background for the sidebar
-                        "height": "100vh"
-                    },
-                    "icon": {"color": "black", "font-size": "18px"},  # Black icons
-                    "nav-link": {
-                        "color": "black",  # Black text for menu items
-                        "font-size": "16px",
-                        "text-align": "left",
-                        "margin": "5px 0",
-                        "padding": "10px",
-                        "border-radius": "5px",
-                        "--hover-color": "#e0e0e0"  # Light gray hover color
-                    },
-                    "nav-link-selected": {
-                        "background-color": "#4CAF50",  # Green background for selected item
-                        "color": "white",  # White text for selected item
-                        "font-weight": "bold"
-                    },
-                }
+                styles=MENU_STYLES
             )
 
             # Logout Button (Directly in Sidebar)
@@ -0,0 +1,154 @@
+"""
+Bounded in-process conversation memory.
+
+Keeps the most recent turns of each chat session in a ring buffer so /chatbot
+does not have to re-read Firestore for session context, and remembers each
+user's recently generated comments so repeats can be detected in O(1).
+Sessions are evicted least-recently-used once max_sessions is reached, and
+any session idle for longer than idle_ttl seconds is dropped. Firestore stays
+the durable store; this is only a cache in front of it.
+"""
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^\w\s]", "", re.sub(r"\s+", " ", text.lower())).strip()
+
+
+class _UserRecent:
+    """Ring buffer of a user's recent responses with a multiset for fast membership tests."""
+
+    def __init__(self, maxlen: int):
+        self.buffer = deque(maxlen=maxlen)
+        self.counts = Counter()
+
+    def add(self, text: str):
+        key = _normalize(text)
+        if len(self.buffer) == self.buffer.maxlen:
+            oldest = self.buffer[0]
+            self.counts[oldest] -= 1
+            if self.counts[oldest] <= 0:
+                del self.counts[oldest]
+        self.buffer.append(key)
+        self.counts[key] += 1
+
+    def __contains__(self, text: str) -> bool:
+        return _normalize(text) in self.counts
+
+
+class MemoryEngine:
+    def __init__(self, max_turns_per_session: int = 20, max_sessions: int = 5000,
+                 max_users: int = 5000, recent_per_user: int = 50, idle_ttl: float = 3600.0):
+        self.max_turns_per_session = max_turns_per_session
+        self.max_sessions = max_sessions
+        self.max_users = max_users
+        self.recent_per_user = recent_per_user
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()  # (user_id, session_id) -> {"turns": deque, "last_used": float}
+        self._recent = OrderedDict()    # user_id -> _UserRecent
+        self._lock = threading.Lock()
+        self._ops_since_sweep = 0
+
+    def _touch_session(self, key, now: float):
+        entry = self._sessions.get(key)
+        if entry is None:
+            entry = {"turns": deque(maxlen=self.max_turns_per_session), "last_used": now}
+            self._sessions[key] = entry
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+        entry["last_used"] = now
+        return entry
+
+    def _recent_for(self, user_id: str) -> _UserRecent:
+        recent = self._recent.get(user_id)
+        if recent is None:
+            recent = self._recent[user_id] = _UserRecent(self.recent_per_user)
+            while len(self._recent) > self.max_users:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(user_id)
+        return recent
+
+    def _maybe_sweep(self, now: float):
+        self._ops_since_sweep += 1
+        if self._ops_since_sweep >= 100:
+            self._ops_since_sweep = 0
+            self._evict_idle(now)
+
+    def _evict_idle(self, now: float) -> int:
+        # Sessions are kept in last-used order, so stop at the first one that is still fresh
+        evicted = 0
+        while self._sessions:
+            key, entry = next(iter(self._sessions.items()))
+            if now - entry["last_used"] <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def start_session(self, user_id: str, session_id: str):
+        """Registers a new, empty session."""
+        with self._lock:
+            self._touch_session((user_id, session_id), time.monotonic())
+
+    def load_session(self, user_id: str, session_id: str, queries: list):
+        """Hydrates a session from its Firestore history (keeps only the newest turns)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._touch_session((user_id, session_id), now)
+            entry["turns"].clear()
+            entry["turns"].extend(queries[-self.max_turns_per_session:])
+            recent = self._recent_for(user_id)
+            for turn in queries[-self.recent_per_user:]:
+                if turn.get("bot_response"):
+                    recent.add(turn["bot_response"])
+
+    def has_session(self, user_id: str, session_id: str) -> bool:
+        with self._lock:
+            return (user_id, session_id) in self._sessions
+
+    def get_session(self, user_id: str, session_id: str):
+        """Recent turns of a cached session, or None when the session is not in memory."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get((user_id, session_id))
+            if entry is None:
+                return None
+            if now - entry["last_used"] > self.idle_ttl:
+                del self._sessions[(user_id, session_id)]
+                return None
+            self._touch_session((user_id, session_id), now)
+            return list(entry["turns"])
+
+    def record(self, user_id: str, session_id: str, query: str, response: str, timestamp=None):
+        """Appends a turn to the session and remembers the response for repeat checks."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._touch_session((user_id, session_id), now)
+            entry["turns"].append({"user_query": query, "bot_response": response, "timestamp": timestamp})
+            self._recent_for(user_id).add(response)
+            self._maybe_sweep(now)
+
+    def is_repeat(self, user_id: str, text: str) -> bool:
+        """True if text (ignoring case, spacing and punctuation) was recently generated for this user."""
+        with self._lock:
+            recent = self._recent.get(user_id)
+            return recent is not None and text in recent
+
+    def evict_idle(self) -> int:
+        """Drops sessions idle for longer than idle_ttl; returns how many were removed."""
+        with self._lock:
+            return self._evict_idle(time.monotonic())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "users": len(self._recent),
+                "turns": sum(len(entry["turns"]) for entry in self._sessions.values()),
+            }
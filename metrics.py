@@ -0,0 +1,68 @@
+"""
+Process-wide metrics registry: counters, gauges and bounded sample windows,
+exposed as JSON by the /metrics/ endpoint in app.py.
+"""
+import threading
+from collections import deque
+
+
+class Metrics:
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._counters = {}
+        self._gauges = {}
+        self._samples = {}
+        self._ratios = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Records a sample; only the most recent max_samples are kept per name."""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.max_samples)
+            samples.append(value)
+
+    def register_ratio(self, name: str, numerator: str, denominator: str):
+        """Reports counters[numerator] / counters[denominator] as name in snapshots."""
+        with self._lock:
+            self._ratios[name] = (numerator, denominator)
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            ratios = dict(self._ratios)
+
+        distributions = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            distributions[name] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values), 4),
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+            }
+        derived = {}
+        for name, (numerator, denominator) in ratios.items():
+            total = counters.get(denominator, 0)
+            derived[name] = round(counters.get(numerator, 0) / total, 4) if total else None
+        return {"counters": counters, "gauges": gauges, "distributions": distributions, "ratios": derived}
+
+
+metrics = Metrics()
@@ -0,0 +1,195 @@
+"""
+Near-duplicate detection for saved comments using MinHash + LSH.
+
+Texts are normalized and cut into character shingles; each text gets a
+MinHash signature and is bucketed by signature bands, so a lookup only
+compares against texts that share at least one band (sublinear in the index
+size). Candidates are confirmed with the signature's Jaccard estimate.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+NEAR_DUP_ACTIONS = ("skip", "merge", "flag")
+
+_MAX_HASH = np.iinfo(np.uint64).max
+
+
+def normalize_text(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Character shingles of the normalized text (whole text if shorter than size)."""
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHashLSH:
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # One 64-bit hash per shingle, permuted by XOR with a fixed random mask per signature slot
+        self._masks = np.random.default_rng(seed).integers(0, _MAX_HASH, size=num_perm, dtype=np.uint64, endpoint=True)
+        self._buckets = [defaultdict(set) for _ in range(bands)]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, key) -> bool:
+        return key in self._signatures
+
+    def keys(self) -> set:
+        return set(self._signatures)
+
+    def signature(self, text: str) -> tuple:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+             for s in shingles(text, self.shingle_size)),
+            dtype=np.uint64
+        )
+        if not hashes.size:
+            return tuple([int(_MAX_HASH)] * self.num_perm)
+        return tuple(np.bitwise_xor.outer(self._masks, hashes).min(axis=1).tolist())
+
+    def _band_keys(self, signature: tuple):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    @staticmethod
+    def similarity(sig_a: tuple, sig_b: tuple) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+    def add(self, key, text: str, signature: tuple = None):
+        if key in self._signatures:
+            self.remove(key)
+        signature = signature or self.signature(text)
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band][band_key].add(key)
+
+    def remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            bucket = self._buckets[band].get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def query(self, text: str, signature: tuple = None) -> list:
+        """Returns [(key, similarity)] of indexed texts at or above the threshold, best first."""
+        signature = signature or self.signature(text)
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        matches = []
+        for key in candidates:
+            score = self.similarity(signature, self._signatures[key])
+            if score >= self.threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda item: item[1], reverse=True)
+        return matches
+
+
+class NearDuplicateIndex:
+    """Per-user LSH indexes over saved comments, built lazily and kept in LRU order."""
+
+    def __init__(self, threshold: float = 0.85, action: str = "skip", max_users: int = 2000):
+        if action not in NEAR_DUP_ACTIONS:
+            raise ValueError(f"Near-duplicate action must be one of {NEAR_DUP_ACTIONS}")
+        self.threshold = threshold
+        self.action = action
+        self.max_users = max_users
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._indexes), "signatures": sum(len(index) for index in self._indexes.values())}
+
+    def _index_for(self, user_id: str, comments: list) -> MinHashLSH:
+        """The user's index, brought in line with the ids in comments (other workers may have changed them)."""
+        live = {c["id"]: c["comment"] for c in comments if c.get("id") and c.get("comment")}
+        index = self._indexes.get(user_id)
+        if index is None:
+            index = MinHashLSH(threshold=self.threshold)
+            self._indexes[user_id] = index
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(user_id)
+        indexed = index.keys()
+        for stale_id in indexed - live.keys():
+            index.remove(stale_id)
+        for comment_id in live.keys() - indexed:
+            index.add(comment_id, live[comment_id])
+        return index
+
+    def is_loaded(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._indexes
+
+    def find(self, user_id: str, comments: list, text: str):
+        """Best (comment_id, similarity) near-duplicate of text among the user's comments, or None."""
+        with self._lock:
+            index = self._index_for(user_id, comments)
+            matches = index.query(text)
+        return matches[0] if matches else None
+
+    def add(self, user_id: str, comments: list):
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                for c in comments:
+                    index.add(c["id"], c["comment"])
+
+    def remove(self, user_id: str, comment_ids: list):
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                for comment_id in comment_ids:
+                    index.remove(comment_id)
+
+
+def dedupe_texts(texts: list, threshold: float = 0.85, action: str = "skip"):
+    """
+    Bulk-ingest helper: returns (kept_texts, report).
+    skip keeps the first of each near-duplicate group, merge keeps the longest,
+    flag keeps everything and only reports the groups.
+    """
+    if action not in NEAR_DUP_ACTIONS:
+        raise ValueError(f"Near-duplicate action must be one of {NEAR_DUP_ACTIONS}")
+    index = MinHashLSH(threshold=threshold)
+    kept = []
+    duplicates = []
+    for text in texts:
+        signature = index.signature(text)
+        matches = index.query(text, signature)
+        if not matches:
+            index.add(len(kept), text, signature)
+            kept.append(text)
+            continue
+        original = matches[0][0]
+        duplicates.append((kept[original], text, matches[0][1]))
+        if action == "flag":
+            kept.append(text)
+        elif action == "merge" and len(text) > len(kept[original]):
+            kept[original] = text
+    return kept, {"input": len(texts), "kept": len(kept), "near_duplicates": len(duplicates), "pairs": duplicates}
@@ -0,0 +1,117 @@
+"""
+On-demand diagnostics for a live worker: a sampling CPU profiler and tracemalloc snapshots.
+
+Nothing runs until an admin endpoint asks for it. The CPU profiler is a
+daemon thread that reads every thread's current stack (sys._current_frames)
+at a fixed interval for the requested number of seconds and aggregates the
+samples as collapsed stacks ("outer;inner;leaf count"), which flamegraph.pl,
+speedscope and inferno read directly. tracemalloc is started only for the
+duration of a memory snapshot and stopped again afterwards.
+"""
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+MAX_PROFILE_SECONDS = 120
+_profile_lock = threading.Lock()
+_memory_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def sample_cpu(seconds: float, interval: float = 0.005) -> dict:
+    """Samples all threads' stacks for `seconds`; blocks the calling thread meanwhile."""
+    seconds = max(0.1, min(seconds, MAX_PROFILE_SECONDS))
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A CPU profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    stacks[_collapse(frame, names.get(ident, f"thread-{ident}"))] += 1
+            samples += 1
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+    return {
+        "seconds": seconds,
+        "interval": interval,
+        "samples": samples,
+        "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+    }
+
+
+def memory_snapshot(seconds: float, top: int = 25, group_by: str = "lineno") -> dict:
+    """Top allocators for memory allocated (and still alive) during the next `seconds`."""
+    seconds = max(0.0, min(seconds, MAX_PROFILE_SECONDS))
+    if not _memory_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A memory snapshot is already running")
+    try:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(25)
+        try:
+            time.sleep(seconds)
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+    finally:
+        _memory_lock.release()
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    stats = snapshot.statistics(group_by)
+    return {
+        "seconds": seconds,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": [
+            {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+            for stat in stats[:top]
+        ],
+    }
+
+
+def object_counts(top: int = 25) -> dict:
+    """Live gc-tracked objects by type name, most common first."""
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    return dict(counts.most_common(top))
+
+
+def component_counts(components: dict) -> dict:
+    """Calls each name -> zero-argument function; a failing one reports its error instead."""
+    result = {}
+    for name, count in components.items():
+        try:
+            result[name] = count()
+        except Exception as e:
+            result[name] = f"unavailable: {e}"
+    return result
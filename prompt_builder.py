@@ -0,0 +1,126 @@
+"""
+Token-budgeted prompt builder for /chatbot.
+
+The instructions and banned-word list never change between requests, so they
+are rendered once into a static prefix that leads every prompt (which keeps
+the prompt prefix identical across requests and workers). Example comments
+are picked by maximal marginal relevance: relevant to the post, but not
+near-copies of each other, until the example token budget is spent. Only the
+most relevant few candidates enter that step, so its cost does not grow with
+the number of saved comments.
+"""
+from functools import lru_cache
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # tiktoken is optional; fall back to the usual ~4 characters per token estimate
+    _ENCODING = None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Token count for text (exact with tiktoken, estimated otherwise)."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+class PromptBuilder:
+    def __init__(self, banned_words, example_token_budget: int = 250, max_examples: int = 4,
+                 mmr_lambda: float = 0.7, saved_comment_bonus: float = 0.1, candidate_pool: int = 4):
+        self.example_token_budget = example_token_budget
+        self.max_examples = max_examples
+        self.mmr_lambda = mmr_lambda
+        # MMR runs over the max_examples * candidate_pool most relevant candidates only
+        self.candidate_pool = candidate_pool
+        # Saved comments carry the user's own voice, so they win close ties with corpus samples
+        self.saved_comment_bonus = saved_comment_bonus
+
+        # Case-insensitive dedupe and a stable order: set iteration order differs between
+        # processes, which would otherwise change the prefix on every worker
+        unique_banned = sorted({bw.lower(): bw for bw in banned_words}.values(), key=str.lower)
+        self.static_prefix = (
+            "You are a human social media user. Write a short, natural, and relevant comment for the following post.\n\n"
+            "Constraints:\n"
+            "- Try to match the structure and style of the example comments.\n"
+            "- If possible, match the style of the most similar saved comment to the post.\n"
+            "- Otherwise, match the overall style of your saved comments.\n"
+            f"- Avoid these words: {', '.join(unique_banned)}\n"
+        )
+        self.static_prefix_tokens = count_tokens(self.static_prefix)
+
+    def select_examples(self, query: str, saved_comments: list, sample_comments: list) -> list:
+        """Picks example comments by maximal marginal relevance within the token budget."""
+        candidates = []
+        seen = set()
+        for text, is_saved in [(c, True) for c in saved_comments] + [(c, False) for c in sample_comments]:
+            key = text.strip().lower()
+            if key and key not in seen:
+                seen.add(key)
+                candidates.append((text.strip(), is_saved))
+        if not candidates:
+            return []
+
+        texts = [text for text, _ in candidates]
+        try:
+            # TF-IDF rows are L2-normalized, so dot products are cosine similarities
+            vectors = TfidfVectorizer().fit_transform([query] + texts)
+            relevance = (vectors[1:] @ vectors[0].T).toarray().ravel()
+        except ValueError:
+            # Empty vocabulary (e.g. emoji-only texts): keep the original order
+            vectors = None
+            relevance = np.zeros(len(texts))
+        relevance = relevance + np.array([self.saved_comment_bonus if is_saved else 0.0 for _, is_saved in candidates])
+
+        # MMR only looks at the most relevant few, so a user with thousands of saved
+        # comments costs one linear pass instead of an all-pairs similarity matrix
+        pool = sorted(range(len(texts)), key=lambda idx: -relevance[idx])[:self.max_examples * self.candidate_pool]
+        pool_vectors = vectors[1:][pool] if vectors is not None else None
+        max_overlap = np.zeros(len(pool))  # Highest similarity of each pool entry to the examples picked so far
+
+        selected = []
+        remaining = list(range(len(pool)))
+        budget = self.example_token_budget
+        while remaining and len(selected) < self.max_examples:
+            best = max(remaining, key=lambda i: (
+                self.mmr_lambda * relevance[pool[i]] - (1 - self.mmr_lambda) * max_overlap[i], -i
+            ))
+            remaining.remove(best)
+            cost = count_tokens(f"- {texts[pool[best]]}\n")
+            if cost > budget:
+                continue
+            budget -= cost
+            selected.append(pool[best])
+            if pool_vectors is not None:
+                overlap = (pool_vectors @ pool_vectors[best].T).toarray().ravel()
+                max_overlap = np.maximum(max_overlap, overlap)
+        return [texts[idx] for idx in selected]
+
+    def build(self, query: str, saved_comments: list, sample_comments: list, avg_length: int = None) -> dict:
+        """Returns the prompt, the chosen examples and token counts for each part."""
+        examples = self.select_examples(query, saved_comments, sample_comments)
+
+        dynamic = f"\nPost:\n{query}\n\n"
+        if examples:
+            dynamic += ("Below are some example comments. Try to match their style and length, "
+                        "but it's okay if your response is not a perfect match.\n\nExample Comments:\n")
+            dynamic += "".join(f"- {c}\n" for c in examples)
+        if avg_length:
+            dynamic += f"\nTarget length: about {avg_length} words (±5 is OK).\n"
+
+        example_tokens = sum(count_tokens(f"- {c}\n") for c in examples)
+        dynamic_tokens = count_tokens(dynamic)
+        return {
+            "prompt": self.static_prefix + dynamic,
+            "examples": examples,
+            "tokens": {
+                "static_prefix": self.static_prefix_tokens,
+                "examples": example_tokens,
+                "total": self.static_prefix_tokens + dynamic_tokens,
+            },
+        }
@@ -0,0 +1,356 @@
+"""
+Compact style vector store: quantized vectors in memory, exact vectors on disk.
+
+Each stored vector is kept twice. The in-memory copy is quantized, either int8
+with one float32 scale per row (about 1/4 of float32) or float16 (1/2), and
+is used for a first, brute-force pass over every entry. The exact float32
+vectors live in exact.npy and are memory-mapped, so only the rows of the top
+rerank_candidates first-pass hits are read to compute the final order.
+
+The store exposes the part of the langchain Chroma API the app uses
+(add_texts, delete, get, similarity_search, similarity_search_by_vector,
+persist), so VECTOR_STORE=quantized in app.py swaps it in for
+chroma_style_db. Entries added after the last build are kept exact in memory
+and saved to delta files by persist(); once there are more than
+compact_threshold of them (or deleted rows), persist() rewrites the files.
+
+Build one from an existing Chroma database and measure it with:
+    python quantized_store.py convert --source ./chroma_style_db --output ./quantized_style_db --mode int8
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+from langchain.schema import Document
+
+MODES = ("int8", "float16")
+DEFAULT_DIRECTORY = "./quantized_style_db"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def quantize(vectors: np.ndarray, mode: str):
+    """(codes, scales) for float32 rows; scales is None for float16."""
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    if mode != "int8":
+        raise ValueError(f"Quantization mode must be one of {MODES}")
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _save_json(path: str, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _save_npy(path: str, array: np.ndarray):
+    tmp = f"{path}.tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def write_store(directory: str, ids: list, documents: list, metadatas: list, vectors: np.ndarray, mode: str):
+    """Writes a complete store (no delta) from unnormalized float vectors."""
+    os.makedirs(directory, exist_ok=True)
+    exact = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+    codes, scales = quantize(exact, mode)
+    _save_npy(os.path.join(directory, "exact.npy"), exact)
+    _save_npy(os.path.join(directory, "codes.npy"), codes)
+    if scales is not None:
+        _save_npy(os.path.join(directory, "scales.npy"), scales)
+    _save_json(os.path.join(directory, "entries.json"), {
+        "ids": list(ids), "documents": list(documents), "metadatas": [m or {} for m in metadatas]
+    })
+    _save_json(os.path.join(directory, "delta.json"), {"ids": [], "documents": [], "metadatas": [], "deleted": []})
+    _save_npy(os.path.join(directory, "delta.npy"), np.zeros((0, exact.shape[1]), dtype=np.float32))
+    # meta.json last: a store is complete once it exists
+    _save_json(os.path.join(directory, "meta.json"), {"mode": mode, "dims": int(exact.shape[1]), "count": len(ids)})
+
+
+class QuantizedVectorStore:
+    def __init__(self, directory: str, embeddings, rerank_candidates: int = 50, block_rows: int = 1024,
+                 compact_threshold: int = 2000):
+        self.directory = directory
+        self.embeddings = embeddings
+        self.rerank_candidates = rerank_candidates
+        self.block_rows = block_rows
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        with open(self._path("meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(self._path("entries.json"), encoding="utf-8") as f:
+            entries = json.load(f)
+        self.mode = meta["mode"]
+        self.dims = meta["dims"]
+        self._codes = np.load(self._path("codes.npy"))
+        self._scales = np.load(self._path("scales.npy")) if self.mode == "int8" else None
+        self._exact = np.load(self._path("exact.npy"), mmap_mode="r")
+        self._ids = entries["ids"]
+        self._documents = entries["documents"]
+        self._metadatas = entries["metadatas"]
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self._rows = {entry_id: row for row, entry_id in enumerate(self._ids)}
+
+        # Changes since the last full write
+        self._delta = {}  # id -> (document, metadata, unit float32 vector), insertion ordered
+        self._deleted = set()
+        try:
+            with open(self._path("delta.json"), encoding="utf-8") as f:
+                delta = json.load(f)
+            vectors = np.load(self._path("delta.npy"))
+            for entry_id in delta["deleted"]:
+                self._tombstone(entry_id)
+            for entry_id, document, metadata, vector in zip(delta["ids"], delta["documents"], delta["metadatas"], vectors):
+                self._delta[entry_id] = (document, metadata, vector)
+        except FileNotFoundError:
+            pass
+        self._dirty = False
+
+    def _tombstone(self, entry_id: str):
+        row = self._rows.get(entry_id)
+        if row is not None and self._alive[row]:
+            self._alive[row] = False
+            self._deleted.add(entry_id)
+
+    # --- writes ---
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        vectors = _normalize_rows(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+        with self._lock:
+            for text, metadata, entry_id, vector in zip(texts, metadatas, ids, vectors):
+                self._tombstone(entry_id)  # Same id again replaces the entry
+                self._delta[entry_id] = (text, dict(metadata or {}), vector)
+            self._dirty = True
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        with self._lock:
+            for entry_id in ids or []:
+                self._tombstone(entry_id)
+                self._delta.pop(entry_id, None)
+            self._dirty = True
+
+    def persist(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            if len(self._delta) + len(self._deleted) > self.compact_threshold:
+                self._compact()
+                return
+            ids = list(self._delta)
+            vectors = np.asarray([self._delta[i][2] for i in ids], dtype=np.float32).reshape(len(ids), self.dims)
+            _save_npy(self._path("delta.npy"), vectors)
+            _save_json(self._path("delta.json"), {
+                "ids": ids,
+                "documents": [self._delta[i][0] for i in ids],
+                "metadatas": [self._delta[i][1] for i in ids],
+                "deleted": sorted(self._deleted)
+            })
+            self._dirty = False
+
+    def _compact(self):
+        rows = np.flatnonzero(self._alive)
+        delta_ids = list(self._delta)
+        exact = np.asarray(self._exact[rows], dtype=np.float32)
+        if delta_ids:
+            exact = np.vstack([exact, np.asarray([self._delta[i][2] for i in delta_ids], dtype=np.float32)])
+        write_store(
+            self.directory,
+            [self._ids[r] for r in rows] + delta_ids,
+            [self._documents[r] for r in rows] + [self._delta[i][0] for i in delta_ids],
+            [self._metadatas[r] for r in rows] + [self._delta[i][1] for i in delta_ids],
+            exact, self.mode
+        )
+        self._load()
+
+    # --- reads ---
+
+    def get(self, ids=None, include=None, **kwargs):
+        with self._lock:
+            exact = self._exact
+            if ids is None:
+                ids = [self._ids[r] for r in np.flatnonzero(self._alive)] + list(self._delta)
+            found = []
+            for entry_id in ids:
+                if entry_id in self._delta:
+                    document, metadata, vector = self._delta[entry_id]
+                    found.append((entry_id, document, metadata, vector))
+                else:
+                    row = self._rows.get(entry_id)
+                    if row is not None and self._alive[row]:
+                        found.append((entry_id, self._documents[row], self._metadatas[row], row))
+        result = {
+            "ids": [f[0] for f in found],
+            "documents": [f[1] for f in found],
+            "metadatas": [dict(f[2]) for f in found],
+        }
+        if include and "embeddings" in include:
+            result["embeddings"] = [
+                (np.asarray(exact[f[3]]) if isinstance(f[3], (int, np.integer)) else f[3]).tolist()
+                for f in found
+            ]
+        return result
+
+    def count(self) -> int:
+        """Live entries, without materializing them as get() would."""
+        with self._lock:
+            return int(self._alive.sum()) + len(self._delta)
+
+    def _base(self) -> tuple:
+        """(codes, scales, exact, ids, documents, metadatas) of the base rows; call under the lock."""
+        return self._codes, self._scales, self._exact, self._ids, self._documents, self._metadatas
+
+    def _first_pass(self, query: np.ndarray, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        """Approximate similarity of the query to every base row, one block of rows at a time."""
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.block_rows):
+            block = codes[start:start + self.block_rows].astype(np.float32)
+            scores[start:start + len(block)] = block @ query
+        if scales is not None:
+            scores *= scales
+        return scores
+
+    def _search(self, embedding, k: int) -> list:
+        """Top k as (score, id, document, metadata), best first."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        # A compaction replaces every base array and list: search one consistent set of them
+        with self._lock:
+            codes, scales, exact, ids, documents, metadatas = self._base()
+            alive = self._alive.copy()
+            delta = list(self._delta.items())
+        candidates = []
+        if alive.any():
+            scores = self._first_pass(query, codes, scales)
+            scores[~alive] = -np.inf
+            count = min(max(self.rerank_candidates, k), int(alive.sum()))
+            top = np.sort(np.argpartition(-scores, count - 1)[:count])
+            exact_scores = np.asarray(exact[top], dtype=np.float32) @ query
+            candidates.extend(
+                (float(s), ids[r], documents[r], metadatas[r]) for s, r in zip(exact_scores, top)
+            )
+        if delta:
+            delta_scores = np.asarray([entry[2] for _, entry in delta], dtype=np.float32) @ query
+            candidates.extend(
+                (float(s), entry_id, entry[0], entry[1]) for s, (entry_id, entry) in zip(delta_scores, delta)
+            )
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return candidates[:k]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        return [
+            Document(page_content=document, metadata=dict(metadata))
+            for _, _, document, metadata in self._search(embedding, k)
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k)
+
+    def memory_bytes(self) -> dict:
+        with self._lock:
+            resident = self._codes.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+            return {
+                "quantized": int(resident),
+                "exact_on_disk": int(self._exact.nbytes),
+                "delta": int(sum(entry[2].nbytes for entry in self._delta.values())),
+            }
+
+
+def recall_at_k(approx: list, exact: list) -> float:
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+    total = sum(len(e) for e in exact)
+    return hits / total if total else 1.0
+
+
+def evaluate(source, store: QuantizedVectorStore, vectors: np.ndarray, ids: list, k: int, queries: int,
+             seed: int = 0) -> dict:
+    """recall@k of the quantized store against the source store's own search, on synthetic queries."""
+    rng = np.random.default_rng(seed)
+    unit = _normalize_rows(vectors)
+    # Queries between two stored vectors, so no query is an exact copy of an entry
+    pairs = rng.integers(0, len(ids), size=(queries, 2))
+    query_vectors = _normalize_rows(unit[pairs[:, 0]] + unit[pairs[:, 1]])
+    def current(q):
+        collection = getattr(source, "_collection", None)
+        if collection is not None:
+            return collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])["ids"][0]
+        # Stores without a collection: match returned documents back to ids by text
+        text_ids = dict(zip(store.get(ids)["documents"], ids))
+        return [text_ids.get(d.page_content) for d in source.similarity_search_by_vector(q.tolist(), k=k)]
+
+    exact, quantized, first_pass = [], [], []
+    quantized_seconds = 0.0
+    for q in query_vectors:
+        exact.append(current(q))
+        started = time.perf_counter()
+        quantized.append([entry_id for _, entry_id, _, _ in store._search(q, k)])
+        quantized_seconds += time.perf_counter() - started
+        first_pass.append([ids[i] for i in np.argsort(-store._first_pass(q, store._codes, store._scales))[:k]])
+    brute_force = [[ids[i] for i in np.argsort(-(unit @ q))[:k]] for q in query_vectors]
+    return {
+        "k": k,
+        "queries": queries,
+        "recall_vs_current_search": round(recall_at_k(quantized, exact), 4),
+        "recall_vs_brute_force": round(recall_at_k(quantized, brute_force), 4),
+        "first_pass_only_recall_vs_brute_force": round(recall_at_k(first_pass, brute_force), 4),
+        "quantized_query_ms": round(quantized_seconds / queries * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized style vector store maintenance")
+    parser.add_argument("command", choices=["convert"])
+    parser.add_argument("--source", default="./chroma_style_db", help="Chroma persist directory to convert")
+    parser.add_argument("--output", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--mode", choices=MODES, default="int8")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200, help="Synthetic queries for the recall check")
+    parser.add_argument("--rerank-candidates", type=int, default=50)
+    args = parser.parse_args()
+
+    from langchain.vectorstores import Chroma
+    from langchain.embeddings import OpenAIEmbeddings
+    embeddings = OpenAIEmbeddings()
+    source = Chroma(persist_directory=args.source, embedding_function=embeddings)
+    data = source.get(include=["embeddings", "documents", "metadatas"])
+    if not data["ids"]:
+        raise SystemExit(f"No entries in '{args.source}'")
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    write_store(args.output, data["ids"], data["documents"], data["metadatas"], vectors, args.mode)
+
+    store = QuantizedVectorStore(args.output, embeddings, rerank_candidates=args.rerank_candidates)
+    memory = store.memory_bytes()
+    full = vectors.nbytes
+    print(f"Entries: {len(data['ids'])} x {vectors.shape[1]} dims")
+    print(f"In-memory vectors: float32 {full / 1e6:.1f} MB -> {args.mode} {memory['quantized'] / 1e6:.1f} MB "
+          f"({(1 - memory['quantized'] / full) * 100:.0f}% saved); exact vectors stay on disk "
+          f"({memory['exact_on_disk'] / 1e6:.1f} MB, memory-mapped)")
+    report = evaluate(source, store, vectors, data["ids"], args.k, min(args.queries, len(data["ids"])))
+    print(f"✅ Quantized store written to {args.output}: {report}")
+
+
+if __name__ == "__main__":
+    main()
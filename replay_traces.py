@@ -0,0 +1,198 @@
+"""
+Replays captured /chatbot traces (see tracing.py) against the service.
+
+Traces carry sizes and outcomes, not texts, so every request is rebuilt from
+them: a synthetic post of the recorded word count (the same post key always
+gets the same text, so reshares still hit the semantic cache), each
+anonymized user seeded with as many saved comments as their traces saw, and
+sessions continued where the original request continued one. Requests are
+sent in recorded order, paced at the original arrival times divided by
+--speed (0 sends them as fast as --concurrency allows).
+
+With --match-model the fake model's error rate and per-call latency are set
+from the traces, so attempt counts and model time look like production.
+Reports latency percentiles next to the recorded ones; --compare prints the
+change against an earlier --json report, to compare builds on the same load.
+
+Examples:
+    python replay_traces.py traces/ --speed 0 --concurrency 20 --match-model --json build_a.json
+    python replay_traces.py traces/ --speed 0 --concurrency 20 --match-model --compare build_a.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+
+import httpx
+
+from load_test import LoopLagMonitor, app_lifespan, percentile, summarize
+from tracing import read_traces
+
+WORDS = (
+    "team growth leadership lesson customers trust learned years career journey product strategy market "
+    "burnout rest balance mindset habits feedback hiring culture story challenge together community "
+    "consistency results progress goal network event advice mistake brand revenue quality launch"
+).split()
+
+
+def synthetic_text(key: str, words: int) -> str:
+    rng = random.Random(key)
+    return " ".join(rng.choice(WORDS) for _ in range(max(1, words))).capitalize() + "."
+
+
+def model_profile(traces: list) -> dict:
+    """Fake model settings that reproduce the traces' failed attempts and per-call latency."""
+    attempts = sum(t.get("attempts", 0) for t in traces)
+    failed = sum(1 for t in traces for score in t.get("scores", []) if score is None)
+    per_call = sorted(
+        t["stages_ms"]["model"] / t["attempts"]
+        for t in traces if t.get("attempts") and "model" in t.get("stages_ms", {})
+    )
+    return {
+        "error_rate": round(failed / attempts, 4) if attempts else 0.0,
+        "latency_ms": round(percentile(per_call, 50), 1) if per_call else 0.0,
+    }
+
+
+def seed_users(app_module, traces: list):
+    """Creates each anonymized user in the in-memory Firestore fake with their saved-comment count."""
+    counts = {}
+    for t in traces:
+        counts[t["user"]] = max(counts.get(t["user"], 0), t.get("saved_comments", 0))
+    for user, count in counts.items():
+        comments = [
+            {"id": f"{user}-{i}", "comment": synthetic_text(f"{user}-{i}", 12), "timestamp": None}
+            for i in range(count)
+        ]
+        app_module.db.collection("users").document(user).set({
+            "email": f"{user}@example.com", "name": user, "comments": comments, "chat_sessions": []
+        })
+
+
+def build_client(target: str, concurrency: int, timeout: float, traces: list):
+    """The HTTP client for the replay, and the in-process ASGI app (None when targeting a URL)."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if target != "inprocess":
+        print("Replaying over HTTP: the target must already have the traced user ids")
+        return httpx.AsyncClient(base_url=target, limits=limits, timeout=timeout), None
+    os.environ["USE_LOCAL_FAKES"] = "1"
+    import app as app_module
+    seed_users(app_module, traces)
+    transport = httpx.ASGITransport(app=app_module.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://replay", limits=limits, timeout=timeout)
+    return client, app_module.app
+
+
+async def replay(traces: list, target: str = "inprocess", concurrency: int = 10, speed: float = 0.0,
+                 timeout: float = 60.0) -> dict:
+    client, app = build_client(target, concurrency, timeout, traces)
+    semaphore = asyncio.Semaphore(concurrency)
+    sessions = {}  # anonymized user -> session_id of their latest replayed request
+    latencies = []
+    errors = 0
+    monitor = LoopLagMonitor()
+
+    async def send(trace: dict, delay: float):
+        nonlocal errors
+        await asyncio.sleep(delay)
+        async with semaphore:
+            payload = {"query": synthetic_text(trace.get("post", ""), trace.get("post_words", 20)), "user_id": trace["user"]}
+            if not trace.get("new_session", True) and sessions.get(trace["user"]):
+                payload["session_id"] = sessions[trace["user"]]
+            started = time.perf_counter()
+            try:
+                response = await client.post("/chatbot/", json=payload)
+                ok = response.status_code == 200 and response.json().get("session_id")
+                if ok:
+                    sessions[trace["user"]] = response.json()["session_id"]
+            except Exception as e:
+                print(f"Replay request error: {e}")
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    first_ts = traces[0].get("ts", 0)
+    # Starts the history writer and job queue, as uvicorn would
+    async with app_lifespan(app):
+        monitor.start()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*[
+                send(t, (t.get("ts", first_ts) - first_ts) / speed if speed > 0 else 0.0) for t in traces
+            ])
+        finally:
+            elapsed = time.perf_counter() - started
+            await monitor.stop()
+            await client.aclose()
+
+    recorded = sorted(t["total_ms"] / 1000 for t in traces if "total_ms" in t)
+    lag = sorted(monitor.samples)
+    return {
+        "traces": len(traces),
+        "replayed": summarize(sorted(latencies), errors, elapsed),
+        "recorded": summarize(recorded, 0, 0),
+        "recorded_outcomes": dict(Counter(t.get("outcome", "unknown") for t in traces)),
+        "event_loop_lag_ms": {"p99": round(percentile(lag, 99) * 1000, 2)},
+    }
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"\nReplayed {report['traces']} traces")
+    print(f"{'':<10}{'reqs':>7}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    rows = [("recorded", report["recorded"]), ("replayed", report["replayed"])]
+    if baseline:
+        rows.insert(1, ("baseline", baseline["replayed"]))
+    for name, stats in rows:
+        lat = stats["latency_ms"]
+        print(f"{name:<10}{stats['requests']:>7}{stats['error_rate'] * 100:>7.1f}%"
+              f"{lat['p50']:>9.1f}{lat['p95']:>9.1f}{lat['p99']:>9.1f}{lat['max']:>9.1f}")
+    if baseline:
+        for q in ("p50", "p95", "p99"):
+            before = baseline["replayed"]["latency_ms"][q]
+            after = report["replayed"]["latency_ms"][q]
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"{q} vs baseline: {change:+.1f}%")
+    print(f"Recorded outcomes: {report['recorded_outcomes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured /chatbot traces against the service")
+    parser.add_argument("paths", nargs="+", help="Trace files or directories of traces-*.jsonl.gz")
+    parser.add_argument("--target", default="inprocess", help="'inprocess' (local fakes) or a base URL")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--speed", type=float, default=1.0, help="Arrival-time speed-up; 0 sends as fast as possible")
+    parser.add_argument("--limit", type=int, default=None, help="Replay at most this many traces")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--match-model", action="store_true",
+                        help="Set the fake model's error rate and latency from the traces")
+    parser.add_argument("--json", dest="json_out", default=None, help="Write the report to this file")
+    parser.add_argument("--compare", default=None, help="Earlier --json report to compare against")
+    args = parser.parse_args()
+
+    traces = read_traces(args.paths, limit=args.limit,
+                         where=lambda t: t.get("endpoint") == "chatbot" and t.get("user"))
+    if not traces:
+        raise SystemExit("No /chatbot traces found")
+    if args.match_model:
+        profile = model_profile(traces)
+        print(f"Fake model: {profile}")
+        os.environ["FAKE_LLM_ERROR_RATE"] = str(profile["error_rate"])
+        os.environ["FAKE_LLM_LATENCY_MS"] = str(profile["latency_ms"])
+
+    report = asyncio.run(replay(traces, args.target, args.concurrency, args.speed, args.timeout))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
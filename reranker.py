@@ -0,0 +1,98 @@
+"""
+Batched candidate reranker for generated comments.
+
+Scores every candidate at once on the rubric features (banned words, target
+length, style markers) plus relevance: the cosine similarity between the
+post and each candidate as bags of stemmed words without stopwords (the
+template_embeddings tokenizer), over the post's own words. Features are
+assembled into one (candidates x features) array and combined with a single
+matrix-vector product. Ranking is by rubric checks passed first (same meaning
+as comment_rubric.score_response), then by relevance and length closeness.
+"""
+import re
+
+import numpy as np
+
+from comment_rubric import EMOJI_CHARS, LENGTH_TOLERANCE
+from template_embeddings import build_vocabulary, embed_text
+
+FEATURES = ("banned_ok", "length_ok", "style_ok", "relevance", "length_closeness", "style_coverage")
+# Rubric checks dominate; relevance and closeness only order candidates with the same rubric score
+DEFAULT_WEIGHTS = (1.0, 1.0, 1.0, 0.5, 0.25, 0.1)
+
+_EMOJI_RE = re.compile("[" + re.escape(EMOJI_CHARS) + "]")
+
+
+class CandidateReranker:
+    def __init__(self, banned_words, weights=DEFAULT_WEIGHTS):
+        self.banned_words = tuple(sorted({bw.lower() for bw in banned_words}))
+        self.weights = np.asarray(weights, dtype=np.float32)
+
+    @staticmethod
+    def relevance(post: str, candidates: list) -> np.ndarray:
+        """
+        Cosine similarity of each candidate to the post. Only the post's words get
+        columns; other candidate words still count toward the candidate's norm.
+        """
+        vocabulary = build_vocabulary([post])
+        if not vocabulary:
+            return np.zeros(len(candidates), dtype=np.float32)
+        matrix = np.vstack([embed_text(c, vocabulary) for c in candidates])
+        return matrix @ embed_text(post, vocabulary)
+
+    def features(self, post: str, candidates: list, avg_length: int = None, style: dict = None) -> np.ndarray:
+        """(len(candidates), len(FEATURES)) feature matrix."""
+        lowered = [c.lower() for c in candidates]
+        word_counts = np.asarray([len(c.split()) for c in candidates], dtype=np.float32)
+        banned_ok = np.asarray([not any(bw in c for bw in self.banned_words) for c in lowered], dtype=np.float32)
+
+        if avg_length:
+            distance = np.abs(word_counts - avg_length)
+            length_ok = (distance <= LENGTH_TOLERANCE).astype(np.float32)
+            length_closeness = np.exp(-distance / (2 * LENGTH_TOLERANCE))
+        else:
+            length_ok = np.ones(len(candidates), dtype=np.float32)
+            length_closeness = np.ones(len(candidates), dtype=np.float32)
+
+        required = []
+        if style:
+            if style.get("has_emoji"):
+                required.append(np.asarray([_EMOJI_RE.search(c) is not None for c in candidates]))
+            if style.get("has_exclamation"):
+                required.append(np.asarray(["!" in c for c in candidates]))
+            if style.get("has_question"):
+                required.append(np.asarray(["?" in c for c in candidates]))
+        if required:
+            present = np.vstack(required).astype(np.float32)
+            style_ok = present.min(axis=0)
+            style_coverage = present.mean(axis=0)
+        else:
+            style_ok = np.ones(len(candidates), dtype=np.float32)
+            style_coverage = np.ones(len(candidates), dtype=np.float32)
+
+        relevance = self.relevance(post, candidates)
+
+        return np.column_stack([banned_ok, length_ok, style_ok, relevance, length_closeness, style_coverage])
+
+    def rank(self, post: str, candidates: list, avg_length: int = None, style: dict = None) -> list:
+        """Candidates best first, each as {"text", "score", "rubric", "features"}."""
+        candidates = [c.strip() for c in candidates if c and c.strip()]
+        if not candidates:
+            return []
+        matrix = self.features(post, candidates, avg_length, style)
+        matrix = matrix.astype(np.float64)
+        scores = matrix @ self.weights
+        rubric = matrix[:, :3].sum(axis=1)
+        order = np.argsort(-scores, kind="stable").tolist()
+        rounded_scores = scores.round(4).tolist()
+        rounded_features = matrix.round(4).tolist()
+        rubric = rubric.astype(int).tolist()
+        return [
+            {
+                "text": candidates[i],
+                "score": rounded_scores[i],
+                "rubric": rubric[i],
+                "features": dict(zip(FEATURES, rounded_features[i])),
+            }
+            for i in order
+        ]
@@ -0,0 +1,176 @@
+"""
+Resilience layer for the fine-tuned model endpoint.
+
+Each call gets a timeout bounded by the caller's remaining latency budget.
+If the first request has not answered by the recent p95 latency, an identical
+hedged request is raised and whichever finishes first wins. A circuit breaker
+tracks error and slow-call rates over a sliding window; while it is open,
+calls fail fast with CircuitOpenError so /chatbot can go straight to the local
+generator. Breaker state and latencies are published to metrics.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+from metrics import metrics
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str = "model", window: int = 50, min_calls: int = 10,
+                 failure_rate_threshold: float = 0.5, slow_call_seconds: float = 10.0,
+                 slow_rate_threshold: float = 0.5, open_seconds: float = 30.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self._calls = deque(maxlen=window)  # (failed, slow) per call
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _publish(self):
+        metrics.set_gauge(f"{self.name}.breaker.state", self._state)
+        metrics.set_gauge(f"{self.name}.breaker.state_code", BREAKER_STATES[self._state])
+
+    def _transition(self, state: str):
+        if state == self._state:
+            return
+        print(f"Circuit breaker '{self.name}': {self._state} -> {state}")
+        self._state = state
+        if state == "open":
+            self._opened_at = time.monotonic()
+            metrics.incr(f"{self.name}.breaker.opened")
+        if state == "closed":
+            self._calls.clear()
+        self._probe_in_flight = False
+        self._publish()
+
+    def allow(self) -> bool:
+        """True if a call may go out now; in half-open state only one probe at a time is allowed."""
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition("half_open")
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release(self):
+        """Frees the half-open probe slot for a call that ended without an outcome (cancelled)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, success: bool, latency: float):
+        with self._lock:
+            slow = latency >= self.slow_call_seconds
+            if self._state == "half_open":
+                self._transition("closed" if success and not slow else "open")
+                return
+            self._calls.append((not success, slow))
+            if self._state == "closed" and len(self._calls) >= self.min_calls:
+                failure_rate = sum(1 for failed, _ in self._calls if failed) / len(self._calls)
+                slow_rate = sum(1 for _, slow_call in self._calls if slow_call) / len(self._calls)
+                metrics.set_gauge(f"{self.name}.breaker.failure_rate", round(failure_rate, 4))
+                metrics.set_gauge(f"{self.name}.breaker.slow_rate", round(slow_rate, 4))
+                if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_rate_threshold:
+                    self._transition("open")
+
+
+async def hedged_call(fn, hedge_delay: float, timeout: float):
+    """
+    Runs the blocking fn in a worker thread; if it has not finished after hedge_delay,
+    starts a second copy. Returns (result, hedge_won) for the first success, raises the
+    last error if every copy failed, or asyncio.TimeoutError after timeout seconds.
+    Losing copies are abandoned (their threads finish in the background).
+    """
+    deadline = time.monotonic() + timeout
+    first = asyncio.ensure_future(asyncio.to_thread(fn))
+    pending = {first}
+    hedged = False
+    error = None
+    try:
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            wait_for = min(hedge_delay, remaining) if not hedged else remaining
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is not first
+                error = task.exception()
+            if not done and not hedged:
+                hedged = True
+                metrics.incr("model.hedged")
+                pending.add(asyncio.ensure_future(asyncio.to_thread(fn)))
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class ResilientModel:
+    """Wraps a blocking chat-completion create() with the breaker, hedging and a per-call timeout."""
+
+    def __init__(self, create_fn, breaker: CircuitBreaker, call_timeout: float = 20.0,
+                 min_hedge_delay: float = 1.0, default_hedge_delay: float = 8.0, hedging: bool = True):
+        self.create_fn = create_fn
+        self.breaker = breaker
+        self.call_timeout = call_timeout
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.hedging = hedging
+        self._latencies = deque(maxlen=200)
+
+    def hedge_delay(self) -> float:
+        """Recent p95 latency (with a floor); a fixed default until enough samples exist."""
+        if len(self._latencies) < 20:
+            return self.default_hedge_delay
+        ordered = sorted(self._latencies)
+        return max(self.min_hedge_delay, ordered[int(len(ordered) * 0.95) - 1])
+
+    async def create(self, budget: float, **kwargs):
+        """One model call within budget seconds; raises CircuitOpenError while the breaker is open."""
+        if not self.breaker.allow():
+            metrics.incr("model.short_circuited")
+            raise CircuitOpenError("Model circuit breaker is open")
+        timeout = max(0.1, min(self.call_timeout, budget))
+        # Only hedge while healthy; a half-open probe should not double the load
+        hedge_delay = self.hedge_delay() if self.hedging and self.breaker.state == "closed" else timeout
+        metrics.set_gauge("model.hedge_delay_seconds", round(hedge_delay, 3))
+        started = time.monotonic()
+        try:
+            result, hedge_won = await hedged_call(lambda: self.create_fn(timeout=timeout, **kwargs), hedge_delay, timeout)
+        except asyncio.CancelledError:
+            # Not a model failure, but a cancelled probe must not hold the half-open slot
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            metrics.incr("model.errors")
+            raise
+        latency = time.monotonic() - started
+        self.breaker.record(True, latency)
+        self._latencies.append(latency)
+        metrics.observe("model.latency_seconds", latency)
+        if hedge_won:
+            metrics.incr("model.hedge_won")
+        return result
@@ -0,0 +1,178 @@
+"""
+Per-user semantic cache of validated /chatbot responses.
+
+Posts are embedded as L2-normalized hashed character n-gram vectors after
+stripping URLs, hashtags, mentions, emoji and punctuation, so a reshared post
+with small edits lands close to the original. Entries keep only the nonzero
+columns of their vector (a few hundred for a typical post, not all dims). A
+lookup compares the new post against all of the user's cached posts in one
+vectorized pass; at or above
+the threshold the earlier comment is reused (hashtags and mentions that only
+belonged to the old post are dropped) instead of calling the model.
+
+Entries expire after ttl seconds; each user keeps at most max_entries_per_user,
+at most max_users are cached and all users together hold at most max_entries,
+all evicted least-recently-used.
+"""
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import metrics
+
+_URL_RE = re.compile(r"https?://\S+|www\.\S+")
+_TAG_RE = re.compile(r"[#@]\w+")
+
+
+def normalize_post(text: str) -> str:
+    text = _URL_RE.sub(" ", text.lower())
+    text = _TAG_RE.sub(" ", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def embed_post_sparse(text: str, dims: int = 4096, ngram: int = 4) -> tuple:
+    """(columns, weights) of the nonzero entries of embed_post(text)."""
+    text = normalize_post(text)
+    if not text:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    padded = f" {text} "
+    features = [padded[i:i + ngram] for i in range(max(1, len(padded) - ngram + 1))] + text.split()
+    hashed = np.fromiter((zlib.crc32(f.encode("utf-8")) % dims for f in features), dtype=np.int32)
+    columns, counts = np.unique(hashed, return_counts=True)
+    weights = counts.astype(np.float32)
+    return columns, weights / np.linalg.norm(weights)
+
+
+def embed_post(text: str, dims: int = 4096, ngram: int = 4) -> np.ndarray:
+    """Hashed character n-gram (plus word) embedding of the normalized post."""
+    vector = np.zeros(dims, dtype=np.float32)
+    columns, weights = embed_post_sparse(text, dims, ngram)
+    vector[columns] = weights
+    return vector
+
+
+def adapt_response(response: str, cached_post: str, new_post: str) -> str:
+    """Drops hashtags and mentions the comment took from the old post that the new post no longer has."""
+    new_tags = {t.lower() for t in _TAG_RE.findall(new_post)}
+    old_tags = {t.lower() for t in _TAG_RE.findall(cached_post)}
+    stale = old_tags - new_tags
+    if not stale:
+        return response
+    adapted = _TAG_RE.sub(lambda m: "" if m.group(0).lower() in stale else m.group(0), response)
+    adapted = re.sub(r"\s+([,.!?])", r"\1", adapted)
+    return re.sub(r"\s{2,}", " ", adapted).strip()
+
+
+class _UserEntries:
+    def __init__(self):
+        self.entries = OrderedDict()  # post key -> {"post", "response", "columns", "weights", "created"}
+        self._packed = None
+        self._keys = None
+
+    def invalidate(self):
+        self._packed = None
+
+    def packed(self):
+        """Keys plus every entry's columns and weights concatenated, with each entry's start offset."""
+        if self._packed is None:
+            self._keys = list(self.entries)
+            entries = [self.entries[k] for k in self._keys]
+            sizes = [len(e["columns"]) for e in entries]
+            self._packed = (
+                np.concatenate([e["columns"] for e in entries]),
+                np.concatenate([e["weights"] for e in entries]),
+                np.cumsum([0] + sizes[:-1]),
+            )
+        return self._keys, self._packed
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.9, max_entries_per_user: int = 200,
+                 max_users: int = 2000, max_entries: int = 50000, ttl: float = 7 * 24 * 3600, dims: int = 4096):
+        self.threshold = threshold
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self.max_entries = max_entries
+        self._entry_count = 0
+        self.ttl = ttl
+        self.dims = dims
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.register_ratio("semantic_cache.hit_rate", "semantic_cache.hits", "semantic_cache.lookups")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._users), "entries": self._entry_count}
+
+    def _expire(self, user: _UserEntries, now: float):
+        expired = [k for k, e in user.entries.items() if now - e["created"] > self.ttl]
+        for key in expired:
+            del user.entries[key]
+        if expired:
+            self._entry_count -= len(expired)
+            user.invalidate()
+
+    def _evict_oldest(self, user: _UserEntries):
+        user.entries.popitem(last=False)
+        self._entry_count -= 1
+        user.invalidate()
+
+    def lookup(self, user_id: str, post: str):
+        """(response, similarity) for the closest cached post at or above the threshold, else None."""
+        vector = embed_post(post, self.dims)  # Dense only for the query, while it is being looked up
+        metrics.incr("semantic_cache.lookups")
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            self._users.move_to_end(user_id)
+            self._expire(user, time.time())
+            if not user.entries:
+                return None
+            keys, (columns, weights, offsets) = user.packed()
+            similarities = np.add.reduceat(vector[columns] * weights, offsets)
+            best = int(similarities.argmax())
+            similarity = float(similarities[best])
+            metrics.observe("semantic_cache.similarity", round(similarity, 4))
+            if similarity < self.threshold:
+                return None
+            entry = user.entries[keys[best]]
+            user.entries.move_to_end(keys[best])
+        metrics.incr("semantic_cache.hits")
+        return adapt_response(entry["response"], entry["post"], post), similarity
+
+    def store(self, user_id: str, post: str, response: str):
+        """Caches a validated response for this post (replacing any entry for the same normalized post)."""
+        key = normalize_post(post)
+        if not key:
+            return
+        columns, weights = embed_post_sparse(post, self.dims)
+        entry = {"post": post, "response": response, "columns": columns, "weights": weights, "created": time.time()}
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                user = self._users[user_id] = _UserEntries()
+                while len(self._users) > self.max_users:
+                    self._entry_count -= len(self._users.popitem(last=False)[1].entries)
+            else:
+                self._users.move_to_end(user_id)
+            if key not in user.entries:
+                self._entry_count += 1
+            user.entries[key] = entry
+            user.entries.move_to_end(key)
+            while len(user.entries) > self.max_entries_per_user:
+                self._evict_oldest(user)
+            # Over the global cap, the least recently used users give up their oldest entries first
+            while self._entry_count > self.max_entries:
+                oldest_id, oldest = next(iter(self._users.items()))
+                if oldest.entries:
+                    self._evict_oldest(oldest)
+                if not oldest.entries:
+                    del self._users[oldest_id]
+            user.invalidate()
+            metrics.set_gauge("semantic_cache.users", len(self._users))
@@ -0,0 +1,179 @@
+"""
+Per-user style centroids in the style store's embedding space.
+
+A user's saved comments are summarized as the running sum of their comment
+embeddings (plus the ids that went into it), so saves and deletes adjust the
+centroid incrementally instead of re-embedding everything. Comment vectors are
+read back from the vector store when present; only missing ones are embedded.
+Centroids are persisted in the style_centroids Firestore collection, so a cold
+worker loads them with one read, and kept in an in-process LRU.
+
+/chatbot blends the post embedding with the centroid into one retrieval query.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import metrics
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class StyleCentroids:
+    def __init__(self, db, embeddings, vectordb=None, collection: str = "style_centroids",
+                 style_weight: float = 0.3, max_users: int = 5000):
+        self.db = db
+        self.embeddings = embeddings
+        self.vectordb = vectordb
+        self.collection = collection
+        self.style_weight = style_weight
+        self.max_users = max_users
+        self._cache = OrderedDict()  # user_id -> {"sum": np.ndarray, "count": int, "ids": set}
+        self._lock = threading.Lock()
+
+    def _stored_vectors(self, comment_ids: list) -> dict:
+        """comment id -> unit embedding for the ids the vector store still holds."""
+        if self.vectordb is None or not comment_ids:
+            return {}
+        try:
+            stored = self.vectordb.get(ids=list(comment_ids), include=["embeddings"])
+        except Exception as e:
+            print(f"Error reading stored comment embeddings: {e}")
+            return {}
+        embeddings = stored.get("embeddings")
+        if embeddings is None:
+            return {}
+        return {
+            comment_id: _normalize(np.asarray(embedding, dtype=np.float32))
+            for comment_id, embedding in zip(stored.get("ids", []), embeddings)
+            if embedding is not None
+        }
+
+    def _vectors_for(self, comments: list) -> dict:
+        """comment id -> unit embedding, read from the vector store where possible."""
+        vectors = self._stored_vectors([c["id"] for c in comments])
+        missing = [c for c in comments if c["id"] not in vectors]
+        if missing:
+            metrics.incr("style_centroids.embedded", len(missing))
+            for c, embedding in zip(missing, self.embeddings.embed_documents([c["comment"] for c in missing])):
+                vectors[c["id"]] = _normalize(np.asarray(embedding, dtype=np.float32))
+        return vectors
+
+    def is_cached(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._cache
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._cache), "comments": sum(e["count"] for e in self._cache.values())}
+
+    def _remember(self, user_id: str, entry: dict):
+        with self._lock:
+            self._cache[user_id] = entry
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+
+    def _persist(self, user_id: str, entry: dict):
+        try:
+            self.db.collection(self.collection).document(user_id).set({
+                "sum": entry["sum"].tolist(),
+                "count": entry["count"],
+                "ids": sorted(entry["ids"])
+            })
+        except Exception as e:
+            print(f"Error saving style centroid: {e}")
+
+    def _load(self, user_id: str, comments: list):
+        """
+        The user's centroid entry: memory, then Firestore, then built from their
+        comments. A copy whose ids differ from the comments passed in is skipped,
+        since another worker may have saved or deleted comments since it was made.
+        """
+        live = {c["id"]: c for c in comments if c.get("id") and c.get("comment", "").strip()}
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None:
+                if entry["ids"] == set(live):
+                    self._cache.move_to_end(user_id)
+                    return entry
+                metrics.incr("style_centroids.stale")
+        entry = None
+        try:
+            snapshot = self.db.collection(self.collection).document(user_id).get()
+            if snapshot.exists:
+                data = snapshot.to_dict()
+                entry = {"sum": np.asarray(data["sum"], dtype=np.float32), "count": data["count"], "ids": set(data["ids"])}
+        except Exception as e:
+            print(f"Error loading style centroid: {e}")
+        if entry is None or entry["ids"] != set(live):
+            # Missing, or out of step with the saved comments: rebuild once
+            metrics.incr("style_centroids.rebuilt")
+            vectors = self._vectors_for(list(live.values()))
+            total = np.sum(list(vectors.values()), axis=0) if vectors else None
+            entry = {"sum": total, "count": len(vectors), "ids": set(vectors)}
+            if vectors:
+                self._persist(user_id, entry)
+        self._remember(user_id, entry)
+        return entry
+
+    def centroid(self, user_id: str, comments: list):
+        """Unit centroid of the user's saved comments, or None if they have none."""
+        entry = self._load(user_id, comments)
+        if not entry["count"]:
+            return None
+        return _normalize(entry["sum"])
+
+    def query_vector(self, user_id: str, comments: list, post: str) -> list:
+        """Post embedding blended with the user's style centroid, as one retrieval query."""
+        query = _normalize(np.asarray(self.embeddings.embed_query(post), dtype=np.float32))
+        centroid = self.centroid(user_id, comments)
+        if centroid is not None and centroid.shape == query.shape:
+            query = _normalize((1 - self.style_weight) * query + self.style_weight * centroid)
+        return query.tolist()
+
+    def add(self, user_id: str, comments: list):
+        """Adds newly saved comments; call after they were written to the vector store."""
+        with self._lock:
+            entry = self._cache.get(user_id)
+        if entry is None:
+            return  # Built from the full list on next use
+        new = [c for c in comments if c["id"] not in entry["ids"] and c.get("comment", "").strip()]
+        if not new:
+            return
+        vectors = self._vectors_for(new)
+        with self._lock:
+            for comment_id, vector in vectors.items():
+                entry["sum"] = vector.copy() if entry["sum"] is None else entry["sum"] + vector
+                entry["count"] += 1
+                entry["ids"].add(comment_id)
+        self._persist(user_id, entry)
+
+    def remove(self, user_id: str, comment_ids: list):
+        """Subtracts deleted or about-to-be-edited comments; call before they leave the vector store."""
+        with self._lock:
+            entry = self._cache.get(user_id)
+        if entry is None:
+            return
+        present = [comment_id for comment_id in comment_ids if comment_id in entry["ids"]]
+        if not present:
+            return
+        stored = self._stored_vectors(present)
+        with self._lock:
+            for comment_id in present:
+                vector = stored.get(comment_id)
+                if vector is None:
+                    continue
+                entry["sum"] = entry["sum"] - vector
+                entry["count"] -= 1
+                entry["ids"].discard(comment_id)
+            unresolved = [comment_id for comment_id in present if comment_id in entry["ids"]]
+            if unresolved:
+                # No stored vector to subtract: rebuild from the comments on next use
+                self._cache.pop(user_id, None)
+        if not unresolved:
+            self._persist(user_id, entry)
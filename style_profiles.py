@@ -0,0 +1,58 @@
+"""
+Per-user cache of the style profile derived from saved comments.
+
+The profile (theme, sentiment, style markers, average length) is what
+HumanStyleGenerator.extract_properties_from_comments computes from every saved
+comment. It is cached per user together with a fingerprint of the comments it
+was built from, so it is recomputed only after the saved comments change.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+def _fingerprint(comments: list) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for c in comments:
+        text = c['comment'] if isinstance(c, dict) and 'comment' in c else str(c)
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class StyleProfileCache:
+    def __init__(self, generator, max_users: int = 5000):
+        self.generator = generator
+        self.max_users = max_users
+        self._profiles = OrderedDict()  # user_id -> (fingerprint, profile)
+        self._lock = threading.Lock()
+        metrics.register_ratio("style_profiles.hit_rate", "style_profiles.hits", "style_profiles.lookups")
+
+    def is_cached(self, user_id: str, comments: list) -> bool:
+        with self._lock:
+            cached = self._profiles.get(user_id)
+        return cached is not None and cached[0] == _fingerprint(comments)
+
+    def get(self, user_id: str, comments: list) -> dict:
+        """The user's style profile for these saved comments (a shallow copy)."""
+        metrics.incr("style_profiles.lookups")
+        fingerprint = _fingerprint(comments)
+        with self._lock:
+            cached = self._profiles.get(user_id)
+            if cached is not None and cached[0] == fingerprint:
+                self._profiles.move_to_end(user_id)
+                metrics.incr("style_profiles.hits")
+                return dict(cached[1])
+        profile = self.generator.extract_properties_from_comments(comments)
+        with self._lock:
+            self._profiles[user_id] = (fingerprint, profile)
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+        return dict(profile)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._profiles)}
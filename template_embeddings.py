@@ -0,0 +1,184 @@
+"""
+Precomputed embeddings for HumanStyleGenerator's theme prototypes and comment templates.
+
+Every theme prototype and every template (together with a short description
+of the kind of post its pattern type suits) is embedded into one small
+matrix: theme rows first, then template rows. Columns are the stemmed words
+of those texts (stopwords removed), one column per word, so two different
+words never share a column. The matrix and its vocabulary are built once
+with `python template_embeddings.py build` and loaded from
+template_embeddings.npy/.json at startup; if the templates changed since they
+were built, they are rebuilt in memory. Scoring a post is one embedding plus
+one matrix-vector product, shared by theme and template selection.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template_embeddings.npy")
+
+# Function words and fillers that say nothing about a post's theme
+STOPWORDS = frozenset(
+    "about above after again all also and any are because been before being below between both but can could "
+    "did does doing down during each even ever every few for from further had has have having her here hers "
+    "herself him himself his how into its itself just more most much must myself not now off once only other "
+    "our ours ourselves out over own really same she should some such than that the their theirs them "
+    "themselves then there these they this those through too under until very was were what when where which "
+    "while who whom why will with would you your yours yourself yourselves".split()
+)
+
+# What posts of each theme talk about (theme names match analyze_post_theme)
+THEME_PROTOTYPES = {
+    "career_growth": "career growth promotion success achievement new role job offer hired milestone "
+                     "professional development skills progress goal",
+    "leadership": "leadership team management culture people leader manager employees trust delegate "
+                  "hiring organization feedback",
+    "business_strategy": "business strategy roi revenue growth market customers sales product pricing "
+                         "brand competition profit",
+    "personal_story": "journey experience learned challenge overcome story years ago remember life "
+                      "changed struggle",
+    "advice_sharing": "advice tip lesson learned mistake avoid should how to steps guide recommend",
+    "networking": "connection relationship network community event meet conference introduce "
+                  "collaboration together",
+    "motivation": "motivation inspiration mindset attitude believe dream keep going never give up "
+                  "discipline habits",
+    "well_being": "mental health burnout well-being health rest balance stress sleep break self care",
+}
+
+# The kind of post each pattern type answers well
+PATTERN_TYPE_CONTEXT = {
+    "agreement_short": "relatable funny true moment short post everyone felt",
+    "agreement_extended": "agree insight point lesson important idea makes difference",
+    "observations": "interesting perspective observation idea topic statement thought",
+    "business_insights": "business brand strategy customers trust reputation actions consistency",
+    "practical_feedback": "practical steps tips list points advice specific how to",
+    "experience_sharing": "challenge struggle difficult failed lesson experience been there",
+    "personal_endorsement": "personal story resonates relatable journey experience highlight",
+}
+
+THEME_MIN_SIMILARITY = 0.05
+_SUFFIXES = ("ments", "ment", "ions", "ion", "ing", "ed", "es", "s", "ly")
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4:
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list:
+    """Stemmed words of three or more letters, without stopwords."""
+    return [_stem(w) for w in re.findall(r"[a-z]+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def build_vocabulary(texts: list) -> dict:
+    """Stemmed word -> column, over every word of texts."""
+    return {word: column for column, word in enumerate(sorted({w for text in texts for w in tokenize(text)}))}
+
+
+def embed_text(text: str, vocabulary: dict) -> np.ndarray:
+    """
+    L2-normalized bag of stemmed words over the vocabulary's columns (sublinear
+    term frequency). Words outside the vocabulary still count toward the norm,
+    so dot products with the matrix rows stay cosine similarities.
+    """
+    vector = np.zeros(len(vocabulary), dtype=np.float32)
+    unknown = 0.0
+    for word, count in Counter(tokenize(text)).items():
+        weight = math.log1p(count)
+        column = vocabulary.get(word)
+        if column is None:
+            unknown += weight * weight
+        else:
+            vector[column] = weight
+    norm = math.sqrt(float(vector @ vector) + unknown)
+    return vector / norm if norm else vector
+
+
+def template_rows(human_patterns: dict) -> list:
+    """(pattern_type, template) pairs in matrix row order."""
+    return [(pattern_type, template) for pattern_type, templates in human_patterns.items() for template in templates]
+
+
+def _template_text(pattern_type: str, template: str) -> str:
+    # Placeholders become plain words ({specific_point} -> "specific point")
+    filled = re.sub(r"\{(\w+)\}", lambda m: m.group(1).replace("_", " "), template)
+    return f"{PATTERN_TYPE_CONTEXT.get(pattern_type, '')} {filled}"
+
+
+def fingerprint(human_patterns: dict) -> str:
+    source = json.dumps([THEME_PROTOTYPES, PATTERN_TYPE_CONTEXT, template_rows(human_patterns), sorted(STOPWORDS)])
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def build_matrix(human_patterns: dict):
+    """(matrix, vocabulary) for the theme prototypes and templates."""
+    texts = list(THEME_PROTOTYPES.values()) + [_template_text(t, p) for t, p in template_rows(human_patterns)]
+    vocabulary = build_vocabulary(texts)
+    return np.vstack([embed_text(text, vocabulary) for text in texts]), vocabulary
+
+
+def save_matrix(human_patterns: dict, path: str = DEFAULT_PATH):
+    matrix, vocabulary = build_matrix(human_patterns)
+    np.save(path, matrix)
+    with open(path.replace(".npy", ".json"), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint(human_patterns), "vocabulary": sorted(vocabulary, key=vocabulary.get)}, f)
+
+
+class TemplateIndex:
+    def __init__(self, human_patterns: dict, path: str = DEFAULT_PATH):
+        self.themes = list(THEME_PROTOTYPES)
+        self.templates = template_rows(human_patterns)
+        self.matrix, self.vocabulary = self._load(human_patterns, path)
+
+    def _load(self, human_patterns: dict, path: str):
+        try:
+            with open(path.replace(".npy", ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(path)
+            vocabulary = {word: column for column, word in enumerate(meta.get("vocabulary", []))}
+            if (meta.get("fingerprint") == fingerprint(human_patterns)
+                    and matrix.shape == (len(self.themes) + len(self.templates), len(vocabulary))):
+                return matrix.astype(np.float32, copy=False), vocabulary
+            print("Template embeddings are out of date, rebuilding in memory")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading template embeddings: {e}")
+        return build_matrix(human_patterns)
+
+    def score(self, text: str) -> dict:
+        """Cosine similarity of text to every theme prototype and template."""
+        similarities = self.matrix @ embed_text(text, self.vocabulary)
+        return {
+            "themes": similarities[:len(self.themes)],
+            "templates": dict(zip(self.templates, similarities[len(self.themes):].tolist())),
+        }
+
+    def best_theme(self, scores: dict, default: str = "general_business") -> str:
+        theme_scores = scores["themes"]
+        best = int(theme_scores.argmax())
+        return self.themes[best] if theme_scores[best] >= THEME_MIN_SIMILARITY else default
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Template embedding maintenance")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    from human_style_generator import HumanStyleGenerator
+    save_matrix(HumanStyleGenerator().human_patterns, args.output)
+    print(f"✅ Template embeddings written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
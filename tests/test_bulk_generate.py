@@ -0,0 +1,46 @@
+import argparse
+import json
+
+import pytest
+
+import bulk_generate
+
+
+def make_args(tmp_path, input_path, **overrides):
+    args = dict(input=str(input_path), output=str(tmp_path / "out.jsonl"), column="post", id_column="id",
+                workers=1, chunk_size=2, start_offset=0, limit=None, resume=False, retrieval=False,
+                chroma_dir="", seed="1", report_every=60.0)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_read_posts_streams_csv_and_jsonl(tmp_path):
+    csv_path = tmp_path / "posts.csv"
+    csv_path.write_text("id,post\na,First post\nb, \n", encoding="utf-8")
+    assert list(bulk_generate.read_posts(str(csv_path), "post", "id")) == [(0, "a", "First post"), (1, "b", "")]
+    jsonl_path = tmp_path / "posts.jsonl"
+    jsonl_path.write_text('{"post": "One"}\n\n{"post": "Two"}\n', encoding="utf-8")
+    assert list(bulk_generate.read_posts(str(jsonl_path), "post")) == [(0, None, "One"), (1, None, "Two")]
+
+
+def test_resume_offset_drops_a_partial_trailing_line(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text('{"offset": 0}\n{"offset": 1}\n{"offs', encoding="utf-8")
+    assert bulk_generate.resume_offset(str(output)) == 2
+    assert output.read_text(encoding="utf-8") == '{"offset": 0}\n{"offset": 1}\n'
+
+
+def test_limit_stops_reading_the_input(tmp_path):
+    # The generator imports langchain and pandas at module level
+    for module in ("langchain", "pandas"):
+        pytest.importorskip(module)
+    input_path = tmp_path / "posts.jsonl"
+    lines = [json.dumps({"id": str(i), "post": f"Post number {i} about building a team."}) for i in range(4)]
+    # Anything past the limit must not even be parsed
+    input_path.write_text("\n".join(lines) + "\nnot json\n", encoding="utf-8")
+
+    report = bulk_generate.run(make_args(tmp_path, input_path, start_offset=1, limit=2))
+
+    assert report["generated"] == 2
+    with open(tmp_path / "out.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["offset"] for line in f] == [1, 2]
@@ -0,0 +1,53 @@
+import pytest
+
+from comment_repair import remove_banned_phrases, repair_response
+
+BANNED = ["approach", "strategic", "dynamic", "unlock", "amazing", "truly", "leverage"]
+
+
+@pytest.mark.parametrize("text", [
+    "She is very approachable.",
+    "Strategically, this was the right call.",
+    "Team dynamics matter more than tools.",
+    "Unlocking growth takes patience.",
+])
+def test_banned_word_inside_a_longer_word_is_left_alone(text):
+    assert remove_banned_phrases(text, BANNED) == text
+
+
+@pytest.mark.parametrize("text", [
+    "She is very approachable.",
+    "Unlocking growth takes patience.",
+])
+def test_repair_gives_up_instead_of_corrupting_words(text):
+    assert repair_response(text, BANNED) is None
+
+
+def test_whole_words_are_substituted_with_matching_case():
+    text = "Strategic hires and a dynamic team. Unlock it with this approach."
+    assert remove_banned_phrases(text, BANNED) == "Smart hires and a lively team. Open it up with this method."
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Unlock growth with feedback.", "Open up growth with feedback."),
+    ("We approach the problem calmly.", "We tackle the problem calmly."),
+    ("The approach this team took worked.", "The method this team took worked."),
+    ("This approach is great.", "This method is great."),
+])
+def test_substitutes_fit_the_words_around_them(text, expected):
+    assert remove_banned_phrases(text, BANNED) == expected
+
+
+def test_article_follows_the_substitute():
+    assert remove_banned_phrases("What an amazing launch.", BANNED) == "What a great launch."
+    assert remove_banned_phrases("A dynamic team wins.", BANNED) == "A lively team wins."
+
+
+def test_removed_word_leaves_no_stray_punctuation():
+    assert remove_banned_phrases("Truly, this is great.", BANNED) == "This is great."
+    assert remove_banned_phrases("This was great, truly, for me.", BANNED) == "This was great, for me."
+    assert remove_banned_phrases("I truly  needed this .", BANNED) == "I needed this."
+
+
+def test_repair_fixes_a_single_banned_word():
+    assert repair_response("We leverage feedback every week.", BANNED) == "We use feedback every week."
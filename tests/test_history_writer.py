@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import history_writer
+from history_writer import HistoryWriter
+
+
+class FakeDoc:
+    update_time = None
+
+    def __init__(self, store, user_id):
+        self.store = store
+        self.user_id = user_id
+
+    def get(self):
+        return self
+
+    @property
+    def exists(self):
+        return self.user_id in self.store
+
+    def to_dict(self):
+        return json.loads(json.dumps(self.store[self.user_id], default=str))
+
+    def update(self, fields, option=None):
+        self.store[self.user_id].update(fields)
+
+
+class FakeDb:
+    def __init__(self, users):
+        self.store = {user: {"chat_sessions": []} for user in users}
+
+    def collection(self, name):
+        return self
+
+    def document(self, user_id):
+        return FakeDoc(self.store, user_id)
+
+    def write_option(self, **kwargs):
+        return None
+
+
+def spooled_line(user_id, session_id, query):
+    chat_data = {"query": query, "response": "ok", "timestamp": datetime(2026, 1, 1)}
+    return history_writer._encode_entry(user_id, session_id, chat_data) + "\n"
+
+
+def queries(db, user_id):
+    return [q["query"] for s in db.store[user_id]["chat_sessions"] for q in s["queries"]]
+
+
+def test_enqueue_before_start_raises_a_clear_error(tmp_path):
+    writer = HistoryWriter(FakeDb(["u1"]), spool_path=str(tmp_path / "history_spool.jsonl"))
+    with pytest.raises(RuntimeError, match="start"):
+        asyncio.run(writer.enqueue("u1", "s1", {"query": "q", "timestamp": datetime(2026, 1, 1)}))
+
+
+def test_each_process_spools_to_its_own_file(tmp_path):
+    db = FakeDb(["u1"])
+    writer = HistoryWriter(db, spool_path=str(tmp_path / "history_spool.jsonl"), flush_interval=0.01)
+
+    async def run():
+        await writer.start()
+        assert writer.spool_path == str(tmp_path / f"history_spool.{os.getpid()}.jsonl")
+        await writer.enqueue("u1", "s1", {"query": "hello", "timestamp": datetime(2026, 1, 1)})
+        await writer.stop()
+
+    asyncio.run(run())
+    assert queries(db, "u1") == ["hello"]
+    assert not os.path.exists(writer.spool_path)
+
+
+@pytest.mark.skipif(history_writer.fcntl is None, reason="needs file locks")
+def test_start_replays_spools_of_exited_workers_only(tmp_path):
+    import fcntl
+
+    db = FakeDb(["u1", "u2"])
+    orphan = tmp_path / "history_spool.999991.jsonl"
+    orphan.write_text(spooled_line("u1", "s1", "from exited worker"), encoding="utf-8")
+    live = tmp_path / "history_spool.999992.jsonl"
+    live.write_text(spooled_line("u2", "s2", "from live worker"), encoding="utf-8")
+    legacy = tmp_path / "history_spool.jsonl"
+    legacy.write_text(spooled_line("u2", "s3", "from shared spool"), encoding="utf-8")
+
+    writer = HistoryWriter(db, spool_path=str(legacy), flush_interval=0.01)
+
+    async def run():
+        await writer.start()
+        await writer.stop()
+
+    with open(live, "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        asyncio.run(run())
+
+    assert queries(db, "u1") == ["from exited worker"]
+    assert queries(db, "u2") == ["from shared spool"]
+    assert not orphan.exists() and not legacy.exists()
+    assert live.read_text(encoding="utf-8").strip()
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+from http_utils import decode_cursor, encode_cursor, etag_json_response, paginate, parse_fields, project
+
+ITEMS = [{"id": f"c{i}", "comment": f"text {i}"} for i in range(5)]
+
+
+def ids(page):
+    return [item["id"] for item in page]
+
+
+def by_id(item):
+    return item["id"]
+
+
+def test_paginate_walks_every_item_once():
+    seen, cursor = [], None
+    while True:
+        page, cursor = paginate(ITEMS, cursor, 2, key=by_id)
+        seen += ids(page)
+        if cursor is None:
+            break
+    assert seen == ids(ITEMS)
+
+
+def test_cursor_survives_deletion_of_earlier_items():
+    page, cursor = paginate(ITEMS, None, 2, key=by_id)
+    assert ids(page) == ["c0", "c1"]
+    remaining = [item for item in ITEMS if item["id"] != "c0"]
+    page, _ = paginate(remaining, cursor, 2, key=by_id)
+    assert ids(page) == ["c2", "c3"]
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    assert decode_cursor(encode_cursor("c3", 3)) == {"k": "c3", "i": 3}
+    with pytest.raises(HTTPException) as error:
+        decode_cursor("not-a-cursor")
+    assert error.value.status_code == 400
+
+
+def test_parse_fields_and_project():
+    assert parse_fields("", {"id", "comment"}) is None
+    fields = parse_fields("id, comment", {"id", "comment", "timestamp"})
+    assert fields == {"id", "comment"}
+    assert project([{"id": "c1", "comment": "x", "timestamp": 1}], {"id"}) == [{"id": "c1"}]
+    with pytest.raises(HTTPException) as error:
+        parse_fields("id,secret", {"id"})
+    assert error.value.status_code == 400
+
+
+def test_etag_response_answers_304_for_a_matching_if_none_match():
+    app = FastAPI()
+    payload = {"comments": ITEMS}
+
+    @app.get("/items")
+    async def items(request: Request):
+        return etag_json_response(request, payload)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/items")
+            assert first.status_code == 200
+            assert first.json() == payload
+            etag = first.headers["etag"]
+            cached = await client.get("/items", headers={"If-None-Match": f'W/"other", {etag}'})
+            assert cached.status_code == 304
+            assert cached.content == b""
+            assert cached.headers["etag"] == etag
+            payload["comments"] = ITEMS[:1]
+            changed = await client.get("/items", headers={"If-None-Match": etag})
+            assert changed.status_code == 200
+            assert changed.headers["etag"] != etag
+
+    asyncio.run(run())
@@ -0,0 +1,77 @@
+import asyncio
+import os
+
+import pytest
+
+from job_queue import JobQueue
+
+
+def test_higher_priority_runs_first_and_cancelled_jobs_are_skipped():
+    order = []
+
+    async def handler(payload):
+        order.append(payload["name"])
+        return payload["name"]
+
+    async def run():
+        queue = JobQueue(handler, lanes={"bulk": 1})
+        await queue.start()
+        low = queue.submit({"name": "low"}, lane="bulk", priority=1)
+        cancelled = queue.submit({"name": "cancelled"}, lane="bulk", priority=9)
+        high = queue.submit({"name": "high"}, lane="bulk", priority=5)
+        queue.cancel(cancelled["job_id"])
+        while queue.get(low["job_id"])["status"] != "succeeded":
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue.get(high["job_id"]), queue.get(cancelled["job_id"])
+
+    high, cancelled = asyncio.run(run())
+    assert order == ["high", "low"]
+    assert high["result"] == "high"
+    assert cancelled["status"] == "cancelled"
+
+
+def test_submit_rejects_unknown_lane_and_remote_callbacks():
+    async def run():
+        queue = JobQueue(lambda payload: None, lanes={"interactive": 1})
+        await queue.start()
+        try:
+            with pytest.raises(ValueError):
+                queue.submit({}, lane="bulk")
+            with pytest.raises(ValueError):
+                queue.submit({}, callback_url="http://example.com/hook")
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_job_without_session_id_runs_through_the_chatbot():
+    for module in ("firebase_admin", "langchain", "openai", "pandas", "dotenv"):
+        pytest.importorskip(module)
+    import httpx
+
+    os.environ["USE_LOCAL_FAKES"] = "1"
+    import app as app_module
+
+    app_module.db.collection("users").document("job-user").set(
+        {"email": "job-user@example.com", "name": "job-user", "comments": [], "chat_sessions": []}
+    )
+
+    async def run():
+        async with app_module.app.router.lifespan_context(app_module.app):
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                submitted = await client.post("/jobs/", json={"query": "We shipped a new release today.", "user_id": "job-user"})
+                assert submitted.status_code == 202
+                job_id = submitted.json()["job_id"]
+                for _ in range(500):
+                    result = await client.get(f"/jobs/{job_id}/result")
+                    if result.status_code != 202:
+                        return result
+                    await asyncio.sleep(0.01)
+                return result
+
+    result = asyncio.run(run())
+    assert result.status_code == 200
+    assert result.json()["session_id"]
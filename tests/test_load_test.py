@@ -0,0 +1,25 @@
+import asyncio
+import os
+
+import pytest
+
+for module in ("firebase_admin", "langchain", "openai", "pandas", "dotenv"):
+    pytest.importorskip(module)
+
+os.environ["USE_LOCAL_FAKES"] = "1"
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "0")
+
+import load_test
+
+
+def test_inprocess_run_starts_app_and_serves_chatbot():
+    records = [
+        {"user_id": "load-user-1", "post": "We shipped the new onboarding flow today.", "comment": "Great work team."},
+        {"user_id": "load-user-2", "post": "Three lessons from a year of hiring.", "comment": "Hiring is hard."},
+    ]
+    report = asyncio.run(load_test.run_load_test(
+        records, {"chatbot": 1}, concurrency=2, duration=30, total_requests=4, seed=1
+    ))
+    chatbot = report["endpoints"]["chatbot"]
+    assert chatbot["requests"] == 4
+    assert chatbot["requests"] - chatbot["errors"] >= 1
@@ -0,0 +1,51 @@
+from near_dup import MinHashLSH, NearDuplicateIndex, dedupe_texts
+
+ORIGINAL = "Consistency beats intensity. Showing up every day is what built this team."
+REWORDED = "Consistency beats intensity! Showing up every day is what built this team"
+UNRELATED = "Hiring for curiosity has worked better for us than hiring for experience."
+
+
+def test_minhash_finds_near_duplicates_only():
+    index = MinHashLSH(threshold=0.8)
+    index.add("a", ORIGINAL)
+    index.add("b", UNRELATED)
+    matches = index.query(REWORDED)
+    assert [key for key, _ in matches] == ["a"]
+    assert matches[0][1] >= 0.8
+    index.remove("a")
+    assert index.query(REWORDED) == []
+    assert "a" not in index and len(index) == 1
+
+
+def test_signature_is_deterministic_across_instances():
+    assert MinHashLSH().signature(ORIGINAL) == MinHashLSH().signature(ORIGINAL)
+    assert MinHashLSH.similarity(MinHashLSH().signature(ORIGINAL), MinHashLSH().signature(ORIGINAL)) == 1.0
+
+
+def test_dedupe_texts_actions():
+    texts = [ORIGINAL, UNRELATED, REWORDED + " Every single day."]
+    kept, report = dedupe_texts(texts, threshold=0.7, action="skip")
+    assert kept == [ORIGINAL, UNRELATED] and report["near_duplicates"] == 1
+    kept, _ = dedupe_texts(texts, threshold=0.7, action="merge")
+    assert kept == [texts[2], UNRELATED]
+    kept, _ = dedupe_texts(texts, threshold=0.7, action="flag")
+    assert kept == texts
+
+
+def test_index_follows_comments_changed_elsewhere():
+    index = NearDuplicateIndex(threshold=0.8)
+    comments = [{"id": "c1", "comment": ORIGINAL}, {"id": "c2", "comment": UNRELATED}]
+    assert index.find("u1", comments, REWORDED)[0] == "c1"
+
+    # Another worker deleted c1 and saved c3: the index must not return the deleted id
+    comments = [{"id": "c2", "comment": UNRELATED}, {"id": "c3", "comment": ORIGINAL + " Again."}]
+    assert index.find("u1", comments, REWORDED)[0] == "c3"
+    assert index.find("u1", comments[:1], REWORDED) is None
+    assert index.stats() == {"users": 1, "signatures": 1}
+
+
+def test_index_evicts_least_recently_used_users():
+    index = NearDuplicateIndex(max_users=2)
+    for user in ("u1", "u2", "u1", "u3"):
+        index.find(user, [{"id": "c", "comment": ORIGINAL}], UNRELATED)
+    assert index.is_loaded("u1") and index.is_loaded("u3") and not index.is_loaded("u2")
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("sklearn")
+
+from prompt_builder import PromptBuilder
+
+
+def test_examples_are_relevant_and_not_near_copies():
+    builder = PromptBuilder(["delve"], max_examples=2)
+    saved = [
+        "Hiring is hard, we rewrote our hiring loop twice.",
+        "Hiring is hard, we rewrote our hiring loop twice!!",
+        "Our hiring loop now has a paid take-home task.",
+        "Loved the sunset photos from the trip.",
+    ]
+    examples = builder.select_examples("How we fixed our hiring loop", saved, [])
+    assert examples == [saved[0], saved[2]]
+
+
+def test_only_the_most_relevant_candidates_enter_mmr():
+    builder = PromptBuilder([], max_examples=2, candidate_pool=2)
+    filler = [f"Weekend photo number {i} from the lake." for i in range(3000)]
+    saved = filler + ["Pricing changes for our product launch.", "Launch pricing tiers explained."]
+    examples = builder.select_examples("Product launch pricing", saved, [])
+    assert set(examples) == {"Pricing changes for our product launch.", "Launch pricing tiers explained."}
+
+
+def test_examples_fit_the_token_budget():
+    builder = PromptBuilder([], example_token_budget=12, max_examples=4)
+    saved = ["short one about launch", "a much longer comment about the launch " * 10]
+    assert builder.select_examples("launch", saved, []) == ["short one about launch"]
+
+
+def test_empty_vocabulary_keeps_the_original_order():
+    builder = PromptBuilder([], max_examples=2)
+    assert builder.select_examples("🔥", ["🚀", "🎉", "✨"], []) == ["🚀", "🎉"]
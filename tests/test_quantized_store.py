@@ -0,0 +1,115 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+
+from quantized_store import QuantizedVectorStore, quantize, recall_at_k, write_store
+
+DIMS = 16
+
+
+class HashEmbeddings:
+    """Deterministic pseudo-random vector per text."""
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "little")
+        return np.random.default_rng(seed).normal(size=DIMS).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def build(directory, count=40, mode="int8", **kwargs):
+    embeddings = HashEmbeddings()
+    ids = [f"id{i}" for i in range(count)]
+    texts = [f"doc {i}" for i in range(count)]
+    write_store(str(directory), ids, texts, [{"n": i} for i in range(count)], np.asarray(embeddings.embed_documents(texts)), mode)
+    return QuantizedVectorStore(str(directory), embeddings, rerank_candidates=10, block_rows=7, **kwargs)
+
+
+def top_ids(store, text, k=3):
+    return [entry_id for _, entry_id, _, _ in store._search(store.embeddings.embed_query(text), k)]
+
+
+@pytest.mark.parametrize("mode, tolerance", [("int8", 0.02), ("float16", 0.002)])
+def test_quantize_round_trip_is_close(mode, tolerance):
+    vectors = np.random.default_rng(0).normal(size=(50, DIMS)).astype(np.float32)
+    codes, scales = quantize(vectors, mode)
+    restored = codes.astype(np.float32) * (scales[:, None] if scales is not None else 1.0)
+    assert np.max(np.abs(restored - vectors) / np.abs(vectors).max(axis=1, keepdims=True)) < tolerance
+    with pytest.raises(ValueError):
+        quantize(vectors, "int4")
+
+
+def test_recall_at_k():
+    assert recall_at_k([["a", "b"], ["c", "x"]], [["a", "b"], ["c", "d"]]) == 0.75
+    assert recall_at_k([], []) == 1.0
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_search_finds_the_stored_text_first(tmp_path, mode):
+    store = build(tmp_path, mode=mode)
+    assert top_ids(store, "doc 7")[0] == "id7"
+    [document] = store.similarity_search("doc 7", k=1)
+    assert document.page_content == "doc 7" and document.metadata == {"n": 7}
+
+
+def test_delta_and_tombstones_survive_persist_and_reload(tmp_path):
+    store = build(tmp_path)
+    store.add_texts(["new text"], metadatas=[{"n": "new"}], ids=["new"])
+    store.add_texts(["doc 3 replaced"], ids=["id3"])
+    store.delete(ids=["id5"])
+    store.persist()
+
+    reopened = QuantizedVectorStore(str(tmp_path), HashEmbeddings(), rerank_candidates=10)
+    for s in (store, reopened):
+        assert top_ids(s, "new text")[0] == "new"
+        assert top_ids(s, "doc 3 replaced")[0] == "id3"
+        assert "id5" not in top_ids(s, "doc 5", k=40)
+        assert s.get(ids=["id3", "id5"])["documents"] == ["doc 3 replaced"]
+        assert len(s.get()["ids"]) == 40
+
+
+def test_compaction_rewrites_the_base_with_the_same_contents(tmp_path):
+    store = build(tmp_path, compact_threshold=1)
+    store.add_texts(["new text"], ids=["new"])
+    store.delete(ids=["id0", "id1"])
+    before = store.get(include=["embeddings"])
+    store.persist()
+
+    assert store._delta == {} and store._deleted == set() and len(store._ids) == 39
+    after = store.get(include=["embeddings"])
+    assert sorted(after["ids"]) == sorted(before["ids"])
+    assert top_ids(store, "new text")[0] == "new"
+    reopened = QuantizedVectorStore(str(tmp_path), HashEmbeddings())
+    assert sorted(reopened.get()["ids"]) == sorted(before["ids"])
+
+
+def test_compaction_during_a_search_keeps_ids_and_documents_together(tmp_path, monkeypatch):
+    store = build(tmp_path, count=50, compact_threshold=0)
+    first_pass = store._first_pass
+
+    def first_pass_then_compact(*args):
+        scores = first_pass(*args)
+        # Another thread deletes and re-adds an entry and persists: every base row after it shifts
+        store.delete(ids=["id0"])
+        store.add_texts(["doc 0"], ids=["id0"])
+        store.persist()
+        return scores
+
+    monkeypatch.setattr(store, "_first_pass", first_pass_then_compact)
+    store.rerank_candidates = 1  # Re-rank exactly the first-pass row
+    [(score, entry_id, document, metadata)] = store._search(store.embeddings.embed_query("doc 10"), 1)
+    assert (entry_id, document, metadata) == ("id10", "doc 10", {"n": 10})
+    assert score == pytest.approx(1.0)
+
+
+def test_count_matches_get_without_loading_entries(tmp_path, monkeypatch):
+    store = build(tmp_path, count=10)
+    store.add_texts(["new doc", "doc 3 again"], ids=["new", "id3"])
+    store.delete(ids=["id5", "missing"])
+    expected = len(store.get()["ids"])
+    monkeypatch.setattr(store, "get", lambda *args, **kwargs: pytest.fail("count() must not call get()"))
+    assert store.count() == expected == 10
@@ -0,0 +1,30 @@
+import asyncio
+import os
+
+import pytest
+
+for module in ("firebase_admin", "langchain", "openai", "pandas", "dotenv"):
+    pytest.importorskip(module)
+
+os.environ["USE_LOCAL_FAKES"] = "1"
+
+import replay_traces
+
+
+def test_inprocess_replay_starts_app_and_succeeds():
+    traces = [
+        {"endpoint": "chatbot", "user": "anon1", "ts": 100, "post": "p1", "post_words": 12,
+         "saved_comments": 2, "new_session": True, "total_ms": 40.0},
+        {"endpoint": "chatbot", "user": "anon1", "ts": 101, "post": "p1", "post_words": 12,
+         "saved_comments": 2, "new_session": False, "total_ms": 20.0},
+        {"endpoint": "chatbot", "user": "anon2", "ts": 102, "post": "p2", "post_words": 30,
+         "saved_comments": 0, "new_session": True, "total_ms": 50.0},
+    ]
+    report = asyncio.run(replay_traces.replay(traces, concurrency=2, speed=0))
+    assert report["replayed"]["requests"] == 3
+    assert report["replayed"]["errors"] == 0
+
+
+def test_synthetic_text_is_stable_per_post_key():
+    assert replay_traces.synthetic_text("p1", 8) == replay_traces.synthetic_text("p1", 8)
+    assert len(replay_traces.synthetic_text("p1", 8).split()) == 8
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from reranker import CandidateReranker
+
+POST = "What I learned from the launch of our new product and from the customers who helped us."
+FILLER = "This is the one for the team and the rest of the year."
+RELEVANT = ["The customers clearly helped shape this launch.", "Launching a product teaches you a lot."]
+
+
+def test_function_words_do_not_make_filler_relevant():
+    relevance = CandidateReranker([]).relevance(POST, [FILLER] + RELEVANT)
+    assert relevance[0] == 0.0
+    assert min(relevance[1:]) > 0.2
+
+
+def test_filler_does_not_outrank_a_relevant_reply():
+    ranked = CandidateReranker([]).rank(POST, [FILLER] + RELEVANT, avg_length=10)
+    assert ranked[-1]["text"] == FILLER
+
+
+def test_rubric_checks_come_before_relevance():
+    reranker = CandidateReranker(["delve"])
+    ranked = reranker.rank(POST, ["Let us delve into the customers and the launch.", FILLER], style={"has_question": False})
+    assert ranked[0]["text"] == FILLER
+    assert ranked[0]["rubric"] == 3 and ranked[1]["rubric"] == 2
+
+
+def test_post_without_content_words_scores_zero_relevance():
+    assert CandidateReranker([]).relevance("This is it!", [FILLER]).tolist() == [0.0]
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, ResilientModel, hedged_call
+
+
+def test_breaker_opens_on_failure_rate_and_fails_fast():
+    breaker = CircuitBreaker(name="test", window=10, min_calls=4, failure_rate_threshold=0.5, open_seconds=60)
+    for success in (True, False, True):
+        breaker.record(success, 0.1)
+    assert breaker.state == "closed"  # Below min_calls
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_opens_on_slow_calls():
+    breaker = CircuitBreaker(name="test", min_calls=2, slow_call_seconds=1.0, slow_rate_threshold=0.5)
+    breaker.record(True, 0.1)
+    breaker.record(True, 2.0)
+    assert breaker.state == "open"
+
+
+def test_half_open_allows_one_probe_and_closes_on_success():
+    breaker = CircuitBreaker(name="test", min_calls=1, open_seconds=0)
+    breaker.record(False, 0.1)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # The probe is still in flight
+    breaker.record(True, 0.1)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(name="test", min_calls=1, open_seconds=0)
+    breaker.record(False, 0.1)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+
+
+def test_hedged_call_returns_the_faster_copy():
+    started = []
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            started.append(None)
+            first = len(started) == 1
+        time.sleep(0.5 if first else 0.01)
+        return "first" if first else "hedge"
+
+    result, hedge_won = asyncio.run(hedged_call(fn, hedge_delay=0.05, timeout=2.0))
+    assert (result, hedge_won) == ("hedge", True)
+
+
+def test_hedged_call_times_out():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(hedged_call(lambda: time.sleep(0.3), hedge_delay=1.0, timeout=0.05))
+
+
+def test_resilient_model_short_circuits_while_open():
+    calls = []
+    breaker = CircuitBreaker(name="test", min_calls=1, open_seconds=60)
+    model = ResilientModel(lambda **kwargs: calls.append(kwargs) or "reply", breaker, hedging=False)
+    assert asyncio.run(model.create(budget=1.0, prompt="p")) == "reply"
+    breaker.record(False, 0.1)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(model.create(budget=1.0, prompt="p"))
+    assert len(calls) == 1
+    assert calls[0]["prompt"] == "p" and calls[0]["timeout"] == 1.0
+
+
+def test_cancelled_half_open_probe_lets_the_next_probe_through():
+    breaker = CircuitBreaker(name="test", min_calls=1, open_seconds=0)
+    breaker.record(False, 0.1)
+    model = ResilientModel(lambda **kwargs: time.sleep(0.2) or "reply", breaker, hedging=False)
+
+    async def run():
+        probe = asyncio.ensure_future(model.create(budget=1.0))
+        await asyncio.sleep(0.05)
+        assert breaker.state == "half_open"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await model.create(budget=1.0)
+
+    assert asyncio.run(run()) == "reply"
+    assert breaker.state == "closed"
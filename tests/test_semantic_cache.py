@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("numpy")
+
+from semantic_cache import SemanticCache, embed_post, embed_post_sparse
+
+POST = "Three lessons from a year of hiring engineers #hiring https://example.com/post"
+
+
+def test_sparse_embedding_matches_the_dense_one():
+    columns, weights = embed_post_sparse(POST)
+    dense = embed_post(POST)
+    assert np.count_nonzero(dense) == len(columns)
+    assert np.allclose(dense[columns], weights)
+    assert np.isclose(np.linalg.norm(weights), 1.0)
+
+
+def test_reshared_post_hits_and_drops_stale_hashtags():
+    cache = SemanticCache(threshold=0.9)
+    cache.store("u1", POST, "So true #hiring, the second lesson hit home.")
+    cache.store("u1", "Our sunset photos from the lake trip", "Gorgeous colors!")
+    response, similarity = cache.lookup("u1", "Three lessons from a year of hiring engineers!")
+    assert similarity > 0.9
+    assert response == "So true, the second lesson hit home."
+    assert cache.lookup("u2", POST) is None
+    assert cache.lookup("u1", "Quarterly revenue numbers are in") is None
+
+
+def test_global_entry_cap_evicts_least_recently_used_users_first():
+    cache = SemanticCache(max_entries_per_user=10, max_entries=5)
+    for user in ("u1", "u2", "u3"):
+        for i in range(2):
+            cache.store(user, f"{user} post number {i} about product launches", f"reply {i}")
+    assert cache.stats() == {"users": 3, "entries": 5}
+    assert cache.lookup("u1", "u1 post number 0 about product launches") is None
+    assert cache.lookup("u1", "u1 post number 1 about product launches")[0] == "reply 1"
+    assert cache.lookup("u3", "u3 post number 0 about product launches")[0] == "reply 0"
+
+    for i in range(10):
+        cache.store("u4", f"u4 post number {i} about hiring", f"reply {i}")
+    assert cache.stats()["entries"] == 5
+
+
+def test_replacing_an_entry_does_not_count_twice():
+    cache = SemanticCache(max_entries=2)
+    cache.store("u1", POST, "first")
+    cache.store("u1", POST, "second")
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup("u1", POST)[0] == "second"
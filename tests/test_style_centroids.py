@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("firebase_admin")
+
+from local_fakes import FakeFirestoreClient
+from style_centroids import StyleCentroids
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+def comments(*ids):
+    return [{"id": i, "comment": f"comment {i}" + "!" * int(i[1:])} for i in ids]
+
+
+def stored_ids(db, user_id):
+    return db.collection("style_centroids").document(user_id).get().to_dict()["ids"]
+
+
+def test_memory_copy_is_rebuilt_when_another_worker_changed_the_comments():
+    db = FakeFirestoreClient()
+    worker_a = StyleCentroids(db, CountingEmbeddings())
+    worker_b = StyleCentroids(db, CountingEmbeddings())
+
+    worker_a.centroid("u1", comments("c1", "c2"))
+    # Another worker saves c3 and persists its centroid
+    worker_b.centroid("u1", comments("c1", "c2"))
+    worker_b.add("u1", comments("c3"))
+    assert stored_ids(db, "u1") == ["c1", "c2", "c3"]
+
+    centroid = worker_a.centroid("u1", comments("c1", "c2", "c3"))
+    assert worker_a._cache["u1"]["ids"] == {"c1", "c2", "c3"}
+    assert np.allclose(centroid, worker_b.centroid("u1", comments("c1", "c2", "c3")))
+
+    # Worker A's next save no longer overwrites the Firestore copy with a stale one
+    worker_a.add("u1", comments("c4"))
+    assert stored_ids(db, "u1") == ["c1", "c2", "c3", "c4"]
+
+
+def test_matching_memory_copy_is_reused_without_embedding():
+    embeddings = CountingEmbeddings()
+    centroids = StyleCentroids(FakeFirestoreClient(), embeddings)
+    centroids.centroid("u1", comments("c1", "c2"))
+    embedded = len(embeddings.embedded)
+    centroids.centroid("u1", comments("c1", "c2"))
+    assert len(embeddings.embedded) == embedded
@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pytest
+
+from template_embeddings import STOPWORDS, TemplateIndex, build_vocabulary, embed_text, save_matrix
+
+PATTERNS = {"observations": ["Interesting point about {topic}."], "agreement_short": ["So true."]}
+
+
+def theme_of(text: str) -> str:
+    index = TemplateIndex(PATTERNS, path="missing.npy")
+    return index.best_theme(index.score(text))
+
+
+@pytest.mark.parametrize("text, theme", [
+    ("We just shipped our new product", "business_strategy"),
+    ("Taking a break to rest after burnout", "well_being"),
+    ("I got promoted to a new role as manager", "career_growth"),
+])
+def test_theme_comes_from_shared_words_not_hash_collisions(text, theme):
+    assert theme_of(text) == theme
+
+
+def test_stopwords_and_unrelated_text_fall_back_to_default():
+    assert theme_of("We just did that with them") == "general_business"
+
+
+def test_every_vocabulary_word_has_its_own_column():
+    vocabulary = build_vocabulary(["just rest and new care", "rest again"])
+    assert vocabulary == {"care": 0, "new": 1, "rest": 2}
+    assert "just" in STOPWORDS and "again" in STOPWORDS
+    vector = embed_text("rest care unknownword", vocabulary)
+    # Words outside the vocabulary lower the similarity instead of being dropped
+    assert np.isclose(float(np.sum(vector ** 2)), 2 / 3)
+
+
+def test_saved_matrix_loads_and_stale_files_are_rebuilt(tmp_path):
+    path = str(tmp_path / "template_embeddings.npy")
+    save_matrix(PATTERNS, path)
+    loaded = TemplateIndex(PATTERNS, path)
+    assert loaded.matrix.shape == (len(loaded.themes) + 2, len(loaded.vocabulary))
+
+    with open(path.replace(".npy", ".json"), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": "old", "dims": 1024}, f)
+    rebuilt = TemplateIndex(PATTERNS, path)
+    assert np.allclose(rebuilt.matrix, loaded.matrix) and rebuilt.vocabulary == loaded.vocabulary
+
+
+def test_fill_content_has_no_banned_words():
+    # The generator imports langchain and pandas at module level
+    for module in ("langchain", "pandas"):
+        pytest.importorskip(module)
+    from comment_rubric import find_banned_words
+    from human_style_generator import HumanStyleGenerator
+
+    generator = HumanStyleGenerator()
+    post = "We grew the team this year. It took a lot of patience and feedback."
+    for theme in ("advice_sharing", "leadership", "personal_story", "networking"):
+        for _ in range(20):
+            values = generator.extract_fillable_content(post, theme).values()
+            assert not find_banned_words(" ".join(values), generator.ai_banned_words)
@@ -0,0 +1,75 @@
+import gzip
+import json
+
+from tracing import NULL_TRACE, TraceRecorder, read_traces
+
+
+def write_traces(path, traces):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for trace in traces:
+            f.write(json.dumps(trace) + "\n")
+
+
+def test_recorder_samples_and_anonymizes(tmp_path):
+    recorder = TraceRecorder(str(tmp_path), sample_rate=1.0, salt="s")
+    trace = recorder.start("chatbot", "alice@example.com")
+    trace.mark("model")
+    trace.score(3)
+    recorder.finish(trace)
+    recorder.close()
+    [saved] = read_traces([str(tmp_path)])
+    assert saved["user"] == recorder.anonymize("alice@example.com") != "alice@example.com"
+    assert saved["scores"] == [3] and "model" in saved["stages_ms"]
+    assert TraceRecorder(str(tmp_path), sample_rate=0.0).start("chatbot", "bob") is NULL_TRACE
+
+
+def test_read_traces_merges_files_in_time_order(tmp_path):
+    write_traces(tmp_path / "traces-1-a.jsonl.gz", [{"ts": 1}, {"ts": 4}])
+    write_traces(tmp_path / "traces-2-b.jsonl.gz", [{"ts": 2}, {"ts": 3}])
+    assert [t["ts"] for t in read_traces([str(tmp_path)])] == [1, 2, 3, 4]
+    assert [t["ts"] for t in read_traces([str(tmp_path)], limit=3)] == [1, 2, 3]
+    assert [t["ts"] for t in read_traces([str(tmp_path)], where=lambda t: t["ts"] % 2 == 0)] == [2, 4]
+
+
+def test_limit_stops_before_the_rest_of_the_file(tmp_path):
+    path = tmp_path / "traces-1-a.jsonl"
+    # The limit is reached before the line that would fail to parse as a dict
+    path.write_text('{"ts": 1}\n{"ts": 2}\n[]\n', encoding="utf-8")
+    assert [t["ts"] for t in read_traces([str(path)], limit=2)] == [1, 2]
+
+
+def test_truncated_gzip_keeps_what_was_read(tmp_path):
+    path = tmp_path / "traces-1-a.jsonl.gz"
+    write_traces(path, [{"ts": i} for i in range(200)])
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) - 10])
+    traces = read_traces([str(path)])
+    assert traces and [t["ts"] for t in traces] == list(range(len(traces)))
+
+
+def test_rotation_keeps_files_of_other_live_workers(tmp_path):
+    import os
+    import subprocess
+    import time
+
+    live = subprocess.Popen(["sleep", "30"])
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    try:
+        for i, pid in enumerate((live.pid, dead.pid, os.getpid())):
+            path = tmp_path / f"traces-{pid}-2026010{i}T000000-abcd.jsonl.gz"
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.write("{}\n")
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+
+        recorder = TraceRecorder(str(tmp_path), sample_rate=1.0, max_files=2)
+        recorder.finish(recorder.start("chatbot", "u1"))
+        recorder.close()
+
+        names = sorted(p.name for p in tmp_path.iterdir())
+        assert any(name.startswith(f"traces-{live.pid}-") for name in names)
+        assert not any(name.startswith(f"traces-{dead.pid}-") for name in names)
+        assert len(names) == 2
+    finally:
+        live.kill()
+        live.wait()
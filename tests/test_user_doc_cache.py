@@ -0,0 +1,114 @@
+import asyncio
+import os
+
+import pytest
+
+for module in ("firebase_admin", "openai", "google.api_core"):
+    pytest.importorskip(module)
+
+from local_fakes import FakeFirestoreClient
+from user_doc_cache import UserDocCache, update_array_field
+
+
+def make_cache(comments):
+    db = FakeFirestoreClient()
+    db.collection("users").document("u1").set({"name": "Ana", "comments": comments, "chat_sessions": []})
+    return db, UserDocCache(db, max_staleness=60.0)
+
+
+def stored(db, field):
+    return db.collection("users").document("u1").get().to_dict()[field]
+
+
+def test_get_copies_only_the_requested_fields():
+    db, cache = make_cache([{"id": "c1", "comment": "first"}])
+    doc = cache.get("u1", fields=("comments",))
+    assert doc == {"comments": [{"id": "c1", "comment": "first"}]}
+    doc["comments"].append({"id": "c2"})
+    assert cache.get("u1")["comments"] == [{"id": "c1", "comment": "first"}]
+
+
+def test_returned_entries_can_be_edited_without_touching_the_cache():
+    db, cache = make_cache([{"id": "c1", "comment": "first", "tags": ["a"]}])
+    first = cache.get("u1", fields=("comments",))
+    first["comments"][0]["comment"] = "edited"
+    first["comments"][0]["id"] = "changed"
+    second = cache.get("u1", fields=("comments",))
+    assert second["comments"][0]["comment"] == "first" and second["comments"][0]["id"] == "c1"
+    # Only entry-level copies are made on a hit: deeper values are shared, not deep-copied
+    assert second["comments"][0]["tags"] is first["comments"][0]["tags"]
+
+
+def test_array_union_is_written_through_without_duplicates():
+    db, cache = make_cache([{"id": "c1"}])
+    cache.get("u1")
+    cache.array_union("u1", "comments", [{"id": "c1"}, {"id": "c2"}])
+    assert cache.get("u1", fields=("comments",))["comments"] == [{"id": "c1"}, {"id": "c2"}]
+
+
+def test_update_array_redoes_the_change_on_a_concurrent_write():
+    db, cache = make_cache([{"id": "c1"}, {"id": "c2"}])
+    ref = db.collection("users").document("u1")
+    calls = []
+
+    def remove_c1(current):
+        calls.append(len(current))
+        if len(calls) == 1:
+            # Another worker appends between our read and our write
+            ref.update({"comments": current + [{"id": "c3"}]})
+        return [c for c in current if c["id"] != "c1"]
+
+    assert cache.update_array("u1", "comments", remove_c1) == [{"id": "c2"}, {"id": "c3"}]
+    assert calls == [2, 3]
+    assert stored(db, "comments") == [{"id": "c2"}, {"id": "c3"}]
+    assert cache.get("u1")["comments"] == [{"id": "c2"}, {"id": "c3"}]
+
+
+def test_update_array_field_gives_up_after_the_last_attempt():
+    from google.api_core.exceptions import FailedPrecondition
+
+    db, _ = make_cache([])
+    ref = db.collection("users").document("u1")
+
+    def always_conflicts(current):
+        ref.update({"name": "changed"})
+        return current
+
+    with pytest.raises(FailedPrecondition):
+        update_array_field(db, ref, "comments", always_conflicts, attempts=2)
+    assert update_array_field(db, db.collection("users").document("missing"), "comments", list) is None
+
+
+def test_app_writes_keep_comments_and_sessions_added_by_other_workers():
+    for module in ("langchain", "pandas", "dotenv"):
+        pytest.importorskip(module)
+    os.environ["USE_LOCAL_FAKES"] = "1"
+    import httpx
+    import app as app_module
+
+    user_id = "concurrent-user"
+    ref = app_module.db.collection("users").document(user_id)
+    ref.set({"name": "Ana", "comments": [{"id": "c1", "comment": "Old take."}], "chat_sessions": []})
+
+    async def run():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with app_module.app.router.lifespan_context(app_module.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                app_module.user_docs.get(user_id)  # Cached before the other worker's writes
+                ref.update({
+                    "comments": [{"id": "c1", "comment": "Old take."}, {"id": "c2", "comment": "From another worker."}],
+                    "chat_sessions": [{"session_id": "other", "queries": [], "created_at": None}],
+                })
+                response = await client.post("/comments/bulk/", json={
+                    "user_id": user_id, "edited": [{"id": "c1", "comment": "New take."}]
+                })
+                assert response.status_code == 200
+                response = await client.delete(f"/delete_comment/{user_id}/0")
+                assert response.status_code == 200
+                await app_module.get_or_create_session(user_id)
+
+    asyncio.run(run())
+    data = ref.get().to_dict()
+    assert [c["id"] for c in data["comments"]] == ["c2"]
+    assert [s["session_id"] for s in data["chat_sessions"]][0] == "other"
+    assert len(data["chat_sessions"]) == 2
@@ -0,0 +1,91 @@
+import os
+import stat
+import threading
+
+import pytest
+
+if os.name != "posix":
+    pytest.skip("the vector service uses Unix sockets", allow_module_level=True)
+
+import vector_service
+from vector_service import VectorServiceError, VectorStoreClient, VectorStoreService, connect_or_local
+
+
+class MemoryStore:
+    def __init__(self):
+        self.texts = {}
+        self.persisted = 0
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        self.texts.update(zip(ids, texts))
+        return ids
+
+    def delete(self, ids=None):
+        for i in ids:
+            self.texts.pop(i, None)
+
+    def get(self, ids=None, include=None):
+        keys = ids or sorted(self.texts)
+        return {"ids": keys, "documents": [self.texts[k] for k in keys]}
+
+    def count(self):
+        return len(self.texts)
+
+    def persist(self):
+        self.persisted += 1
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.delenv("VECTOR_SERVICE_AUTHKEY", raising=False)
+    address = str(tmp_path / "vectors.sock")
+    service = VectorStoreService(MemoryStore(), address, persist_interval=0.01)
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    connect_or_local(address, lambda: None, wait=5)
+    yield service
+    service.stop()
+    thread.join(timeout=5)
+
+
+def test_socket_and_generated_key_are_owner_only(service):
+    assert stat.S_IMODE(os.stat(service.address).st_mode) == 0o600
+    key_file = vector_service.key_path(service.address)
+    assert stat.S_IMODE(os.stat(key_file).st_mode) == 0o600
+    assert len(service.authkey) == 64 and service.authkey != b"style-vectors"
+
+
+def test_client_reads_and_writes_through_the_service(service):
+    client = VectorStoreClient(service.address)
+    client.add_texts(["hello there"], ids=["c1"])
+    assert client.get(ids=["c1"])["documents"] == ["hello there"]
+    assert client.count() == 1
+    client.delete(ids=["c1"])
+    assert client.count() == 0
+    service.flush()
+    assert service.store.persisted >= 1
+
+
+def test_wrong_key_is_rejected(service):
+    with pytest.raises(VectorServiceError):
+        VectorStoreClient(service.address, authkey=b"guess").count()
+
+
+def test_key_file_readable_by_others_is_refused(tmp_path, monkeypatch):
+    monkeypatch.delenv("VECTOR_SERVICE_AUTHKEY", raising=False)
+    address = str(tmp_path / "vectors.sock")
+    key_file = vector_service.key_path(address)
+    with open(key_file, "w", encoding="utf-8") as f:
+        f.write("known")
+    os.chmod(key_file, 0o644)
+    with pytest.raises(VectorServiceError):
+        vector_service.load_authkey(address)
+
+
+def test_configured_but_unreachable_service_fails_instead_of_falling_back(tmp_path, monkeypatch):
+    monkeypatch.setenv("VECTOR_SERVICE_AUTHKEY", "test-key")
+    built = []
+    with pytest.raises(VectorServiceError):
+        connect_or_local(str(tmp_path / "missing.sock"), lambda: built.append(1), wait=0)
+    assert built == []
+    assert connect_or_local("", lambda: "local") == "local"
@@ -0,0 +1,210 @@
+"""
+Opt-in sampling of anonymized per-request traces, written as rotating gzip JSONL.
+
+A sampled request gets a Trace that records input sizes (never the texts),
+per-stage timings, model attempts, validation scores and cache outcomes;
+unsampled requests get NULL_TRACE, whose methods do nothing. User ids are
+replaced by a salted hash: set TRACE_SALT to the same value on every worker
+to correlate users across workers, otherwise each process picks its own.
+
+Each process writes to its own file, traces-<pid>-<timestamp>.jsonl.gz, and
+starts a new one after max_file_bytes of uncompressed JSON; only the newest
+max_files trace files in the directory are kept. Pruning never deletes the
+files of another worker that is still running, so its open file is not lost.
+replay_traces.py reads them.
+"""
+import glob
+import gzip
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import secrets
+import threading
+import time
+
+FILE_PATTERN = "traces-*.jsonl.gz"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists, owned by another user
+    return True
+
+
+def _file_pid(path: str):
+    """The pid in a traces-<pid>-<timestamp>-<suffix>.jsonl.gz name, or None."""
+    try:
+        return int(os.path.basename(path).split("-")[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def anonymize(value: str, salt: str) -> str:
+    return hashlib.blake2b(f"{salt}|{value}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+class Trace:
+    sampled = True
+
+    def __init__(self, endpoint: str, user: str):
+        self.data = {"endpoint": endpoint, "ts": int(time.time()), "user": user,
+                     "stages_ms": {}, "scores": [], "cache": {}}
+        self._started = self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        """Records the time since the previous mark (or the start) as this stage's duration."""
+        now = time.perf_counter()
+        stages = self.data["stages_ms"]
+        stages[stage] = round(stages.get(stage, 0.0) + (now - self._last) * 1000, 3)
+        self._last = now
+
+    def set(self, **fields):
+        self.data.update(fields)
+
+    def cache(self, name: str, outcome):
+        self.data["cache"][name] = outcome
+
+    def score(self, value: int):
+        self.data["scores"].append(value)
+
+    def finish(self) -> dict:
+        self.data["total_ms"] = round((time.perf_counter() - self._started) * 1000, 3)
+        return self.data
+
+
+class _NullTrace:
+    sampled = False
+
+    def mark(self, stage: str):
+        pass
+
+    def set(self, **fields):
+        pass
+
+    def cache(self, name: str, outcome):
+        pass
+
+    def score(self, value: int):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class TraceRecorder:
+    def __init__(self, directory: str = "traces", sample_rate: float = 0.0, max_file_bytes: int = 50_000_000,
+                 max_files: int = 20, salt: str = None):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.salt = salt or secrets.token_hex(16)
+        self._file = None
+        self._path = None
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def anonymize(self, value: str) -> str:
+        return anonymize(value, self.salt)
+
+    def start(self, endpoint: str, user_id: str):
+        """A Trace for a sampled request, NULL_TRACE otherwise."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return NULL_TRACE
+        return Trace(endpoint, self.anonymize(user_id))
+
+    def finish(self, trace):
+        if not trace.sampled:
+            return
+        line = (json.dumps(trace.finish(), separators=(",", ":")) + "\n").encode("utf-8")
+        try:
+            with self._lock:
+                if self._file is None or self._written >= self.max_file_bytes:
+                    self._rotate()
+                self._file.write(line)
+                self._written += len(line)
+        except Exception as e:
+            print(f"Error writing request trace: {e}")
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"traces-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(2)}.jsonl.gz"
+        self._path = os.path.join(self.directory, name)
+        self._file = gzip.open(self._path, "ab")
+        self._written = 0
+        self._prune()
+
+    def _prune(self):
+        """Removes the oldest files beyond max_files, skipping those of other live workers."""
+        files = sorted(glob.glob(os.path.join(self.directory, FILE_PATTERN)), key=os.path.getmtime)
+        excess = len(files) - self.max_files
+        own_pid = os.getpid()
+        for old in files:
+            if excess <= 0:
+                break
+            if old == self._path:
+                continue
+            pid = _file_pid(old)
+            if pid is not None and pid != own_pid and _pid_alive(pid):
+                continue
+            try:
+                os.remove(old)
+                excess -= 1
+            except OSError as e:
+                print(f"Error removing old trace file: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _read_file(path: str):
+    """Yields the traces of one file; tolerates a truncated file."""
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+    except (EOFError, OSError) as e:
+        # A worker that died mid-file leaves no gzip trailer; keep what was read
+        print(f"Stopped reading {path} early: {e}")
+
+
+def read_traces(paths: list, limit: int = None, where=None) -> list:
+    """
+    Traces from the given files or directories, oldest first, optionally only
+    those where(trace) accepts. Files are merged as they are read (each file is
+    in finish order, close to start order), so with a limit reading stops after
+    limit traces.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, FILE_PATTERN)))
+        else:
+            files.append(path)
+    readers = [_read_file(path) for path in files]
+    try:
+        traces = heapq.merge(*readers, key=lambda t: t.get("ts", 0))
+        if where is not None:
+            traces = filter(where, traces)
+        return sorted(itertools.islice(traces, limit), key=lambda t: t.get("ts", 0))
+    finally:
+        for reader in readers:
+            reader.close()
@@ -0,0 +1,218 @@
+"""
+In-process cache of hot Firestore user documents.
+
+The most recently used documents get a Firestore snapshot listener, so
+changes made elsewhere (the Streamlit pages, other workers) land in the cache
+without a read. The app's own writes are applied write-through. Documents
+without a listener (over the listener cap, or on clients that cannot listen)
+are re-read once they are older than max_staleness; documents with one are
+re-read after listener_max_age in case the stream silently died. The cache
+holds at most max_docs documents, evicted least-recently-used.
+
+Array fields (comments, chat_sessions) are never written back from the
+cached copy: appends use ArrayUnion, and edits go through update_array(),
+which re-reads the document and only writes if nobody changed it meanwhile.
+
+Cached documents are never modified in place: every update replaces the
+changed fields with new objects. So get() does not deep-copy a document on
+every hit. It returns new lists and dicts down to the array entries (which
+callers edit, e.g. a comment's text), while deeper values such as a
+session's queries are shared with the cache and must be replaced, not
+mutated.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from google.api_core.exceptions import FailedPrecondition
+
+from metrics import metrics
+
+
+def update_array_field(db, ref, field: str, mutate, attempts: int = 5):
+    """
+    Read-modify-write of one array field that does not overwrite concurrent
+    changes: the update carries a last_update_time precondition, and is redone
+    on a fresh read if the document changed in between. mutate(values) returns
+    the new array. Returns the written array, or None if the document is missing.
+    """
+    for attempt in range(attempts):
+        snapshot = ref.get()
+        if not snapshot.exists:
+            return None
+        values = mutate(snapshot.to_dict().get(field, []))
+        try:
+            ref.update({field: values}, option=db.write_option(last_update_time=snapshot.update_time))
+            return values
+        except FailedPrecondition:
+            metrics.incr("user_cache.write_conflicts")
+            if attempt == attempts - 1:
+                raise
+
+
+class UserDocCache:
+    def __init__(self, db, collection: str = "users", max_docs: int = 1000, max_listeners: int = 200,
+                 max_staleness: float = 5.0, listener_max_age: float = 600.0):
+        self.db = db
+        self.collection = collection
+        self.max_docs = max_docs
+        self.max_listeners = max_listeners
+        self.max_staleness = max_staleness
+        self.listener_max_age = listener_max_age
+        self._entries = OrderedDict()  # user_id -> {"data", "refreshed", "watch"}
+        self._listeners = 0
+        self._lock = threading.RLock()
+        metrics.register_ratio("user_cache.hit_rate", "user_cache.hits", "user_cache.lookups")
+
+    def _ref(self, user_id: str):
+        return self.db.collection(self.collection).document(user_id)
+
+    def _is_fresh(self, entry: dict, now: float) -> bool:
+        max_age = self.listener_max_age if entry["watch"] else self.max_staleness
+        return now - entry["refreshed"] <= max_age
+
+    @staticmethod
+    def _view(value):
+        # New containers down to the array entries; anything deeper is shared with the cache
+        if isinstance(value, list):
+            return [dict(item) if isinstance(item, dict) else item for item in value]
+        if isinstance(value, dict):
+            return dict(value)
+        return value
+
+    def _copy(self, data: dict, fields) -> dict:
+        if fields is None:
+            fields = data.keys()
+        return {field: self._view(data[field]) for field in fields if field in data}
+
+    def get(self, user_id: str, fields=None):
+        """
+        The user's document (only the given fields, if any), or None if it
+        does not exist. Lists, dicts and array entries are the caller's own;
+        values nested below the entries are shared and must not be mutated.
+        """
+        metrics.incr("user_cache.lookups")
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and self._is_fresh(entry, time.monotonic()):
+                self._entries.move_to_end(user_id)
+                metrics.incr("user_cache.hits")
+                return self._copy(entry["data"], fields)
+
+        snapshot = self._ref(user_id).get()
+        if not snapshot.exists:
+            self.invalidate(user_id)
+            return None
+        data = snapshot.to_dict()
+        self._store(user_id, data)
+        return self._copy(data, fields)
+
+    def is_cached(self, user_id: str) -> bool:
+        """Whether get() would be served from memory right now."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return entry is not None and self._is_fresh(entry, time.monotonic())
+
+    def update_fields(self, user_id: str, fields: dict):
+        """Write-through for fields the app just wrote with plain values (no Firestore sentinels)."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            entry["data"].update(copy.deepcopy(fields))
+            entry["refreshed"] = time.monotonic()
+
+    def array_union(self, user_id: str, field: str, items: list):
+        """Write-through for a firestore.ArrayUnion(items) the app just wrote to field."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            values = entry["data"].get(field, [])
+            entry["data"][field] = values + [copy.deepcopy(item) for item in items if item not in values]
+
+    def update_array(self, user_id: str, field: str, mutate):
+        """update_array_field() on the user's document, written through to the cache."""
+        values = update_array_field(self.db, self._ref(user_id), field, mutate)
+        if values is not None:
+            self.update_fields(user_id, {field: values})
+        return values
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"documents": len(self._entries), "listeners": self._listeners}
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._detach(entry)
+            self._publish()
+
+    def close(self):
+        with self._lock:
+            for entry in self._entries.values():
+                self._detach(entry)
+            self._entries.clear()
+
+    def _store(self, user_id: str, data: dict):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = self._entries[user_id] = {"data": data, "refreshed": time.monotonic(), "watch": None}
+                while len(self._entries) > self.max_docs:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._detach(evicted)
+            else:
+                entry["data"] = data
+                entry["refreshed"] = time.monotonic()
+                self._entries.move_to_end(user_id)
+            if entry["watch"] is None:
+                self._attach(user_id, entry)
+            self._publish()
+
+    def _attach(self, user_id: str, entry: dict):
+        ref = self._ref(user_id)
+        if not hasattr(ref, "on_snapshot"):
+            return
+        if self._listeners >= self.max_listeners:
+            # Hand the listener of the least recently used watched document to this one
+            for other in self._entries.values():
+                if other["watch"] is not None:
+                    self._detach(other)
+                    break
+        try:
+            entry["watch"] = ref.on_snapshot(lambda docs, changes, read_time: self._on_snapshot(user_id, docs))
+            self._listeners += 1
+        except Exception as e:
+            print(f"Error attaching user document listener: {e}")
+
+    def _detach(self, entry: dict):
+        watch = entry.get("watch")
+        if watch is None:
+            return
+        entry["watch"] = None
+        self._listeners -= 1
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            print(f"Error detaching user document listener: {e}")
+
+    def _on_snapshot(self, user_id: str, docs: list):
+        # Runs on the Firestore listener thread
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if not docs or not docs[0].exists:
+                self._entries.pop(user_id, None)
+                self._detach(entry)
+                return
+            entry["data"] = docs[0].to_dict()
+            entry["refreshed"] = time.monotonic()
+            metrics.incr("user_cache.listener_updates")
+
+    def _publish(self):
+        metrics.set_gauge("user_cache.documents", len(self._entries))
+        metrics.set_gauge("user_cache.listeners", self._listeners)
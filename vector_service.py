@@ -0,0 +1,309 @@
+"""
+Single-writer style vector store service shared by all API workers.
+
+One process owns the vector store (Chroma or the quantized store) and is the
+only one that writes to its directory. API workers talk to it over a local
+socket (multiprocessing.connection: a Unix domain socket with pickled
+messages and an auth key) through VectorStoreClient, which exposes the same
+methods as the store itself, so the rest of the app does not change.
+
+Writes are applied as they arrive, and every reader sees them at once.
+persist() from a worker is a no-op: the service persists at most once every
+persist_interval seconds after a write, and on shutdown, so a save no longer
+waits for the store to be flushed to disk.
+
+Run it next to the workers and point them at it:
+    python vector_service.py serve --address /tmp/style_vectors.sock
+    VECTOR_SERVICE_ADDRESS=/tmp/style_vectors.sock uvicorn app:app --workers 4
+
+Messages are pickled, so the socket is created owner-only and every
+connection must present the auth key: VECTOR_SERVICE_AUTHKEY if set,
+otherwise a random key the service writes to <address>.key (mode 0600),
+which workers of the same user read.
+
+Without VECTOR_SERVICE_ADDRESS (single-worker setups) each worker opens the
+store in-process as before. With it set, a worker that cannot reach the
+service fails to start instead of silently opening its own copy.
+"""
+import argparse
+import os
+import secrets
+import signal
+import socket
+import stat
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+DEFAULT_ADDRESS = "/tmp/style_vectors.sock"
+READ_METHODS = {"get", "similarity_search", "similarity_search_by_vector", "memory_bytes"}
+WRITE_METHODS = {"add_texts", "delete"}
+
+
+class VectorServiceError(Exception):
+    pass
+
+
+def key_path(address: str) -> str:
+    return f"{address}.key"
+
+
+def load_authkey(address: str, create: bool = False) -> bytes:
+    """
+    VECTOR_SERVICE_AUTHKEY, else the key in <address>.key. With create, a random
+    key is written there (mode 0600) if the file does not exist yet.
+    """
+    if os.getenv("VECTOR_SERVICE_AUTHKEY"):
+        return os.environ["VECTOR_SERVICE_AUTHKEY"].encode("utf-8")
+    path = key_path(address)
+    if create and not os.path.exists(path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(secrets.token_hex(32))
+    try:
+        info = os.stat(path)
+        if info.st_uid != os.getuid() or info.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            raise VectorServiceError(f"Vector service key file {path} must be owned by this user with mode 600")
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip().encode("utf-8")
+    except FileNotFoundError:
+        raise VectorServiceError(f"No vector service auth key: set VECTOR_SERVICE_AUTHKEY or start the service first ({path})")
+
+
+def open_local_store(embeddings):
+    """The style vector store configured by VECTOR_STORE (chroma or quantized), opened in this process."""
+    if os.getenv("VECTOR_STORE", "chroma") == "quantized":
+        # int8/float16 vectors in memory, exact re-rank from disk (built by quantized_store.py convert)
+        from quantized_store import DEFAULT_DIRECTORY, QuantizedVectorStore
+        return QuantizedVectorStore(
+            os.getenv("QUANTIZED_STORE_DIR", DEFAULT_DIRECTORY), embeddings,
+            rerank_candidates=int(os.getenv("QUANTIZED_RERANK_CANDIDATES", "50"))
+        )
+    from langchain.vectorstores import Chroma
+    return Chroma(persist_directory="./chroma_style_db", embedding_function=embeddings)
+
+
+class VectorStoreService:
+    def __init__(self, store, address: str = DEFAULT_ADDRESS, authkey: bytes = None, persist_interval: float = 2.0):
+        self.store = store
+        self.address = address
+        self.authkey = authkey or load_authkey(address, create=True)
+        self.persist_interval = persist_interval
+        self._write_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stopping = threading.Event()
+        self._listener = None
+
+    def _handle(self, method: str, args: tuple, kwargs: dict):
+        if method == "persist":
+            return None  # Batched by the persister thread
+        if method == "count":
+            # Never answered with get(): that would load the whole store for a number
+            if hasattr(self.store, "count"):
+                return self.store.count()
+            collection = getattr(self.store, "_collection", None)
+            return collection.count() if collection is not None else None
+        if method in WRITE_METHODS:
+            with self._write_lock:
+                result = getattr(self.store, method)(*args, **kwargs)
+            self._dirty.set()
+            return result
+        if method in READ_METHODS and hasattr(self.store, method):
+            return getattr(self.store, method)(*args, **kwargs)
+        raise VectorServiceError(f"Unsupported vector store method '{method}'")
+
+    def _serve_connection(self, conn):
+        with conn:
+            while not self._stopping.is_set():
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ("ok", self._handle(method, args, kwargs))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                try:
+                    conn.send(reply)
+                except (OSError, ValueError) as e:
+                    print(f"Error replying to vector store client: {e}")
+                    return
+
+    def _persist_loop(self):
+        while not self._stopping.is_set():
+            if not self._dirty.wait(timeout=1.0):
+                continue
+            time.sleep(self.persist_interval)  # Let a burst of writes share one persist
+            self.flush()
+
+    def flush(self):
+        if not self._dirty.is_set():
+            return
+        with self._write_lock:
+            self._dirty.clear()
+            try:
+                self.store.persist()
+            except Exception as e:
+                self._dirty.set()
+                print(f"Error persisting vector store: {e}")
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)  # Stale socket from an earlier run
+        # Create the socket owner-only from the start rather than chmod-ing it after bind
+        previous_umask = os.umask(0o177)
+        try:
+            self._listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(previous_umask)
+        threading.Thread(target=self._persist_loop, daemon=True).start()
+        print(f"✅ Vector store service listening on {self.address}")
+        while not self._stopping.is_set():
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break  # Listener closed by stop()
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                print(f"Error accepting vector store client: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        self.flush()
+
+    def stop(self):
+        self._stopping.set()
+        if self._listener is not None:
+            # Closing the listener does not interrupt a blocked accept(); a bare connection does
+            try:
+                with socket.socket(socket.AF_UNIX) as wake:
+                    wake.connect(self.address)
+            except OSError:
+                pass
+            self._listener.close()
+
+
+class VectorStoreClient:
+    """Worker-side stand-in for the vector store; one connection per thread."""
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, authkey: bytes = None, timeout: float = 30.0):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Read the key on every connect so a restarted service with a new key is picked up
+            authkey = self.authkey or load_authkey(self.address)
+            conn = self._local.conn = Client(self.address, authkey=authkey)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _call(self, method: str, *args, **kwargs):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send((method, args, kwargs))
+                if not conn.poll(self.timeout):
+                    self._drop_connection()  # A late reply would answer the next request
+                    raise VectorServiceError(f"Vector store service timed out on '{method}'")
+                status, result = conn.recv()
+                break
+            except AuthenticationError:
+                self._drop_connection()
+                raise VectorServiceError(f"Vector store service at {self.address} rejected the auth key")
+            except (EOFError, ConnectionError, OSError):
+                # Service restarted: reconnect once
+                self._drop_connection()
+                if attempt == 1:
+                    raise VectorServiceError(f"Vector store service unavailable at {self.address}")
+        if status == "error":
+            raise VectorServiceError(result)
+        return result
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        return self._call("add_texts", list(texts), metadatas=metadatas, ids=ids)
+
+    def delete(self, ids=None, **kwargs):
+        return self._call("delete", ids=list(ids or []))
+
+    def get(self, ids=None, include=None, **kwargs):
+        return self._call("get", ids=ids, include=include, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs):
+        return self._call("similarity_search", query, k=k)
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        return self._call("similarity_search_by_vector", list(embedding), k=k)
+
+    def count(self) -> int:
+        return self._call("count")
+
+    def memory_bytes(self):
+        return self._call("memory_bytes")
+
+    def persist(self):
+        pass  # The service persists in batches
+
+
+def connect_or_local(address: str, build_local, wait: float = 10.0):
+    """
+    A client for the service at address, or the in-process store from build_local()
+    when no address is configured. Raises VectorServiceError if the configured
+    service does not answer within wait seconds: a worker that opened its own
+    copy would write to the store directory next to the service.
+    """
+    if not address:
+        return build_local()
+    client = VectorStoreClient(address)
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            client.count()
+            print(f"Using vector store service at {address}")
+            return client
+        except (VectorServiceError, OSError) as e:
+            if time.monotonic() >= deadline:
+                print(f"Error reaching vector store service at {address}: {e}")
+                raise VectorServiceError(f"Vector store service at {address} is not reachable: {e}")
+            time.sleep(0.5)  # The service may still be starting
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-writer style vector store service")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--address", default=os.getenv("VECTOR_SERVICE_ADDRESS", DEFAULT_ADDRESS))
+    parser.add_argument("--persist-interval", type=float, default=float(os.getenv("VECTOR_PERSIST_INTERVAL", "2")))
+    args = parser.parse_args()
+
+    if os.getenv("USE_LOCAL_FAKES", "0") == "1":
+        from local_fakes import FakeChatCompletion, FakeEmbeddings, FakeVectorStore
+        store = FakeVectorStore(FakeChatCompletion.replies, embeddings=FakeEmbeddings())
+    else:
+        from dotenv import load_dotenv
+        from langchain.embeddings import OpenAIEmbeddings
+        load_dotenv()
+        store = open_local_store(OpenAIEmbeddings())
+
+    service = VectorStoreService(store, args.address, persist_interval=args.persist_interval)
+    signal.signal(signal.SIGTERM, lambda signum, frame: service.stop())
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.stop()
+        service.flush()
+
+
+if __name__ == "__main__":
+    main()